@@ -0,0 +1,212 @@
+"""Score every experiment's assignments.csv against the human assignments.
+
+For each experiment folder: top-1 and top-2 agreement with humanAssigned
+(with bootstrap confidence intervals), the mean rank of the human choice and
+a humanAssigned x model top-1 confusion matrix. For each pair of experiments:
+how often their top-1 choices agree on the participants they share, with a
+bootstrap confidence interval. Rankings are encoded as integer arrays and
+scored with numpy, so there is no loop over participants.
+
+Results are cached by the sha256 of each assignments.csv, so adding or
+regenerating one experiment only scores that experiment and its pairs.
+
+    python assignment_eval.py                     # every experiment folder
+    python assignment_eval.py expA expB --json scores.json
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from natsort import natsorted
+
+from ranking_schema import DOMAINS
+
+RANK_COLUMNS = ["0", "1", "2", "3"]
+CACHE_VERSION = 2
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def find_experiments(root="."):
+    return natsorted(d for d in os.listdir(root) if os.path.isfile(os.path.join(root, d, "assignments.csv")))
+
+
+def load_assignments(path):
+    """assignments.csv as (SubIDs, human codes, ranking codes, CorrectAssignment); unknown domains are -1."""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    codes = {d: i for i, d in enumerate(DOMAINS)}
+    human = df["humanAssigned"].map(codes).fillna(-1).to_numpy(dtype=np.int8)
+    ranks = df[RANK_COLUMNS].apply(lambda c: c.map(codes)).fillna(-1).to_numpy(dtype=np.int8)
+    correct = df.get("CorrectAssignment", pd.Series("", index=df.index)).str.upper()
+    correct = np.where(correct == "TRUE", 1.0, np.where(correct == "FALSE", 0.0, np.nan))
+    return df["SubID"].to_numpy(), human, ranks, correct
+
+
+def bootstrap_ci(values, n_boot=2000, seed=0, alpha=0.05):
+    """Percentile interval of the mean of values, all resamples drawn at once."""
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return [None, None]
+    rng = np.random.default_rng(seed)
+    means = values[rng.integers(0, values.size, size=(n_boot, values.size))].mean(axis=1)
+    low, high = np.quantile(means, [alpha / 2, 1 - alpha / 2])
+    return [float(low), float(high)]
+
+
+def score_experiment(human, ranks, correct, n_boot=2000, seed=0):
+    # Only participants with a known human choice are scored; an unknown (-1) rank never matches
+    scored = human >= 0
+    human, ranks = human[scored], ranks[scored]
+    matches = (ranks == human[:, None]) & (ranks >= 0)
+    found = matches.any(axis=1)
+    top1 = matches[:, 0]
+    top2 = matches[:, :2].any(axis=1)
+    human_rank = np.where(found, matches.argmax(axis=1) + 1, np.nan)
+    k = len(DOMAINS)
+    valid = ranks[:, 0] >= 0
+    confusion = np.bincount(human[valid].astype(int) * k + ranks[valid, 0], minlength=k * k).reshape(k, k)
+    return {
+        "n": int(human.size),
+        "human_unknown": int((~scored).sum()),
+        "top1": float(top1.mean()) if human.size else None,
+        "top1_ci": bootstrap_ci(top1, n_boot, seed),
+        "top2": float(top2.mean()) if human.size else None,
+        "top2_ci": bootstrap_ci(top2, n_boot, seed),
+        "mean_human_rank": float(np.nanmean(human_rank)) if found.any() else None,
+        "human_unranked": int((~found).sum()),
+        # the CorrectAssignment column as written by hand review
+        "marked_correct": float(np.nanmean(correct)) if (~np.isnan(correct)).any() else None,
+        "confusion": confusion.tolist(),  # rows humanAssigned, columns model top-1, in DOMAINS order
+    }
+
+
+def score_pair(a, b, n_boot=2000, seed=0):
+    """Top-1 agreement of two experiments on their shared participants with a known top-1 in both."""
+    ids_a, _, ranks_a, _ = a
+    ids_b, _, ranks_b, _ = b
+    shared, ia, ib = np.intersect1d(ids_a, ids_b, return_indices=True)
+    top_a, top_b = ranks_a[ia, 0], ranks_b[ib, 0]
+    known = (top_a >= 0) & (top_b >= 0)
+    shared, agree = shared[known], top_a[known] == top_b[known]
+    return {
+        "n": int(shared.size),
+        "top1_agreement": float(agree.mean()) if shared.size else None,
+        "top1_agreement_ci": bootstrap_ci(agree, n_boot, seed),
+    }
+
+
+class EvaluationCache:
+    """JSON file of scores keyed by assignments.csv hashes."""
+
+    def __init__(self, path=".assignment_eval.json"):
+        self.path = path
+        self.data = {"version": CACHE_VERSION, "experiments": {}, "pairs": {}}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self.data = data
+            except (json.JSONDecodeError, OSError):
+                pass
+        self.computed = 0
+
+    def get(self, table, key, compute):
+        if key not in self.data[table]:
+            self.data[table][key] = compute()
+            self.computed += 1
+        return self.data[table][key]
+
+    def save(self):
+        if not self.path or not self.computed:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+
+def evaluate(experiments=None, root=".", cache_path=".assignment_eval.json", n_boot=2000, seed=0):
+    """Scores for each experiment and each pair of experiments."""
+    experiments = experiments or find_experiments(root)
+    cache = EvaluationCache(cache_path and os.path.join(root, cache_path))
+    paths = {e: os.path.join(root, e, "assignments.csv") for e in experiments}
+    hashes = {e: file_hash(p) for e, p in paths.items()}
+    loaded = {}
+
+    def data(e):
+        if e not in loaded:
+            loaded[e] = load_assignments(paths[e])
+        return loaded[e]
+
+    params = f"{n_boot}:{seed}"
+    scores = {}
+    for e in experiments:
+        scores[e] = cache.get("experiments", f"{hashes[e]}:{params}",
+                              lambda: score_experiment(*data(e)[1:], n_boot=n_boot, seed=seed))
+    pairs = {}
+    for a, b in itertools.combinations(experiments, 2):
+        key = ":".join(sorted((hashes[a], hashes[b]))) + ":" + params
+        pairs[a, b] = cache.get("pairs", key, lambda: score_pair(data(a), data(b), n_boot=n_boot, seed=seed))
+    cache.save()
+    return {"experiments": scores, "pairs": pairs, "computed": cache.computed}
+
+
+def summary_frame(result):
+    """One row per experiment, for printing or st.dataframe."""
+    rows = []
+    for experiment, s in result["experiments"].items():
+        rows.append({"experiment": experiment, "n": s["n"],
+                     "top1": s["top1"], "top1_low": s["top1_ci"][0], "top1_high": s["top1_ci"][1],
+                     "top2": s["top2"], "top2_low": s["top2_ci"][0], "top2_high": s["top2_ci"][1],
+                     "mean_human_rank": s["mean_human_rank"], "marked_correct": s["marked_correct"]})
+    return pd.DataFrame(rows)
+
+
+def confusion_frame(score):
+    return pd.DataFrame(score["confusion"], index=pd.Index(DOMAINS, name="human"),
+                        columns=pd.Index(DOMAINS, name="model top-1"))
+
+
+def pair_frame(result):
+    rows = [{"a": a, "b": b, **{k: v for k, v in p.items() if k != "top1_agreement_ci"},
+             "low": p["top1_agreement_ci"][0], "high": p["top1_agreement_ci"][1]}
+            for (a, b), p in result["pairs"].items()]
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("experiments", nargs="*", help="experiment folders (default: all with assignments.csv)")
+    parser.add_argument("--bootstrap", type=int, default=2000, help="bootstrap resamples for the intervals")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--json", help="also write the full results to this file")
+    args = parser.parse_args()
+
+    result = evaluate(args.experiments, cache_path=None if args.no_cache else ".assignment_eval.json",
+                      n_boot=args.bootstrap, seed=args.seed)
+    with pd.option_context("display.width", 200, "display.max_colwidth", 60, "display.precision", 3):
+        print(summary_frame(result).to_string(index=False))
+        for experiment, score in result["experiments"].items():
+            print(f"\n{experiment}")
+            print(confusion_frame(score).to_string())
+        if result["pairs"]:
+            print("\nTop-1 agreement between experiments")
+            print(pair_frame(result).to_string(index=False))
+    print(f"\n{result['computed']} scores computed, the rest from cache")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"experiments": result["experiments"],
+                       "pairs": [{"a": a, "b": b, **p} for (a, b), p in result["pairs"].items()]}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from chat_stream import TimedReply
+
+
+class PendingReply:
+    """A greeting being generated in the background for one build."""
+
+    def __init__(self, key, message):
+        self.key = key
+        self.message = message
+        self.chunks = []
+        self.text = None
+        self.timing = None
+        self.error = None
+        self.future = None
+        self.superseded = threading.Event()
+
+    @property
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def cancel(self):
+        """Drop this build: not started -> never runs, running -> stops reading the stream."""
+        self.superseded.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+class SessionWorkers:
+    """One single-thread executor per session, so a session never has two model calls in flight.
+
+    An executor is shut down by forget() (SessionStore calls it when it
+    drops the session's chat) or by evict() once it has not been asked for
+    in idle_seconds. Work already queued still runs; the session gets a
+    new executor the next time it needs one.
+    """
+
+    def __init__(self, idle_seconds=900):
+        self.idle_seconds = idle_seconds
+        self._executors = {}  # session_id -> (executor, last_used)
+        self._lock = threading.Lock()
+
+    def executor(self, session_id):
+        with self._lock:
+            entry = self._executors.get(session_id)
+            if entry is None:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"build-{session_id[:8]}")
+            else:
+                executor = entry[0]
+            self._executors[session_id] = (executor, time.time())
+            return executor
+
+    def forget(self, session_id):
+        with self._lock:
+            entry = self._executors.pop(session_id, None)
+        if entry is not None:
+            entry[0].shutdown(wait=False)
+
+    def evict(self):
+        """Shut down the executors of sessions idle for more than idle_seconds."""
+        cutoff = time.time() - self.idle_seconds
+        with self._lock:
+            idle = [s for s, (_, used) in self._executors.items() if used < cutoff]
+        for session_id in idle:
+            self.forget(session_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._executors)
+
+
+def startGreeting(workers, session_id, chat, message, stream, key):
+    """Queue the greeting for a new build of this session.
+
+    An identical build that is still pending (a double-click) is reused.
+    Any other pending build is cancelled or, if already running, its
+    result is discarded.
+    """
+    old = st.session_state.get("pending_build")
+    if old is not None and not old.done and old.key == key:
+        return old
+    if old is not None:
+        old.cancel()
+
+    pending = PendingReply(key, message)
+
+    def job():
+        if pending.superseded.is_set():
+            return
+        reply = TimedReply(chat, message, stream=stream)
+        try:
+            for text in reply:
+                if pending.superseded.is_set():
+                    return
+                pending.chunks.append(text)
+        except Exception as exc:
+            pending.error = exc
+            return
+        pending.text = reply.text
+        pending.timing = reply.timing()
+
+    pending.future = workers.executor(session_id).submit(job)
+    st.session_state.pending_build = pending
+    return pending
+
+
+def collectGreeting():
+    """Return the finished greeting of the current build once, or None."""
+    pending = st.session_state.get("pending_build")
+    if pending is None or not pending.done:
+        return None
+    st.session_state.pending_build = None
+    if pending.superseded.is_set() or (pending.text is None and pending.error is None):
+        return None
+    if pending.timing:
+        st.session_state.setdefault("reply_timings", []).append(pending.timing)
+    return pending
+
+
+def buildPending(key=None):
+    """Whether a build is pending for this session (and, with key, that same build)."""
+    pending = st.session_state.get("pending_build")
+    return pending is not None and (key is None or pending.key == key)
+
+
+@st.fragment(run_every=0.5)
+def showPending():
+    """Show the greeting as it streams in; rerun the whole script when it is done."""
+    pending = st.session_state.get("pending_build")
+    if pending is None:
+        return
+    if pending.done:
+        st.rerun()
+    with st.chat_message("assistant"):
+        st.markdown("".join(pending.chunks) or "_Preparing your coach..._")
@@ -0,0 +1,305 @@
+"""Regenerate technicalSummary/ and assignments.csv for an experiment folder.
+
+Every participant in dataForLLM/ is sent to the model with the experiment's
+prompt.txt as system instruction. Requests run through an asyncio pipeline
+with a bounded number of workers, transient failures are retried, and every
+finished participant is checkpointed so an interrupted run resumes where it
+stopped.
+With <experiment>/pruning.json, weak variables are dropped from every table
+before it is sent (see variable_pruning.py).
+
+    python batch_runner.py assignmentChatSeperateSatisfaction_scalePenalty_ignoreDiet
+    python batch_runner.py <experiment> --stub --stub-latency 0.5   # offline, no API key
+    python batch_runner.py <experiment> --structured   # JSON ranking, no text parsing
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+
+import pandas as pd
+from natsort import natsorted
+
+from ranking_schema import DOMAINS, RANKING_SCHEMA, STRUCTURED_INSTRUCTION, RankingError, parse_ranking, \
+    parse_structured
+from model_router import ModelRouter, Policy
+from rate_limiter import BATCH, RateLimiter, TransientError, is_transient
+from variable_pruning import load_rule, pruned_payloads
+
+CSV_DIR = "./dataForLLM/"
+SUMMARY_SUFFIX = "_simulatedUser.txt"
+CHECKPOINT_FILE = ".batch_checkpoint.jsonl"
+
+
+# ---------------------------
+# Model backends
+# ---------------------------
+
+def make_gemini_generate(client, model="gemini-2.5-flash", temperature=0.2, structured=False, router=None):
+    """Return an async generate(system_instruction, message) backed by Gemini.
+
+    With structured=True the reply is JSON constrained to RANKING_SCHEMA.
+    With a ModelRouter the model comes from its "batch" policy (which may
+    hedge slow calls to a second model) instead of model.
+    """
+    from google.genai import types
+
+    schema = {"response_mime_type": "application/json", "response_json_schema": RANKING_SCHEMA} if structured else {}
+
+    async def generate(system_instruction, message):
+        config = types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            temperature=temperature,
+            **schema,
+        )
+        if router is not None:
+            response = await asyncio.to_thread(
+                router.call, "batch",
+                lambda m: client.models.generate_content(model=m, contents=message, config=config))
+            return response.text
+        response = await client.aio.models.generate_content(
+            model=model,
+            contents=message,
+            config=config,
+        )
+        return response.text
+
+    return generate
+
+
+def make_stub_generate(latency=0.2, jitter=0.1, failure_rate=0.0, seed=0, structured=False):
+    """Return an offline generate() with fake latency, failures and a ranking reply.
+
+    The ranking is derived from a hash of the message, so it is stable across
+    runs and the output files have the same shape as real ones.
+    """
+    rng = random.Random(seed)
+
+    async def generate(system_instruction, message):
+        await asyncio.sleep(max(0.0, latency + rng.uniform(-jitter, jitter)))
+        if rng.random() < failure_rate:
+            raise TransientError("stub failure")
+        digest = hashlib.sha256(message.encode("utf-8")).digest()
+        ranking = sorted(DOMAINS, key=lambda d: digest[DOMAINS.index(d)])
+        if structured:
+            return json.dumps({"ranking": [{"domain": d, "justification": "(stub)"} for d in ranking],
+                               "narrative": f"(stub reply, {len(message)} characters of data)"})
+        lines = "\n".join(f"{i}.  **{d}**" for i, d in enumerate(ranking, start=1))
+        return f"## Ranked Intervention Domains\n\n{lines}\n\n---\n\n(stub reply, {len(message)} characters of data)"
+
+    return generate
+
+
+# ---------------------------
+# Inputs and outputs
+# ---------------------------
+
+def load_participants(csv_dir=CSV_DIR):
+    """Map SubID to the participant table serialized as JSON records."""
+    participants = {}
+    for f in natsorted(os.listdir(csv_dir)):
+        if f.endswith(".csv"):
+            df = pd.read_csv(os.path.join(csv_dir, f)).iloc[:, 1:]
+            participants[f[:-len(".csv")]] = df.to_json(orient="records")
+    return participants
+
+
+def write_summary(summary_dir, sub_id, text, ranking=None):
+    """Write a summary file; structured runs also store the ranking with justifications."""
+    path = os.path.join(summary_dir, sub_id + SUMMARY_SUFFIX)
+    record = {"role": "model", "content": text}
+    if ranking is not None:
+        record["ranking"] = ranking
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump([record], f, indent=4)
+    os.replace(tmp, path)
+
+
+def read_checkpoint(path, prompt_sha):
+    """SubID -> ranking for participants finished with the current prompt."""
+    done = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partial line from an interrupted run
+                if record.get("prompt_sha") == prompt_sha:
+                    done[record["SubID"]] = record["ranking"]
+    return done
+
+
+def write_assignments(experiment, rankings):
+    """Write assignments.csv, keeping humanAssigned from the existing file.
+
+    CorrectAssignment is TRUE when the human choice is among the model's top
+    two domains, as in the hand-reviewed files.
+    """
+    path = os.path.join(experiment, "assignments.csv")
+    human = {}
+    if os.path.exists(path):
+        old = pd.read_csv(path)
+        human = dict(zip(old["SubID"], old["humanAssigned"]))
+    rows = []
+    for sub_id in natsorted(rankings):
+        ranking = (rankings[sub_id] + [""] * 4)[:4]
+        assigned = human.get(sub_id, "")
+        rows.append([sub_id, assigned, *ranking, "TRUE" if assigned and assigned in ranking[:2] else "FALSE"])
+    pd.DataFrame(rows, columns=["SubID", "humanAssigned", "0", "1", "2", "3", "CorrectAssignment"]).to_csv(path)
+    return path
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+
+async def run_batch(experiment, generate, concurrency=8, retries=4, backoff=1.0,
+                    csv_dir=CSV_DIR, only=None, log=print, structured=False, limiter=None):
+    """Generate summaries for every participant not yet checkpointed.
+
+    With structured=True, generate must return JSON matching RANKING_SCHEMA
+    (see make_gemini_generate); the ranking is read from it directly. With a
+    RateLimiter every attempt waits for it at batch priority, and its
+    jittered backoff is used between retries.
+    Returns a stats dict with counts, retries and wall time.
+    """
+    with open(os.path.join(experiment, "prompt.txt"), "r", encoding="utf-8") as f:
+        prompt = f.read()
+    if structured:
+        prompt += STRUCTURED_INSTRUCTION
+    # A pruning rule changes what is sent, so it is part of the checkpoint key
+    rule = load_rule(experiment)
+    pruning = rule.digest() if rule is not None and rule.active else ""
+    prompt_sha = hashlib.sha256((prompt + pruning).encode("utf-8")).hexdigest()
+
+    summary_dir = os.path.join(experiment, "technicalSummary")
+    os.makedirs(summary_dir, exist_ok=True)
+    checkpoint_path = os.path.join(summary_dir, CHECKPOINT_FILE)
+
+    participants = load_participants(csv_dir)
+    if only:
+        participants = {k: v for k, v in participants.items() if k in only}
+    if pruning:
+        participants, report = pruned_payloads(experiment, participants, rule, csv_dir)
+        saved = sum(r["saved"] for r in report)
+        log(f"{experiment}: {rule}, {saved} of {sum(r['tokens'] for r in report)} payload tokens pruned")
+    rankings = read_checkpoint(checkpoint_path, prompt_sha)
+    todo = [k for k in participants if k not in rankings
+            or not os.path.exists(os.path.join(summary_dir, k + SUMMARY_SUFFIX))]
+    stats = {"participants": len(participants), "skipped": len(participants) - len(todo),
+             "done": 0, "failed": [], "retries": 0, "latencies": []}
+    log(f"{experiment}: {len(todo)} to run, {stats['skipped']} already checkpointed")
+
+    queue = asyncio.Queue()
+    for sub_id in todo:
+        queue.put_nowait(sub_id)
+    lock = asyncio.Lock()
+
+    async def worker():
+        while True:
+            try:
+                sub_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            tokens = (len(prompt) + len(participants[sub_id]) + 3) // 4
+            for attempt in range(retries + 1):
+                try:
+                    if limiter is not None:
+                        await asyncio.to_thread(limiter.acquire, tokens, BATCH)
+                    text = await generate(prompt, participants[sub_id])
+                    break
+                except Exception as exc:
+                    if attempt == retries or not is_transient(exc):
+                        log(f"{sub_id}: failed ({exc!r})")
+                        stats["failed"].append(sub_id)
+                        text = None
+                        break
+                    stats["retries"] += 1
+                    if limiter is not None:
+                        await asyncio.sleep(limiter.backoff_delay(attempt))
+                    else:
+                        await asyncio.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            if text is None:
+                continue
+            if structured:
+                try:
+                    reply = parse_structured(text)
+                except RankingError as exc:
+                    log(f"{sub_id}: failed ({exc})")
+                    stats["failed"].append(sub_id)
+                    continue
+                ranking = [item["domain"] for item in reply["ranking"]]
+                write_summary(summary_dir, sub_id, reply["narrative"], reply["ranking"])
+            else:
+                ranking = parse_ranking(text)
+                write_summary(summary_dir, sub_id, text)
+            async with lock:
+                with open(checkpoint_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"SubID": sub_id, "prompt_sha": prompt_sha, "ranking": ranking}) + "\n")
+                rankings[sub_id] = ranking
+                stats["done"] += 1
+                stats["latencies"].append(time.perf_counter() - start)
+            log(f"{sub_id}: {' > '.join(ranking) or 'no ranking found'}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    stats["wall_time"] = time.perf_counter() - start
+
+    if not stats["failed"]:
+        write_assignments(experiment, {k: v for k, v in rankings.items() if k in participants})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("experiment", help="experiment folder containing prompt.txt")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument("--only", nargs="*", help="SubIDs to run, e.g. perma2 perma4")
+    parser.add_argument("--structured", action="store_true",
+                        help="ask for a JSON ranking with justifications instead of parsing free text")
+    parser.add_argument("--hedge-model", help="second model to hedge slow calls to, e.g. gemini-2.5-flash-lite")
+    parser.add_argument("--rpm", type=int, help="requests per minute allowed (default: unlimited)")
+    parser.add_argument("--tpm", type=int, help="tokens per minute allowed (default: unlimited)")
+    parser.add_argument("--stub", action="store_true", help="use the offline stub instead of Gemini")
+    parser.add_argument("--stub-latency", type=float, default=0.2)
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    limiter = RateLimiter(args.rpm, args.tpm, retries=args.retries) if args.rpm or args.tpm else None
+    router = None
+    if args.stub:
+        generate = make_stub_generate(latency=args.stub_latency, failure_rate=args.stub_failure_rate,
+                                      structured=args.structured)
+    else:
+        from google import genai
+        client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+        if args.hedge_model:
+            router = ModelRouter({"batch": Policy([args.model, args.hedge_model], hedge=True)})
+        generate = make_gemini_generate(client, args.model, args.temperature, args.structured, router)
+
+    stats = asyncio.run(run_batch(args.experiment, generate, args.concurrency, args.retries, only=args.only,
+                                  structured=args.structured, limiter=limiter))
+    lat = sorted(stats["latencies"])
+    print(f"done {stats['done']}, skipped {stats['skipped']}, failed {len(stats['failed'])}, "
+          f"retries {stats['retries']}, wall {stats['wall_time']:.2f}s")
+    if lat:
+        print(f"throughput {len(lat) / stats['wall_time']:.2f}/s, "
+              f"p50 {lat[len(lat) // 2]:.2f}s, max {lat[-1]:.2f}s")
+    if router is not None:
+        batch = router.stats()["sites"]["batch"]
+        print(f"hedged {batch['hedged']} of {batch['calls']} calls, hedge won {batch['hedge_wins']}")
+    if stats["failed"]:
+        print("assignments.csv not written, rerun to retry: " + " ".join(stats["failed"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Payload and build time of binned_chart.py specs against the BinnedFigures JPEGs.
+
+For every participant in dataForLLM, reports the size of the Vega-Lite spec
+sent to the browser and the time to build it from the statistics store,
+next to the size of the source JPEG where the participant has one.
+
+    python benchmarks/bench_binned_chart.py
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from binned_chart import chart_spec
+from participant_store import load_store
+
+BINNED_DIR = "BinnedFigures"
+
+
+def main():
+    os.chdir(ROOT)
+    table = load_store()
+    names = list(table["SubID"].cat.categories)
+    spec_kb, build_ms, jpeg_kb = [], [], []
+    for name in names:
+        start = time.perf_counter()
+        spec = chart_spec(table, name)
+        payload = json.dumps(spec, separators=(",", ":"))
+        build_ms.append((time.perf_counter() - start) * 1000)
+        spec_kb.append(len(payload.encode()) / 1024)
+        figure = os.path.join(BINNED_DIR, f"{name}_shap.jpg")
+        if os.path.exists(figure):
+            jpeg_kb.append(os.path.getsize(figure) / 1024)
+
+    print(f"participants with data: {len(names)}, with a JPEG figure: {len(jpeg_kb)}")
+    print(f"{'':>14} {'median':>10} {'max':>10}")
+    print(f"{'spec KB':>14} {statistics.median(spec_kb):10.1f} {max(spec_kb):10.1f}")
+    print(f"{'spec build ms':>14} {statistics.median(build_ms):10.2f} {max(build_ms):10.2f}")
+    if jpeg_kb:
+        print(f"{'JPEG KB':>14} {statistics.median(jpeg_kb):10.0f} {max(jpeg_kb):10.0f}")
+        print(f"JPEG / spec: {statistics.median(jpeg_kb) / statistics.median(spec_kb):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Precision, recall and latency of prefilter.py on the labeled local corpus.
+
+The classifier is scored with k-fold cross-validation (trained on the other
+folds each time), once with the rules alone and once with rules plus the
+classifier. A "deflection" counts as correct only if it has the right label;
+on-topic messages that are deflected are the costly mistake and are
+reported separately. Latency is per check() call over the whole corpus.
+
+Cross-validation still shares the rules with the corpus they were written
+against, so the filter is also scored, trained on the whole corpus, against
+a held-out set that was never used for training and is mostly hard negatives
+(on-topic messages that mention weather, stock, "pretend", swearing...).
+
+    python benchmarks/bench_prefilter.py --folds 5 --threshold 0.9
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from prefilter import CORPUS, LABELS, REPLIES, Prefilter, load_examples
+
+
+def cross_validate(examples, folds, **kwargs):
+    """Predicted label for every example, from a filter trained without its fold."""
+    order = list(range(len(examples)))
+    random.Random(0).shuffle(order)
+    predicted = [None] * len(examples)
+    for k in range(folds):
+        held = set(order[k::folds])
+        prefilter = Prefilter([e for i, e in enumerate(examples) if i not in held], **kwargs)
+        for i in held:
+            predicted[i] = prefilter.check(examples[i][0]).label
+    return predicted
+
+
+def report(name, examples, predicted):
+    print(f"\n{name}")
+    print(f"{'label':>10} {'n':>5} {'precision':>10} {'recall':>8}")
+    for label in REPLIES:
+        truth = [e[1] == label for e in examples]
+        hits = [p == label for p in predicted]
+        tp = sum(t and h for t, h in zip(truth, hits))
+        precision = tp / sum(hits) if sum(hits) else float("nan")
+        recall = tp / sum(truth) if sum(truth) else float("nan")
+        print(f"{label:>10} {sum(truth):5d} {precision:10.3f} {recall:8.3f}")
+    onTopic = [p for e, p in zip(examples, predicted) if e[1] == "on_topic"]
+    wrong = sum(p != "on_topic" for p in onTopic)
+    passed = sum(p == "on_topic" for e, p in zip(examples, predicted) if e[1] != "on_topic")
+    print(f"on-topic deflected: {wrong}/{len(onTopic)} ({wrong / len(onTopic):.1%}); "
+          f"flagged messages passed to the model: {passed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(ROOT, CORPUS))
+    parser.add_argument("--holdout", default=os.path.join(HERE, "prefilter_holdout.jsonl"))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--repeats", type=int, default=20, help="passes over the corpus for latency")
+    args = parser.parse_args()
+
+    examples = load_examples(args.corpus)
+    counts = {label: sum(e[1] == label for e in examples) for label in LABELS}
+    print(f"{len(examples)} examples: " + ", ".join(f"{label} {n}" for label, n in counts.items()))
+    report("rules only", examples, cross_validate(examples, args.folds, use_model=False))
+    report(f"rules + classifier (threshold {args.threshold})", examples,
+           cross_validate(examples, args.folds, threshold=args.threshold))
+
+    holdout = load_examples(args.holdout)
+    print(f"\nheld out: {len(holdout)} examples from {os.path.basename(args.holdout)}")
+    for name, kwargs in (("rules only", {"use_model": False}), ("rules + classifier", {"threshold": args.threshold})):
+        prefilter = Prefilter(examples, **kwargs)
+        report(f"held out, {name}", holdout, [prefilter.check(text).label for text, _label in holdout])
+
+    start = time.perf_counter()
+    prefilter = Prefilter(examples, threshold=args.threshold)
+    print(f"\ntraining: {(time.perf_counter() - start) * 1000:.1f}ms")
+    timings = []
+    for _ in range(args.repeats):
+        for text, _label in examples:
+            start = time.perf_counter()
+            prefilter.check(text)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    p50 = statistics.median(timings)
+    p99 = timings[int(0.99 * (len(timings) - 1))]
+    print(f"check(): p50 {p50 * 1e6:.0f}us  p99 {p99 * 1e6:.0f}us  max {timings[-1] * 1e6:.0f}us "
+          f"over {len(timings)} calls")
+
+
+if __name__ == "__main__":
+    main()
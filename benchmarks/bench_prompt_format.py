@@ -0,0 +1,145 @@
+"""Token count and build latency of every prompt_format serializer on sampleData/.
+
+    python benchmarks/bench_prompt_format.py            # local token estimate
+    python benchmarks/bench_prompt_format.py --api      # exact counts from Gemini count_tokens
+    python benchmarks/bench_prompt_format.py --rank 10  # does the model rank the same from each layout?
+
+--rank N asks Gemini to rank the variables of the first N sample files from
+each layout (temperature 0) and reports how often the ranking matches the one
+from records. records is ranked twice, so the first row is the agreement to
+expect from noise alone; a layout should match about as often before it
+becomes the default. Run from the repository root.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_compaction import estimate_tokens
+from prompt_format import SERIALIZERS, serialize
+
+SAMPLE_DIR = "./sampleData/"
+
+
+def build_header(path, fmt, domain):
+    with open(path, "r") as f:
+        jsonData = json.load(f)
+    return f"""You are a health coach helping me with {domain}. I want to minimize depressed mood.
+    This is some EMA data that summarizes my lifestyle and how it relates to my mood. Focus on these variables when giving suggestions: 
+    {serialize(fmt, jsonData)}
+    """
+
+
+RANK_INSTRUCTION = """
+Rank every variable above from the one I should work on first to the one that matters least for my mood.
+Respond with JSON: {"ranking": [the variable names, most promising first]}."""
+
+
+def variables(path):
+    with open(path, "r") as f:
+        jsonData = json.load(f)
+    records = json.loads(jsonData) if isinstance(jsonData, str) else jsonData
+    return [row["level_0"] for row in records if row["level_1"] == "MEAN"]
+
+
+def make_ranker(model):
+    """rank(prompt, names): the model's ordering of names, constrained to exactly those names."""
+    from google import genai
+    from google.genai import types
+
+    options = {"http_options": types.HttpOptions(base_url=os.environ["GEMINI_BASE_URL"])} \
+        if os.environ.get("GEMINI_BASE_URL") else {}
+    client = genai.Client(api_key=os.environ["GEMINI_API_KEY"], **options)
+
+    def rank(prompt, names):
+        schema = {"type": "object", "required": ["ranking"], "properties": {"ranking": {
+            "type": "array", "minItems": len(names), "maxItems": len(names),
+            "items": {"type": "string", "enum": names}}}}
+        config = types.GenerateContentConfig(temperature=0.0, response_mime_type="application/json",
+                                             response_json_schema=schema)
+        response = client.models.generate_content(model=model, contents=prompt, config=config)
+        return json.loads(response.text)["ranking"]
+
+    return rank
+
+
+def compare_rankings(rank, paths):
+    """Per layout: rankings that match the records ranking in full and at the top, and invalid replies."""
+    runs = [("records", "records (again)")] + [(fmt, fmt) for fmt in SERIALIZERS if fmt != "records"]
+    counts = {name: {"same order": 0, "same top 1": 0, "invalid": 0} for _fmt, name in runs}
+    counts["records"] = {"invalid": 0}
+
+    def ranked(path, fmt, names):
+        domain = os.path.basename(path).split("_")[0]
+        try:
+            ranking = rank(build_header(path, fmt, domain) + RANK_INSTRUCTION, names)
+        except (ValueError, KeyError, TypeError):
+            return None
+        return ranking if isinstance(ranking, list) and sorted(map(str, ranking)) == sorted(names) else None
+
+    for path in paths:
+        names = variables(path)
+        reference = ranked(path, "records", names)
+        if reference is None:
+            counts["records"]["invalid"] += 1
+            continue
+        for fmt, name in runs:
+            ranking = ranked(path, fmt, names)
+            if ranking is None:
+                counts[name]["invalid"] += 1
+                continue
+            counts[name]["same order"] += ranking == reference
+            counts[name]["same top 1"] += ranking[:1] == reference[:1]
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--api", action="store_true", help="count tokens with the Gemini API")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--rank", type=int, default=0, metavar="N",
+                        help="compare the model's rankings across layouts on the first N files")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    args = parser.parse_args()
+
+    count = estimate_tokens
+    if args.api:
+        from google import genai
+        client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+        count = lambda text: client.models.count_tokens(model="gemini-2.5-flash", contents=text).total_tokens
+
+    files = sorted(f for f in os.listdir(SAMPLE_DIR) if not f.endswith(".csv"))
+    totals = {fmt: [0, 0.0] for fmt in SERIALIZERS}
+    print(f"{'file':<14}" + "".join(f"{fmt + ' tok':>12}{fmt + ' ms':>12}" for fmt in SERIALIZERS))
+    for name in files:
+        path = os.path.join(SAMPLE_DIR, name)
+        domain = name.split("_")[0]
+        row = f"{name:<14}"
+        for fmt in SERIALIZERS:
+            tokens = count(build_header(path, fmt, domain))
+            ms = timeit.timeit(lambda: build_header(path, fmt, domain), number=args.repeat) / args.repeat * 1000
+            totals[fmt][0] += tokens
+            totals[fmt][1] += ms
+            row += f"{tokens:>12}{ms:>12.3f}"
+        print(row)
+    base = totals["records"][0]
+    print()
+    for fmt, (tokens, ms) in totals.items():
+        print(f"{fmt:<8} mean {tokens / len(files):8.1f} tokens ({tokens / base:6.1%} of records), "
+              f"mean build {ms / len(files):.3f} ms")
+
+    if args.rank:
+        paths = [os.path.join(SAMPLE_DIR, name) for name in files[:args.rank]]
+        print(f"\nranking agreement with records, {args.model}, {len(paths)} files")
+        counts = compare_rankings(make_ranker(args.model), paths)
+        print(f"records          invalid {counts.pop('records')['invalid']} (file skipped)")
+        for name, c in counts.items():
+            print(f"{name:<16} same order {c['same order']:>3}/{len(paths)}  "
+                  f"same top 1 {c['same top 1']:>3}/{len(paths)}  invalid {c['invalid']}")
+
+
+if __name__ == "__main__":
+    main()
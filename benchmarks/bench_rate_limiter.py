@@ -0,0 +1,104 @@
+"""Drive the shared RateLimiter against a fake Gemini that returns 429s.
+
+Interactive chat turns and batch generate_content calls share one limiter
+and one client pointed at benchmarks/fake_gemini.py. The report shows how
+long each priority waited in the queue, how many calls were retried or gave
+up, and the turn latency users would see. The buckets are drained before the
+run and every thread starts at once, so both priorities are queued while
+the bucket is empty and the queue order, not a full bucket, decides who
+waits.
+
+    python benchmarks/bench_rate_limiter.py --rpm 60 --error-rate 0.2
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from google import genai
+from google.genai import types
+
+from fake_gemini import FakeGemini
+from rate_limiter import BATCH, INTERACTIVE, LimitedChat, ModelBusyError, RateLimiter, _percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rpm", type=int, default=60)
+    parser.add_argument("--tpm", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=8, help="interactive chat sessions")
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=40, help="batch calls queued at the same time")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="share of fake calls answered with 429")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--backoff", type=float, default=0.2)
+    args = parser.parse_args()
+
+    fake = FakeGemini(latency=args.latency, jitter=args.latency / 4, error_rate=args.error_rate).start()
+    client = genai.Client(api_key="fake", http_options=types.HttpOptions(
+        base_url=fake.url, retry_options=types.HttpRetryOptions(attempts=1)))
+    limiter = RateLimiter(args.rpm, args.tpm, backoff=args.backoff)
+    for _ in range(args.rpm):
+        limiter.acquire()
+    limiter.waits.clear()
+    limiter.counters.clear()
+    start_line = threading.Barrier(args.batch + args.users)
+    latencies = {"interactive": [], "batch": []}
+    outcomes = {"ok": 0, "busy": 0}
+    lock = threading.Lock()
+
+    def done(kind, start, ok):
+        with lock:
+            latencies[kind].append(time.perf_counter() - start)
+            outcomes["ok" if ok else "busy"] += 1
+
+    def user(n):
+        chat = LimitedChat(client.chats.create(model="gemini-2.5-flash"), limiter, INTERACTIVE)
+        start_line.wait()
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            try:
+                chat.send_message(f"user {n} turn {turn}: how can I sleep better?")
+                done("interactive", start, True)
+            except ModelBusyError:
+                done("interactive", start, False)
+
+    def batch_call(n):
+        start_line.wait()
+        start = time.perf_counter()
+        try:
+            limiter.call(lambda: client.models.generate_content(model="gemini-2.5-flash",
+                                                                contents=f"participant {n} " * 200),
+                         tokens=400, priority=BATCH)
+            done("batch", start, True)
+        except ModelBusyError:
+            done("batch", start, False)
+
+    threads = [threading.Thread(target=batch_call, args=(n,)) for n in range(args.batch)]
+    threads += [threading.Thread(target=user, args=(n,)) for n in range(args.users)]
+    begin = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - begin
+    fake.stop()
+
+    stats = limiter.stats()
+    print(f"{stats['requests']} attempts in {wall:.1f}s (limit {args.rpm}/min), fake 429s {fake.errors}, "
+          f"retries {stats['retries']}, gave up {stats['gave_up']}, ok {outcomes['ok']}, busy {outcomes['busy']}")
+    for kind in ("interactive", "batch"):
+        print(f"{kind:<12} queue wait p50/p95 {stats[f'wait_{kind}_p50_s'] or 0:.2f}/"
+              f"{stats[f'wait_{kind}_p95_s'] or 0:.2f}s  call latency p50/p95 "
+              f"{_percentile(latencies[kind], 50) or 0:.2f}/{_percentile(latencies[kind], 95) or 0:.2f}s")
+    below = all((stats[f"wait_interactive_{q}_s"] or 0) < (stats[f"wait_batch_{q}_s"] or 0) for q in ("p50", "p95"))
+    print(f"interactive waits {'below' if below else 'NOT below'} batch waits at p50 and p95")
+
+
+if __name__ == "__main__":
+    main()
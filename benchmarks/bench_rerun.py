@@ -0,0 +1,76 @@
+"""Rerun time of the chat apps against conversation length.
+
+Seeds a headless session with N synthetic messages (long English and
+Chinese assistant replies, as the assignment coach writes them), then
+times a plain rerun (what a sidebar edit costs) and a chat turn against
+benchmarks/fake_gemini.py with no model latency.
+
+    python benchmarks/bench_rerun.py --app llm_chat_app.py --lengths 0 20 80 320
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from fake_gemini import FakeGemini
+
+REPLY = ("Thanks for sharing how your week went. Let's look at your sleep together. "
+         "谢谢你分享这一周的情况。我们一起来看看你的睡眠。") * 12
+
+
+def messages(n):
+    return [{"role": "user", "content": f"Message {i}: I slept badly again."} if i % 2 == 0
+            else {"role": "assistant", "content": f"**Reply {i}.** {REPLY}"} for i in range(n)]
+
+
+def timed(step, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        step()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default="llm_chat_app.py")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[0, 20, 80, 320])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    fake = FakeGemini(latency=0.0, jitter=0.0).start()
+    os.environ["GEMINI_BASE_URL"] = fake.url
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    from streamlit.testing.v1 import AppTest
+
+    print(f"{'messages':>8} {'rerun':>9} {'turn':>9}")
+    for n in args.lengths:
+        at = AppTest.from_file(os.path.join(ROOT, args.app), default_timeout=120)
+        at.run()
+        box = at.sidebar.selectbox[0]
+        box.select(box.options[1] if box.options[0] is None else box.options[0]).run()
+        [b for b in at.sidebar.button if b.label == "Build ChatBot"][0].click().run()
+        for _ in range(100):
+            if at.session_state["pending_build"] is None:
+                break
+            time.sleep(0.05)
+            at.run()
+        at.session_state["messages"] = messages(n)
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        rerun = timed(at.run, args.repeat)
+        turn = timed(lambda: at.chat_input[0].set_value("And today?").run(), args.repeat)
+        print(f"{n:>8} {rerun * 1000:8.1f}ms {turn * 1000:8.1f}ms")
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
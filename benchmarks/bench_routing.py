@@ -0,0 +1,120 @@
+"""Compare tail latency with and without hedged requests.
+
+Two stub backends with injected delays stand in for the models: the primary
+is usually fast but sometimes stalls, the hedge model is steady. The same
+sequence of calls runs through a ModelRouter without hedging, with hedging,
+and with hedging plus adaptive model choice. With --fake the calls are chat
+turns through RoutedChat against benchmarks/fake_gemini.py instead.
+
+    python benchmarks/bench_routing.py --calls 300 --stall-rate 0.08
+    python benchmarks/bench_routing.py --fake --calls 60
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from model_router import ModelRouter, Policy, RoutedChat, _percentile
+
+PRIMARY = "gemini-2.5-flash"
+HEDGE = "gemini-2.5-flash-lite"
+
+
+def make_delay(args, seed):
+    """model -> delay(rng): the primary stalls now and then, the hedge model is steady."""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def primary(_rng=None):
+        with lock:
+            if rng.random() < args.stall_rate:
+                return args.stall
+            return rng.uniform(0.5, 1.5) * args.fast
+
+    def hedge(_rng=None):
+        with lock:
+            return rng.uniform(0.9, 1.1) * args.steady
+
+    return {PRIMARY: primary, HEDGE: hedge}
+
+
+def run(label, policy, args, attempt_for):
+    router = ModelRouter({"turn": policy, "greeting": policy})
+    attempt = attempt_for(router)
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        attempt(i)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(one, range(args.calls)))
+    site = router.stats()["sites"]["turn"]
+    rate = site["hedge_win_rate"]
+    print(f"{label:<18} p50 {_percentile(latencies, 50):.3f}s  p95 {_percentile(latencies, 95):.3f}s  "
+          f"p99 {_percentile(latencies, 99):.3f}s  hedged {site['hedged'] / max(1, site['calls']):5.1%}  "
+          f"hedge won {rate or 0:5.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--fast", type=float, default=0.1, help="typical primary latency (s)")
+    parser.add_argument("--stall", type=float, default=1.5, help="primary latency when it stalls (s)")
+    parser.add_argument("--stall-rate", type=float, default=0.08)
+    parser.add_argument("--steady", type=float, default=0.25, help="hedge model latency (s)")
+    parser.add_argument("--fake", action="store_true", help="chat turns against fake_gemini.py")
+    args = parser.parse_args()
+
+    policies = [
+        ("primary only", Policy([PRIMARY, HEDGE])),
+        ("hedged", Policy([PRIMARY, HEDGE], hedge=True, default_deadline=0.3, min_deadline=0.05)),
+        ("hedged+adaptive", Policy([PRIMARY, HEDGE], hedge=True, adaptive=True, default_deadline=0.3,
+                                   min_deadline=0.05)),
+    ]
+
+    if args.fake:
+        from google import genai
+        from google.genai import types
+
+        from fake_gemini import FakeGemini
+
+        for label, policy in policies:
+            fake = FakeGemini(latency=0.0, jitter=0.0, model_delay=make_delay(args, seed=1)).start()
+            client = genai.Client(api_key="fake", http_options=types.HttpOptions(base_url=fake.url))
+            config = types.GenerateContentConfig(temperature=0.2)
+
+            def attempt_for(router):
+                return lambda i: RoutedChat(client, config, router, first_site="turn").send_message(f"hello {i}")
+
+            run(label, policy, args, attempt_for)
+            fake.stop()
+        return
+
+    for label, policy in policies:
+        delay = make_delay(args, seed=1)
+
+        def attempt_for(router):
+            def attempt(i):
+                def backend(model):
+                    time.sleep(delay[model]())
+                    return model
+                return router.call("turn", backend)
+            return attempt
+
+        run(label, policy, args, attempt_for)
+
+
+if __name__ == "__main__":
+    main()
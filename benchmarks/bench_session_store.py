@@ -0,0 +1,93 @@
+"""Memory held by live chat objects for 100 sessions, with and without SessionStore eviction.
+
+Each simulated session has the assignmentChat system instruction, the
+greeting and a number of turns. "Resident" keeps every SDK chat alive as
+st.session_state.chat_obj used to; "store" writes the same sessions to
+SQLite and keeps at most --max-resident live chats.
+
+    python benchmarks/bench_session_store.py --turns 10 --max-resident 10
+
+Run from the repository root.
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google import genai
+from google.genai import types
+
+from session_store import SessionStore
+
+REPLY = "Thanks for sharing. Let's look at your sleep together and find one small step to try this week. " * 8
+
+
+def session_messages(summary, turns):
+    messages = [("user", "Hello" + summary, True), ("assistant", REPLY, False)]
+    for i in range(turns):
+        messages += [("user", f"Turn {i}: I am not sure that works for me.", False), ("assistant", REPLY, False)]
+    return messages
+
+
+def as_history(messages):
+    return [types.Content(role="model" if role == "assistant" else role, parts=[types.Part(text=text)])
+            for role, text, _ in messages]
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--max-resident", type=int, default=10)
+    args = parser.parse_args()
+
+    summary_dir = "./assignmentChatPromptOnlyStreamlit/"
+    with open(os.path.join(summary_dir, sorted(os.listdir(summary_dir))[0]), "r") as f:
+        summary = f.read()
+    client = genai.Client(api_key="unused")  # chats.create makes no request
+    config = types.GenerateContentConfig(system_instruction="You are a psychiatrist. " * 200, temperature=0.2)
+    messages = session_messages(summary, args.turns)
+
+    def resident():
+        return [client.chats.create(model="gemini-2.5-flash", config=config, history=as_history(messages))
+                for _ in range(args.sessions)]
+
+    tmp = tempfile.mkdtemp()
+
+    def stored():
+        store = SessionStore(os.path.join(tmp, "sessions.sqlite"), max_resident=args.max_resident)
+        for _ in range(args.sessions):
+            sid = uuid.uuid4().hex
+            store.start(sid, "bench", "role", "full role", 0.2, "file")
+            for role, text, hidden in messages:
+                store.append(sid, role, text, hidden)
+            store.put_chat(sid, client.chats.create(model="gemini-2.5-flash", config=config,
+                                                    history=store.history(sid)))
+        return store
+
+    before = measure(resident)
+    after = measure(stored)
+    print(f"{args.sessions} sessions x {args.turns} turns")
+    print(f"  all chats resident:     {before / 1024:9.0f} KB")
+    print(f"  store, {args.max_resident:>3} resident:    {after / 1024:9.0f} KB")
+    print(f"  saved per 100 sessions: {(before - after) / 1024 * 100 / args.sessions:9.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Offline throughput of conversation_sim.py for a grid of processes x concurrency.
+
+Runs the stub coach and patient (no API key, fixed latency per call) over
+every participant summary and persona, into a scratch folder, and reports
+conversations and patient turns per second for each setting.
+
+    python benchmarks/bench_simulator.py --repeats 4 --latency 0.2 --grid 1x8 2x8 4x8 4x32
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from conversation_sim import PERSONAS, SUMMARY_DIR, make_jobs, run_simulations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.1, help="stub latency per model call (s)")
+    parser.add_argument("--grid", nargs="+", default=["1x1", "1x8", "2x8", "4x8", "4x32"],
+                        help="PROCESSESxCONCURRENCY settings to run")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    jobs = make_jobs(SUMMARY_DIR, list(PERSONAS.values()), args.repeats)
+    settings = {"role": "benchmark coach", "temperature": 0.2, "patient_temperature": 0.8, "max_turns": 12,
+                "setup": "bench"}
+    print(f"{len(jobs)} conversations per setting, stub latency {args.latency:.2f}s")
+    print(f"{'setting':>8} {'wall':>8} {'conv/s':>8} {'turns/s':>8}")
+    for setting in args.grid:
+        processes, concurrency = (int(x) for x in setting.split("x"))
+        spec = {"stub": True, "stub_latency": args.latency, "stub_jitter": args.latency / 2, "seed": 0}
+        out = tempfile.mkdtemp(prefix="bench_sim_")
+        try:
+            records, wall = run_simulations(jobs, spec, settings, out, processes, concurrency, log=lambda _: None)
+        finally:
+            shutil.rmtree(out)
+        turns = sum(r["turns"] for r in records)
+        print(f"{setting:>8} {wall:7.1f}s {len(records) / wall:8.1f} {turns / wall:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
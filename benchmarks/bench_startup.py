@@ -0,0 +1,115 @@
+"""Cold-start cost of each Streamlit app: import time and first render.
+
+Every sample is a fresh Python process that imports streamlit, then runs
+the app's first script run headlessly with AppTest. Reported per app
+(median of --repeat processes):
+
+    imports       time spent importing modules during the first run
+    first element time from the start of the script to its first element
+    first render  the whole first run (AppTest setup included), until the page is complete
+
+plus which heavy dependencies the first run loaded.
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import builtins
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+APPS = ["llm_chat_app.py", "assignmentChat.py", "fineTuneAssignments.py"]
+HEAVY = ["google.genai", "pandas", "numpy", "pyarrow", "PIL", "natsort", "streamlit_modal"]
+
+
+def child(app):
+    """Measure one first run of app in this (fresh) process and print JSON."""
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    start = time.perf_counter()
+    import streamlit  # noqa: F401
+    from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+    from streamlit.testing.v1 import AppTest
+    streamlit_s = time.perf_counter() - start
+
+    # Time only outermost imports, so nested ones are not counted twice
+    spent = {"imports": 0.0, "depth": 0, "start": None, "first": None}
+    real_import = builtins.__import__
+
+    def timed_import(*args, **kwargs):
+        if spent["depth"]:
+            return real_import(*args, **kwargs)
+        spent["depth"] += 1
+        begin = time.perf_counter()
+        try:
+            return real_import(*args, **kwargs)
+        finally:
+            spent["imports"] += time.perf_counter() - begin
+            spent["depth"] -= 1
+
+    real_start, real_enqueue = ScriptRunContext.on_script_start, ScriptRunContext.enqueue
+
+    def on_script_start(self):
+        spent["start"] = time.perf_counter()
+        return real_start(self)
+
+    def enqueue(self, msg):
+        if spent["first"] is None and msg.HasField("delta"):
+            spent["first"] = time.perf_counter()
+        return real_enqueue(self, msg)
+
+    before = set(sys.modules)
+    at = AppTest.from_file(os.path.join(ROOT, app), default_timeout=120)
+    builtins.__import__ = timed_import
+    ScriptRunContext.on_script_start = on_script_start
+    ScriptRunContext.enqueue = enqueue
+    begin = time.perf_counter()
+    at.run()
+    render_s = time.perf_counter() - begin
+    builtins.__import__ = real_import
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    loaded = set(sys.modules) - before
+    print(json.dumps({
+        "streamlit_s": streamlit_s,
+        "imports_s": spent["imports"],
+        "first_element_s": (spent["first"] or begin) - (spent["start"] or begin),
+        "render_s": render_s,
+        "heavy": [name for name in HEAVY if name in loaded],
+    }))
+
+
+def sample(app):
+    out = subprocess.run([sys.executable, __file__, "--child", app], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", default=APPS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    print(f"{'app':<26} {'streamlit':>9} {'imports':>9} {'first el.':>9} {'render':>9}  heavy modules loaded")
+    for app in args.apps:
+        runs = [sample(app) for _ in range(args.repeat)]
+        med = {k: statistics.median(r[k] for r in runs)
+               for k in ("streamlit_s", "imports_s", "first_element_s", "render_s")}
+        print(f"{app:<26} {med['streamlit_s'] * 1000:7.0f}ms {med['imports_s'] * 1000:7.0f}ms "
+              f"{med['first_element_s'] * 1000:7.0f}ms {med['render_s'] * 1000:7.0f}ms  "
+              f"{', '.join(runs[-1]['heavy']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
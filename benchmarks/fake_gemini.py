@@ -0,0 +1,182 @@
+"""Local stand-in for the Gemini REST API.
+
+Serves generateContent, streamGenerateContent (SSE) and countTokens with a
+configurable latency, jitter and error rate, so the apps and batch jobs can
+be driven offline. Requests with a JSON response schema get a structured
+ranking reply. Point the apps at it with GEMINI_BASE_URL:
+
+    python benchmarks/fake_gemini.py --port 8765 --latency 0.8 --jitter 0.3
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=fake streamlit run llm_chat_app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DOMAINS = ["Positivity", "Sleep", "Exercise", "Diet"]
+ROUTE = re.compile(r"^/[^/]+/models/(?P<model>[^:/]+):(?P<method>\w+)")
+
+
+def _tokens(text):
+    return (len(text) + 3) // 4
+
+
+def _text_of(body):
+    parts = []
+    for content in body.get("contents", []):
+        parts += [p.get("text", "") for p in content.get("parts", [])]
+    system = body.get("systemInstruction") or {}
+    parts += [p.get("text", "") for p in system.get("parts", [])]
+    return "\n".join(parts)
+
+
+class FakeGemini:
+    """Threaded fake server; use as a context manager or call start()/stop()."""
+
+    def __init__(self, port=0, latency=0.5, jitter=0.2, first_chunk=None, chunks=6,
+                 error_rate=0.0, error_code=429, reply_words=80, seed=0, model_delay=None):
+        self.latency = latency
+        self.model_delay = model_delay or {}  # model -> extra seconds before answering
+        self.jitter = jitter
+        self.first_chunk = latency / 3 if first_chunk is None else first_chunk
+        self.chunks = chunks
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.reply_words = reply_words
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay(self, base):
+        with self._lock:
+            return max(0.0, base + self._rng.uniform(-self.jitter, self.jitter))
+
+    def _fail(self):
+        with self._lock:
+            self.requests += 1
+            if self._rng.random() < self.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+    def reply(self, prompt, structured=False):
+        ranking = sorted(DOMAINS, key=lambda d: zlib.crc32(f"{d}{len(prompt)}".encode()))
+        if structured:
+            return json.dumps({"ranking": [{"domain": d, "justification": "Fake justification."} for d in ranking],
+                               "narrative": "Thanks for sharing. Let's keep working on small, realistic steps."})
+        lines = "\n".join(f"{i}.  **{d}**" for i, d in enumerate(ranking, start=1))
+        filler = " ".join(["Let's keep working on small, realistic steps together."] * (self.reply_words // 8))
+        return f"Thanks for sharing.\n\n{lines}\n\n{filler}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, code, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                match = ROUTE.match(self.path)
+                if not match:
+                    self._json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+                    return
+                method = match.group("method")
+                extra = fake.model_delay.get(match.group("model"), 0.0)
+                if extra and method != "countTokens":
+                    time.sleep(extra(fake._rng) if callable(extra) else extra)
+                prompt = _text_of(body)
+                if method == "countTokens":
+                    self._json(200, {"totalTokens": _tokens(prompt)})
+                    return
+                if fake._fail():
+                    time.sleep(fake._delay(fake.first_chunk))
+                    self._json(fake.error_code, {"error": {"code": fake.error_code, "message": "fake failure",
+                                                           "status": "RESOURCE_EXHAUSTED"}})
+                    return
+                config = body.get("generationConfig") or {}
+                text = fake.reply(prompt, structured=config.get("responseMimeType") == "application/json")
+                usage = {"promptTokenCount": _tokens(prompt), "candidatesTokenCount": _tokens(text),
+                         "totalTokenCount": _tokens(prompt) + _tokens(text)}
+                if method == "generateContent":
+                    time.sleep(fake._delay(fake.latency))
+                    self._json(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                                                     "finishReason": "STOP"}],
+                                     "usageMetadata": usage, "modelVersion": match.group("model")})
+                elif method == "streamGenerateContent":
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    time.sleep(fake._delay(fake.first_chunk))
+                    size = max(1, len(text) // fake.chunks + 1)
+                    pieces = [text[i:i + size] for i in range(0, len(text), size)]
+                    rest = max(0.0, fake.latency - fake.first_chunk) / max(1, len(pieces) - 1)
+                    for i, piece in enumerate(pieces):
+                        chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}],
+                                 "modelVersion": match.group("model")}
+                        if i == len(pieces) - 1:
+                            chunk["candidates"][0]["finishReason"] = "STOP"
+                            chunk["usageMetadata"] = usage
+                        self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\r\n\r\n")
+                        self.wfile.flush()
+                        if i < len(pieces) - 1:
+                            time.sleep(rest)
+                    self.close_connection = True
+                else:
+                    self._json(404, {"error": {"code": 404, "message": method, "status": "NOT_FOUND"}})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-code", type=int, default=429)
+    args = parser.parse_args()
+    fake = FakeGemini(args.port, args.latency, args.jitter, error_rate=args.error_rate, error_code=args.error_code)
+    print(f"fake Gemini on {fake.url}")
+    fake.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
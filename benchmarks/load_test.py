@@ -0,0 +1,214 @@
+"""Replay simulated users against the Streamlit apps with a fake Gemini backend.
+
+Each simulated user is a headless AppTest session that builds the chatbot,
+waits for the background greeting and sends a scripted multi-turn
+conversation. AppTest keeps one runtime per
+process, so each user runs in its own worker process, all talking to one
+benchmarks/fake_gemini.py server, at increasing concurrency. Memory per
+session is what the session allocated in its worker (tracemalloc). The
+report covers reruns per second, p50/p95/p99 turn latency and memory per
+session, and is saved under benchmarks/results/ so runs can be compared.
+
+    python benchmarks/load_test.py --app llm_chat_app.py --concurrency 1 4 16
+    python benchmarks/load_test.py --app assignmentChat.py --compare benchmarks/results/<old>.json
+
+Run from the repository root.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from fake_gemini import FakeGemini
+
+RESULTS_DIR = os.path.join(HERE, "results")
+
+# Scripted users: what to select before building, then the user turns
+SCRIPTS = {
+    "llm_chat_app.py": {
+        "select": "Sleep",
+        "turns": [
+            "Hi, I have been feeling low lately.",
+            "I usually go to bed after midnight.",
+            "What could I change first?",
+            "That sounds hard with my work schedule.",
+            "Okay, I can try going to bed 30 minutes earlier.",
+        ],
+    },
+    "assignmentChat.py": {
+        "select": None,  # first summary file
+        "turns": [
+            "Hello, what did you find?",
+            "I'm not sure I want to work on that.",
+            "I don't have much time in the evenings.",
+            "What else could I try?",
+            "Okay, I will give it a go.",
+        ],
+    },
+}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def run_user(app, stream):
+    """One simulated user in its own process (AppTest keeps a per-process runtime)."""
+    os.chdir(ROOT)
+    from streamlit.testing.v1 import AppTest
+
+    script = SCRIPTS[app]
+    # One throwaway run so module imports are not counted as session memory
+    AppTest.from_file(os.path.join(ROOT, app), default_timeout=120).run()
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    runs, turns = [], []
+    begin = time.time()
+    try:
+        at = AppTest.from_file(os.path.join(ROOT, app), default_timeout=120)
+
+        def timed(step):
+            start = time.perf_counter()
+            step.run()
+            runs.append(time.perf_counter() - start)
+            if at.exception:
+                raise RuntimeError(at.exception[0].value)
+
+        timed(at)
+        box = at.sidebar.selectbox[0]
+        timed(box.select(script["select"] or box.options[0]))
+        stream_toggle = [t for t in at.sidebar.toggle if t.label == "Stream replies"]
+        if stream_toggle:
+            timed(stream_toggle[0].set_value(stream))
+        timed([b for b in at.sidebar.button if b.label == "Build ChatBot"][0].click())
+        # The greeting is generated in the background and the chat input stays disabled until it is
+        # collected; AppTest never runs the showPending fragment, so rerun until it is in
+        deadline = time.monotonic() + 120
+        while at.session_state["pending_build"] is not None:
+            if time.monotonic() > deadline:
+                raise TimeoutError("greeting still pending after 120s")
+            time.sleep(0.05)
+            timed(at)
+        for turn in script["turns"]:
+            start = time.perf_counter()
+            timed(at.chat_input[0].set_value(turn))
+            turns.append(time.perf_counter() - start)
+        error = None
+    except Exception as exc:
+        error = repr(exc)
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0] - base
+    return {"runs": runs, "turns": turns, "begin": begin, "end": time.time(), "memory": memory, "error": error}
+
+
+def run_level(app, concurrency, stream):
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=concurrency, mp_context=ctx) as pool:
+        # Warm the workers up so interpreter start-up is not counted
+        list(pool.map(_warm, range(concurrency)))
+        users = list(pool.map(run_user, [app] * concurrency, [stream] * concurrency))
+    ok = [u for u in users if not u["error"]]
+    wall = max(u["end"] for u in users) - min(u["begin"] for u in users)
+    turns = [t for u in ok for t in u["turns"]]
+    runs = sum(len(u["runs"]) for u in ok)
+    return {
+        "concurrency": concurrency,
+        "sessions_ok": len(ok),
+        "errors": [u["error"] for u in users if u["error"]],
+        "wall_s": wall,
+        "reruns_per_s": runs / wall if wall else 0,
+        "turn_p50_s": percentile(turns, 50),
+        "turn_p95_s": percentile(turns, 95),
+        "turn_p99_s": percentile(turns, 99),
+        "memory_per_session_kb": sum(u["memory"] for u in ok) / max(1, len(ok)) / 1024,
+    }
+
+
+def _warm(_):
+    import streamlit.testing.v1  # noqa: F401
+    return os.getpid()
+
+
+def compare(current, previous_path, tolerance):
+    with open(previous_path, "r") as f:
+        previous = {r["concurrency"]: r for r in json.load(f)["levels"]}
+    regressions = []
+    for level in current["levels"]:
+        old = previous.get(level["concurrency"])
+        if not old:
+            continue
+        for key, worse in (("turn_p95_s", 1), ("reruns_per_s", -1), ("memory_per_session_kb", 1)):
+            if old.get(key) and level.get(key) is not None:
+                change = (level[key] - old[key]) / old[key]
+                flag = "REGRESSION" if change * worse > tolerance else ""
+                print(f"  c={level['concurrency']:<3} {key:<22} {old[key]:10.3f} -> {level[key]:10.3f} "
+                      f"({change:+.1%}) {flag}")
+                if flag:
+                    regressions.append((level["concurrency"], key))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", choices=list(SCRIPTS), default="llm_chat_app.py")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--blocking", action="store_true", help="turn off streaming replies")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change flagged as regression")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    fake = FakeGemini(latency=args.latency, jitter=args.jitter).start()
+    os.environ["GEMINI_BASE_URL"] = fake.url
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    os.environ.setdefault("PERMA_TELEMETRY_PATH", os.path.join(RESULTS_DIR, "telemetry", "calls.jsonl"))
+
+    levels = []
+    for concurrency in args.concurrency:
+        level = run_level(args.app, concurrency, not args.blocking)
+        levels.append(level)
+        print(f"c={concurrency:<3} ok={level['sessions_ok']:<3} reruns/s={level['reruns_per_s']:7.2f} "
+              f"turn p50/p95/p99={level['turn_p50_s'] or 0:.3f}/{level['turn_p95_s'] or 0:.3f}/"
+              f"{level['turn_p99_s'] or 0:.3f}s mem/session={level['memory_per_session_kb']:.0f}KB"
+              + (f" errors={len(level['errors'])}" if level["errors"] else ""))
+    fake.stop()
+
+    result = {
+        "app": args.app,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "fake": {"latency": args.latency, "jitter": args.jitter, "stream": not args.blocking},
+        "levels": levels,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = os.path.join(RESULTS_DIR, f"load_{os.path.splitext(args.app)[0]}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"saved {out}")
+
+    if args.compare:
+        regressions = compare(result, args.compare, args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
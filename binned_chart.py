@@ -0,0 +1,113 @@
+"""Binned high/low-depression plots as Vega-Lite specs, built from the statistics store.
+
+The BinnedFigures JPEGs are several megabytes each and only exist for some
+participants. chart_spec draws the same comparison (one panel per variable
+in rank order, mean per condition with its CI95) for anyone in
+dataForLLM, as a JSON spec of a few kilobytes that the browser renders, so
+drawing time does not depend on any image resolution. Clock-time variables
+are plotted in hours on a 24 h scale and labelled HH:MM; times around
+midnight are unwrapped first (participant_store.unwrap_times), so a
+bedtime of 23:59 sits next to one of 00:22 rather than a day away.
+
+    python binned_chart.py perma14 perma2   # write binnedCharts/<SubID>.vl.json
+"""
+import json
+import math
+import os
+import sys
+
+CHART_DIR = "binnedCharts"
+CONDITIONS = {"low": "Low depression", "high": "High depression"}
+COLORS = {"low": "#2ca02c", "high": "#d62728"}
+
+
+def _clock(minutes):
+    minutes = int(round(minutes))
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+
+def _number(value):
+    # JSON has no NaN
+    return None if value is None or math.isnan(value) else round(float(value), 4)
+
+
+def chart_values(table, sub_id):
+    """One record per variable and condition for sub_id, in rank order."""
+    # pyarrow is only loaded once a chart is drawn
+    from participant_store import unwrap_times
+
+    rows = table[table["SubID"] == sub_id]
+    if rows.empty:
+        raise KeyError(sub_id)
+    rows = unwrap_times(rows).sort_values(["rank", "block", "condition"], kind="stable")
+    values = []
+    for row in rows.itertuples():
+        scale = 60.0 if row.is_time else 1.0
+        units = "24 Hr scale" if row.is_time else (row.units if isinstance(row.units, str) else "")
+        values.append({
+            "panel": f"#{int(row.rank)} {row.variable}" if not math.isnan(row.rank) else row.variable,
+            "units": units,
+            "condition": CONDITIONS[row.condition],
+            "mean": _number(row.mean / scale),
+            "ci_low": _number(row.ci_low / scale),
+            "ci_high": _number(row.ci_high / scale),
+            "std": _number(row.std / scale),
+            "corr": _number(row.corr),
+            "label": _clock(row.mean) if row.is_time else f"{row.mean:.2f}",
+        })
+    return values
+
+
+def chart_spec(table, sub_id, columns=5, width=130, height=110):
+    """Vega-Lite spec of the binned comparison plot for one participant."""
+    values = chart_values(table, sub_id)
+    panels = list(dict.fromkeys(v["panel"] for v in values))
+    x = {"field": "condition", "type": "nominal", "sort": list(CONDITIONS.values()), "title": None,
+         "axis": {"labelAngle": 0}}
+    tooltip = [{"field": "condition"}, {"field": "label", "title": "mean"}, {"field": "std"},
+               {"field": "ci_low", "title": "CI95 low"}, {"field": "ci_high", "title": "CI95 high"},
+               {"field": "corr"}, {"field": "units"}]
+    return {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "title": f"{sub_id} binned variables",
+        "data": {"values": values},
+        "facet": {"field": "panel", "type": "nominal", "sort": panels, "title": None,
+                  "header": {"labelFontWeight": "bold"}},
+        "columns": columns,
+        "spec": {
+            "width": width,
+            "height": height,
+            "encoding": {"x": x},
+            "layer": [
+                {"mark": "bar",
+                 "encoding": {
+                     "y": {"field": "mean", "type": "quantitative", "title": None},
+                     "color": {"field": "condition", "type": "nominal", "legend": None,
+                               "scale": {"domain": list(CONDITIONS.values()), "range": list(COLORS.values())}},
+                     "tooltip": tooltip}},
+                {"mark": {"type": "rule", "color": "#444"},
+                 "encoding": {"y": {"field": "ci_low", "type": "quantitative"}, "y2": {"field": "ci_high"}}},
+                {"mark": {"type": "text", "dy": -6, "baseline": "bottom"},
+                 "encoding": {"y": {"field": "mean", "type": "quantitative"}, "text": {"field": "label"}}},
+                # Units once per panel, in the top left corner
+                {"transform": [{"filter": {"field": "condition", "equal": CONDITIONS["low"]}}],
+                 "mark": {"type": "text", "align": "left", "baseline": "top", "x": 2, "y": 2, "fontSize": 9,
+                          "color": "#666"},
+                 "encoding": {"text": {"field": "units"}}},
+            ],
+        },
+        "resolve": {"scale": {"y": "independent"}},
+    }
+
+
+if __name__ == "__main__":
+    from participant_store import load_store
+
+    table = load_store()
+    names = sys.argv[1:] or list(table["SubID"].cat.categories)
+    os.makedirs(CHART_DIR, exist_ok=True)
+    for name in names:
+        path = os.path.join(CHART_DIR, f"{name}.vl.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(chart_spec(table, name), f, separators=(",", ":"))
+        print(f"{path}: {os.path.getsize(path) / 1024:.1f} KB")
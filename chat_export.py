@@ -0,0 +1,87 @@
+"""Chat downloads and bulk export of stored sessions.
+
+    python chat_export.py sessions.jsonl.gz                # every session in .sessions.sqlite
+    python chat_export.py assignment.jsonl.gz --app assignmentChat --visible-only
+"""
+import argparse
+import gzip
+import json
+
+from session_store import SessionStore
+
+
+class ExportBuffer:
+    """Append-only JSONL lines of one chat, each message serialized once.
+
+    sync(messages) serializes only the messages added since the last call;
+    if the list was replaced (a rebuild) or got shorter, it starts over from
+    the new list. Messages are never edited in place, but one may be
+    replaced by a new dict (e.g. with a translation added); only that line
+    is serialized again. The download payload is only joined when asked for.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self._source = None
+        self._messages = []
+
+    def sync(self, messages):
+        if messages is not self._source or len(messages) < len(self.lines):
+            self.lines = []
+            self._messages = []
+            self._source = messages
+        # Identity checks only; replaced messages are rare
+        changed = [i for i, (old, new) in enumerate(zip(self._messages, messages)) if old is not new]
+        if changed:
+            # A copy, so a download built earlier keeps its snapshot
+            self.lines = list(self.lines)
+            for i in changed:
+                self.lines[i] = json.dumps(messages[i])
+                self._messages[i] = messages[i]
+        for msg in messages[len(self.lines):]:
+            self.lines.append(json.dumps(msg))
+            self._messages.append(msg)
+        return self
+
+    def download(self, metadata, compress=False):
+        """A zero-argument callable for st.download_button(data=...).
+
+        It runs only when the button is clicked, on the lines present now:
+        the metadata line followed by one line per message, as bytes.
+        """
+        # lines is only ever appended to (a reset makes a new list), so a
+        # reference and a length are a snapshot without copying
+        lines, count = self.lines, len(self.lines)
+
+        def build():
+            data = "\n".join([json.dumps(metadata)] + lines[:count]).encode("utf-8")
+            return gzip.compress(data, compresslevel=6) if compress else data
+
+        return build
+
+
+def write_archive(sessions, path):
+    """Stream sessions (from SessionStore.iter_sessions) into a gzip JSONL file, one per line."""
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+        for session in sessions:
+            f.write(json.dumps(session) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every stored chat session to one gzip JSONL archive.")
+    parser.add_argument("out", help="archive to write, e.g. sessions.jsonl.gz")
+    parser.add_argument("--db", default=".sessions.sqlite")
+    parser.add_argument("--app", help="only sessions of this app, e.g. llm_chat_app or assignmentChat")
+    parser.add_argument("--visible-only", action="store_true", help="leave out hidden messages such as greetings")
+    args = parser.parse_args()
+
+    store = SessionStore(args.db)
+    count = write_archive(store.iter_sessions(include_hidden=not args.visible_only, app=args.app), args.out)
+    print(f"wrote {count} sessions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
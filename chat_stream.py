@@ -0,0 +1,138 @@
+import time
+
+import streamlit as st
+
+
+class TimedReply:
+    """Iterate over the text chunks of a chat reply and time them.
+
+    With stream=True the reply comes from chat.send_message_stream and the
+    time to first token is taken when the first non-empty chunk arrives.
+    With stream=False the blocking send_message is used, so the first token
+    only shows up together with the full reply.
+    """
+
+    def __init__(self, chat, message, stream=True):
+        self.chat = chat
+        self.message = message
+        self.stream = stream
+        self.chunks = []
+        self.start = None
+        self.first_token = None
+        self.end = None
+
+    def __iter__(self):
+        self.start = time.perf_counter()
+        if self.stream:
+            responses = self.chat.send_message_stream(self.message)
+        else:
+            responses = [self.chat.send_message(self.message)]
+        for response in responses:
+            text = response.text
+            if not text:
+                continue
+            if self.first_token is None:
+                self.first_token = time.perf_counter()
+            self.chunks.append(text)
+            yield text
+        self.end = time.perf_counter()
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    @property
+    def ttft(self):
+        if self.first_token is None:
+            return None
+        return self.first_token - self.start
+
+    @property
+    def total(self):
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def timing(self):
+        return {"mode": "stream" if self.stream else "blocking",
+                "ttft": self.ttft, "total": self.total}
+
+
+def writeReply(chat, message, stream=True):
+    """Send message and render the reply as markdown in the current container.
+
+    Partial markdown is shown as chunks arrive when streaming. Returns the
+    full reply text; the timing is appended to st.session_state.reply_timings.
+    """
+    reply = TimedReply(chat, message, stream=stream)
+    if stream:
+        st.write_stream(reply)
+    else:
+        for text in reply:
+            st.markdown(text)
+    st.session_state.setdefault("reply_timings", []).append(reply.timing())
+    return reply.text
+
+
+def showTimings():
+    """Sidebar summary of time to first token for streamed vs blocking replies."""
+    timings = st.session_state.get("reply_timings", [])
+    if not timings:
+        return
+    last = timings[-1]
+    st.sidebar.caption(f"Last reply ({last['mode']}): first token {last['ttft'] or 0:.2f}s, "
+                       f"total {last['total'] or 0:.2f}s")
+    for mode in ("stream", "blocking"):
+        ttfts = [t["ttft"] for t in timings if t["mode"] == mode and t["ttft"] is not None]
+        if ttfts:
+            st.sidebar.caption(f"Mean first token ({mode}, n={len(ttfts)}): {sum(ttfts) / len(ttfts):.2f}s")
+
+
+HISTORY_WINDOW = 30
+SPEAKERS = {"user": "You", "assistant": "Coach"}
+
+
+def _transcript(messages):
+    """One markdown block for a run of earlier messages, translations included."""
+    parts = []
+    for msg in messages:
+        text = f"**{SPEAKERS.get(msg['role'], msg['role'])}:** {msg['content']}"
+        for language, translation in msg.get("translations", {}).items():
+            text += f"\n\n*In {language}:* {translation}"
+        parts.append(text)
+    return "\n\n---\n\n".join(parts)
+
+
+def renderHistory(messages, window=HISTORY_WINDOW, decorate=None):
+    """Render a conversation: recent messages as chat bubbles, earlier ones from a render cache.
+
+    Every message stays on the page. The last `window` to 2 * window - 1
+    messages are chat bubbles; everything before them is grouped into
+    fixed blocks of `window` messages, each shown as a single markdown
+    element whose text is built once and kept in
+    st.session_state.history_blocks. A rerun (a chat turn or a sidebar
+    edit) therefore emits a few elements per earlier block instead of two
+    per message. A block is rebuilt only when one of its messages is
+    replaced (e.g. a translation is added). decorate(index, msg), if
+    given, is called inside each bubble after the message; earlier blocks
+    show finished translations as text instead.
+    """
+    settled = max(0, len(messages) - window) // window * window
+    cache = st.session_state.setdefault("history_blocks", {})
+    keys = []
+    for start in range(0, settled, window):
+        block = messages[start:start + window]
+        key = (start, tuple(id(msg) for msg in block))
+        if key not in cache:
+            cache[key] = _transcript(block)
+        keys.append(key)
+        with st.container(border=True):
+            st.markdown(cache[key])
+    # Keep only the blocks on screen, so a rebuilt conversation does not pile up text
+    for key in set(cache) - set(keys):
+        del cache[key]
+    for index, msg in enumerate(messages[settled:], start=settled):
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+            if decorate is not None:
+                decorate(index, msg)
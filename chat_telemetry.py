@@ -0,0 +1,217 @@
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit as st
+
+from rate_limiter import PRIORITY_NAMES
+
+PERCENTILES = (50, 90, 99)
+FIELDS = ("wall_s", "ttfb_s", "prompt_tokens", "output_tokens", "cached_tokens")
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class Telemetry:
+    """Process-wide record of model calls.
+
+    Records are appended to a rotating JSONL file and kept in memory (the
+    last `keep` calls) for percentiles. With metrics_port set, a local
+    endpoint serves the same data as Prometheus text on /metrics, plus
+    anything registered with add_metrics().
+    """
+
+    def __init__(self, path="telemetry/calls.jsonl", max_bytes=10 * 1024 * 1024, backups=5,
+                 keep=5000, metrics_port=None):
+        self.records = collections.deque(maxlen=keep)
+        self.count = 0
+        self.totals = collections.Counter()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._log = logging.getLogger(f"perma.telemetry.{os.path.abspath(path)}")
+        self._log.propagate = False
+        self._log.setLevel(logging.INFO)
+        if not self._log.handlers:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                           encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._log.addHandler(handler)
+        self.extra_metrics = []
+        self.server = None
+        if metrics_port:
+            self.server = start_metrics_server(self, int(metrics_port))
+
+    def record(self, **fields):
+        fields["ts"] = time.time()
+        with self._lock:
+            self.records.append(fields)
+            self.count += 1
+            self.totals["wall_s"] += fields.get("wall_s") or 0
+            for key in ("prompt_tokens", "output_tokens", "cached_tokens"):
+                self.totals[key] += fields.get(key) or 0
+            if fields.get("error"):
+                self.totals["errors"] += 1
+        self._log.info(json.dumps(fields))
+
+    def event(self, **fields):
+        """Write a non-call record (e.g. a routing decision) to the log only."""
+        fields["ts"] = time.time()
+        self._log.info(json.dumps(fields))
+
+    def percentiles(self, session_id=None):
+        with self._lock:
+            records = [r for r in self.records if session_id is None or r["session_id"] == session_id]
+        return {field: {q: _percentile([r[field] for r in records if r.get(field) is not None], q)
+                        for q in PERCENTILES}
+                for field in FIELDS}, len(records)
+
+    def prometheus(self):
+        stats, _ = self.percentiles()
+        lines = ["# TYPE gemini_call_seconds summary"]
+        for q, value in stats["wall_s"].items():
+            if value is not None:
+                lines.append(f'gemini_call_seconds{{quantile="{q / 100}"}} {value}')
+        lines.append(f"gemini_call_seconds_count {self.count}")
+        lines.append(f"gemini_call_seconds_sum {self.totals['wall_s']}")
+        lines.append("# TYPE gemini_first_byte_seconds summary")
+        for q, value in stats["ttfb_s"].items():
+            if value is not None:
+                lines.append(f'gemini_first_byte_seconds{{quantile="{q / 100}"}} {value}')
+        for key in ("prompt_tokens", "output_tokens", "cached_tokens"):
+            lines.append(f"# TYPE gemini_{key}_total counter")
+            lines.append(f"gemini_{key}_total {self.totals[key]}")
+        lines.append("# TYPE gemini_call_errors_total counter")
+        lines.append(f"gemini_call_errors_total {self.totals['errors']}")
+        return "\n".join(lines) + "\n" + "".join(fn() for fn in self.extra_metrics)
+
+    def add_metrics(self, fn):
+        """Serve fn() (Prometheus text) on /metrics too, once per fn."""
+        if fn not in self.extra_metrics:
+            self.extra_metrics.append(fn)
+
+
+def start_metrics_server(telemetry, port, host="127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = telemetry.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class InstrumentedChat:
+    """Wrap a chat object and record every send_message/send_message_stream call.
+
+    model is the configured model. Each record's model is the one that
+    served the call, as reported by the response (a hedge or failover may
+    have answered instead); it is None for cache hits and failed calls.
+    """
+
+    def __init__(self, chat, telemetry, session_id, model, temperature):
+        self.chat = chat
+        self.telemetry = telemetry
+        self.session_id = session_id
+        self.model = model
+        self.temperature = temperature
+
+    def _record(self, kind, start, first, response, error=None, served=None):
+        usage = getattr(response, "usage_metadata", None)
+        end = time.perf_counter()
+        self.telemetry.record(
+            session_id=self.session_id, model=served or getattr(response, "model_version", None),
+            configured_model=self.model, temperature=self.temperature, kind=kind,
+            wall_s=end - start, ttfb_s=(first or end) - start,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            output_tokens=getattr(usage, "candidates_token_count", None),
+            cached_tokens=getattr(usage, "cached_content_token_count", None),
+            cache_hit=getattr(response, "cached", False),
+            error=repr(error) if error else None,
+        )
+
+    def send_message(self, message):
+        start = time.perf_counter()
+        try:
+            response = self.chat.send_message(message)
+        except Exception as exc:
+            self._record("send_message", start, None, None, exc)
+            raise
+        self._record("send_message", start, None, response)
+        return response
+
+    def send_message_stream(self, message):
+        start = time.perf_counter()
+        first = None
+        response = None
+        served = None  # not every chunk carries the model version
+        try:
+            for response in self.chat.send_message_stream(message):
+                if first is None:
+                    first = time.perf_counter()
+                served = getattr(response, "model_version", None) or served
+                yield response
+        except Exception as exc:
+            self._record("stream", start, first, response, exc, served)
+            raise
+        self._record("stream", start, first, response, served=served)
+
+    def get_history(self, curated=False):
+        return self.chat.get_history()
+
+
+def telemetryPanel(telemetry, session_id):
+    """Sidebar percentiles of model calls in this process and this session."""
+    with st.sidebar.expander("Model call telemetry"):
+        for label, sid in (("Process", None), ("This session", session_id)):
+            stats, n = telemetry.percentiles(sid)
+            st.caption(f"{label}: {n} calls")
+            if n:
+                st.dataframe({field: {f"p{q}": v for q, v in qs.items()} for field, qs in stats.items()})
+
+
+def limiterPanel(limiter):
+    """Sidebar queue depth and wait times of the shared rate limiter."""
+    stats = limiter.stats()
+    with st.sidebar.expander("Rate limiter"):
+        st.caption(f"Queue depth {stats['queue_depth']}, {stats['requests']} requests, "
+                   f"{stats['throttled']} throttled, {stats['retries']} retries, {stats['gave_up']} gave up")
+        # No table before the first request: st.dataframe loads pandas and pyarrow
+        if stats["requests"]:
+            st.dataframe({name: {"p50": stats[f"wait_{name}_p50_s"], "p95": stats[f"wait_{name}_p95_s"]}
+                          for name in PRIORITY_NAMES.values()})
+
+
+def routerPanel(router):
+    """Sidebar hedging and per-model latency of the shared model router."""
+    stats = router.stats()
+    with st.sidebar.expander("Model routing"):
+        if not any(site["calls"] for site in stats["sites"].values()):
+            st.caption("No routed calls yet")
+            return
+        st.dataframe(stats["sites"])
+        if stats["models"]:
+            st.dataframe(stats["models"], hide_index=True)
@@ -0,0 +1,452 @@
+"""Simulated conversations between the assignment coach and patient personas.
+
+The coach is built like the assignment chat's: its role (ASSIGNMENT_ROLE or
+--role-file) with the variable glossary and safeguards as system
+instruction, opened with "Hello" and a participant's summary file. A second
+model plays the patient following a persona. Conversations run in worker
+processes, each running a bounded number of them at a time, and end when
+the coach closes the protocol (the patient is sent to the next stage of the
+study or to the study organizers), when the patient ends it, or after
+--max-turns patient messages.
+
+Every conversation is written in the app's JSONL download format to
+<out>/transcripts/, with one line of statistics in <out>/conversations.jsonl.
+Conversations already logged with the same setup are skipped, so an
+interrupted run can simply be restarted.
+
+    python conversation_sim.py --personas agreeable refuses_first --repeats 3
+    python conversation_sim.py --stub --processes 4 --concurrency 16 --repeats 20   # offline
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import random
+import re
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from chat_export import ExportBuffer
+from history_compaction import estimate_tokens
+from model_router import _percentile
+from perma_core.assets import ASSIGNMENT_ROLE, assignmentOpening, assignmentRole, coachInstruction
+from ranking_schema import DOMAINS, load_summary, parse_ranking
+from rate_limiter import BATCH, LimitedChat, RateLimiter
+
+SUMMARY_DIR = "./assignmentChatPromptOnlyStreamlit/"
+OUT_DIR = "simulations"
+LOG_FILE = "conversations.jsonl"
+
+END_TOKEN = "[END]"
+# The protocol's two endings: on to the next stage of the study, or to the study organizers
+CLOSING_PATTERN = re.compile(r"next (stage|step|phase) of the study|contact the study organi[sz]ers", re.I)
+DOMAIN_PATTERNS = {
+    "Sleep": re.compile(r"\bsleep", re.I),
+    "Exercise": re.compile(r"\bexercis|\bphysical activity", re.I),
+    "Diet": re.compile(r"\bdiet|\bnutrition", re.I),
+    "Positivity": re.compile(r"\bpositivity|\bsocial connection|\bgratitude", re.I),
+}
+
+PATIENT_INSTRUCTION = """You are role-playing a participant in a study on lifestyle and mood. A psychiatrist
+is about to go over a summary of your own data with you. {description}
+Always answer as the participant, in the first person, in one to three short sentences, and never take
+over the psychiatrist's role. Once the psychiatrist has ended the conversation, reply with only {end}."""
+
+
+# ---------------------------
+# Personas
+# ---------------------------
+
+class Persona:
+    """A simulated patient.
+
+    description goes into the patient model's system instruction;
+    stub_replies are what the offline stub patient says, in order (the
+    last one repeats).
+    """
+
+    def __init__(self, name, description, stub_replies=None):
+        self.name = name
+        self.description = description
+        self.stub_replies = list(stub_replies or ["Okay, I can try that."])
+
+    def instruction(self):
+        return PATIENT_INSTRUCTION.format(description=self.description, end=END_TOKEN)
+
+
+PERSONAS = {p.name: p for p in [
+    Persona("agreeable", "You are motivated and happy to work on whatever the psychiatrist suggests first.",
+            ["Yes, that makes sense, I'd like to focus on that."]),
+    Persona("hesitant", "You are unsure about the first suggestion because you are busy and tired, but you "
+                        "come round to it if the psychiatrist helps you find small, practical steps.",
+            ["I'm not sure, I'm really busy with school right now.",
+             "Maybe, if it doesn't take too much time.",
+             "Okay, I'll try those small steps."]),
+    Persona("refuses_first", "You do not want to work on the first suggestion whatever is said, but you agree "
+                             "to the second one.",
+            ["No, I'm not interested in that one.", "Yes, I can try that one."]),
+    Persona("refuses_all", "You do not want to work on any of the suggestions and say so politely each time.",
+            ["No, I'm not interested.", "No, I don't want to do that either.", "No, neither of them."]),
+    Persona("off_topic", "You keep asking the psychiatrist about unrelated things, such as which phone to buy "
+                         "or homework help, before eventually agreeing to the first suggestion.",
+            ["Can you help me pick a new phone instead?", "What about my math homework?",
+             "Fine, yes, I'll work on that."]),
+]}
+
+
+def load_personas(path):
+    """Personas from a JSON list of {"name", "description", "stub_replies"} objects."""
+    with open(path, "r", encoding="utf-8") as f:
+        return {p["name"]: Persona(p["name"], p["description"], p.get("stub_replies")) for p in json.load(f)}
+
+
+# ---------------------------
+# Model backends
+# ---------------------------
+
+class StubUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class StubResponse:
+    def __init__(self, text, prompt_tokens):
+        self.text = text
+        self.usage_metadata = StubUsage(prompt_tokens, estimate_tokens(text))
+
+
+class StubChat:
+    """Offline chat with fake latency that follows the coaching protocol.
+
+    The coach offers the top-ranked domain of the summary, runs a short
+    motivational interview when the patient hesitates, offers the second
+    domain after a refusal and closes the protocol on agreement or after a
+    second refusal. The patient says its persona's stub replies and ends
+    once the coach has closed.
+    """
+
+    HESITANT = re.compile(r"not sure|don't know|maybe|busy|\?", re.I)
+    REFUSAL = re.compile(r"\bno\b|not interested|don't want|neither", re.I)
+    AGREEMENT = re.compile(r"\b(yes|okay|sure|fine)\b|i'll try|i can try", re.I)
+
+    def __init__(self, kind, system_instruction, rng, latency=0.2, jitter=0.1, replies=None):
+        self.kind = kind
+        self.rng = rng
+        self.latency = latency
+        self.jitter = jitter
+        self.replies = replies or []
+        self.prompt_tokens = estimate_tokens(system_instruction)
+        self.ranking = []
+        self.offered = 0
+        self.said = 0
+
+    def send_message(self, message):
+        time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+        self.prompt_tokens += estimate_tokens(message)
+        text = self._coach(message) if self.kind == "coach" else self._patient(message)
+        response = StubResponse(text, self.prompt_tokens)
+        self.prompt_tokens += estimate_tokens(text)
+        return response
+
+    def _offer(self):
+        domain = self.ranking[self.offered]
+        self.offered += 1
+        return (f"Our model found that {domain.lower()} is the area most linked to your mood. "
+                f"Would you be interested in focusing on {domain.lower()} first?")
+
+    def _coach(self, message):
+        if not self.ranking:
+            summary = message.removeprefix(assignmentOpening(""))
+            self.ranking = parse_ranking(load_summary(summary)[0]) or list(DOMAINS)
+            return self._offer()
+        if self.HESITANT.search(message):
+            return "That's understandable. What gets in the way, and what small step could fit your week?"
+        if self.REFUSAL.search(message):
+            if self.offered < 2:
+                return self._offer()
+            return "Thank you for talking with me. Please contact the study organizers about next steps."
+        if self.AGREEMENT.search(message):
+            return "Great choice, I'm glad you'll work on this. Please move on to the next stage of the study."
+        return "Let's come back to your data. Would you like to work on this area?"
+
+    def _patient(self, message):
+        if CLOSING_PATTERN.search(message):
+            return END_TOKEN
+        reply = self.replies[min(self.said, len(self.replies) - 1)]
+        self.said += 1
+        return reply
+
+
+class StubBackend:
+    def __init__(self, latency=0.2, jitter=0.1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+
+    def chat(self, kind, system_instruction, temperature, key="", replies=None):
+        rng = random.Random(f"{self.seed}:{key}:{kind}")
+        return StubChat(kind, system_instruction, rng, self.latency, self.jitter, replies)
+
+
+class GeminiBackend:
+    """SDK chats for coach and patient, with retries through a per-process RateLimiter."""
+
+    def __init__(self, coach_model, patient_model, limiter):
+        from google import genai
+        from google.genai import types
+
+        self.types = types
+        # GEMINI_BASE_URL points the simulator at a local fake server, as in the apps
+        options = types.HttpOptions(base_url=os.environ["GEMINI_BASE_URL"]) if os.environ.get("GEMINI_BASE_URL") \
+            else None
+        self.client = genai.Client(api_key=os.environ["GEMINI_API_KEY"], http_options=options)
+        self.models = {"coach": coach_model, "patient": patient_model}
+        self.limiter = limiter
+
+    def chat(self, kind, system_instruction, temperature, key="", replies=None):
+        config = self.types.GenerateContentConfig(system_instruction=system_instruction, temperature=temperature)
+        return LimitedChat(self.client.chats.create(model=self.models[kind], config=config), self.limiter, BATCH)
+
+
+def make_backend(spec):
+    """Build a backend from a picklable spec (see backend_spec) inside a worker process."""
+    if spec["stub"]:
+        return StubBackend(spec["stub_latency"], spec["stub_jitter"], spec["seed"])
+    # Each process gets an equal share of the quota
+    rpm, tpm = (limit / spec["processes"] if limit else None for limit in (spec["rpm"], spec["tpm"]))
+    limiter = RateLimiter(rpm, tpm, retries=spec["retries"])
+    return GeminiBackend(spec["coach_model"], spec["patient_model"], limiter)
+
+
+# ---------------------------
+# Conversations
+# ---------------------------
+
+class Job:
+    """One conversation to simulate: a participant's summary with a persona."""
+
+    def __init__(self, participant, summary_path, persona, repeat):
+        self.participant = participant
+        self.summary_path = summary_path
+        self.persona = persona
+        self.repeat = repeat
+        self.id = f"{participant}-{persona.name}-{repeat}"
+
+
+def make_jobs(summary_dir, personas, repeats=1, only=None):
+    jobs = []
+    for f in sorted(os.listdir(summary_dir)):
+        participant = f.split("_")[0]
+        if only and participant not in only:
+            continue
+        for persona in personas:
+            for repeat in range(repeats):
+                jobs.append(Job(participant, os.path.join(summary_dir, f), persona, repeat))
+    return jobs
+
+
+def mentioned(text, domains=DOMAINS):
+    return [d for d in domains if DOMAIN_PATTERNS[d].search(text)]
+
+
+def simulate(job, backend, settings, transcript_dir):
+    """Run one conversation; return its statistics and write its transcript."""
+    with open(job.summary_path, "r", encoding="utf-8") as f:
+        summary = f.read()
+    ranking = parse_ranking(load_summary(summary)[0])
+    coach = backend.chat("coach", coachInstruction(assignmentRole(settings["role"])), settings["temperature"],
+                         key=job.id)
+    patient = backend.chat("patient", job.persona.instruction(), settings["patient_temperature"], key=job.id,
+                           replies=job.persona.stub_replies)
+    messages = []
+    record = {"id": job.id, "participant": job.participant, "persona": job.persona.name, "repeat": job.repeat,
+              "setup": settings["setup"], "turns": 0, "end": None, "error": None, "prompt_tokens": 0,
+              "output_tokens": 0, "coach_latency_s": [], "patient_latency_s": []}
+
+    def send(chat, message, latencies):
+        start = time.perf_counter()
+        response = chat.send_message(message)
+        latencies.append(time.perf_counter() - start)
+        usage = getattr(response, "usage_metadata", None)
+        text = response.text or ""
+        record["prompt_tokens"] += getattr(usage, "prompt_token_count", None) or estimate_tokens(message)
+        record["output_tokens"] += getattr(usage, "candidates_token_count", None) or estimate_tokens(text)
+        return text
+
+    start = time.perf_counter()
+    try:
+        # As in the app, the opening message with the summary is hidden and the greeting is shown
+        reply = send(coach, assignmentOpening(summary), record["coach_latency_s"])
+        messages.append({"role": "assistant", "content": reply})
+        while record["end"] is None:
+            if CLOSING_PATTERN.search(reply):
+                record["end"] = "coach_closed"
+            elif record["turns"] == settings["max_turns"]:
+                record["end"] = "max_turns"
+            else:
+                said = send(patient, reply, record["patient_latency_s"])
+                if END_TOKEN in said:
+                    record["end"] = "patient_ended"
+                    continue
+                messages.append({"role": "user", "content": said})
+                record["turns"] += 1
+                reply = send(coach, said, record["coach_latency_s"])
+                messages.append({"role": "assistant", "content": reply})
+    except Exception as exc:
+        record["end"] = "error"
+        record["error"] = repr(exc)
+    record["wall_s"] = time.perf_counter() - start
+
+    coach_text = " ".join(m["content"] for m in messages if m["role"] == "assistant")
+    record["ranking"] = ranking
+    record["domains_mentioned"] = mentioned(coach_text)
+    # The protocol never names the third or fourth domain
+    record["revealed_lower"] = mentioned(coach_text, ranking[2:])
+
+    metadata = {"llm_role": settings["role"], "llm_temperature": settings["temperature"],
+                "simulation": {"id": job.id, "participant": job.participant, "persona": job.persona.name}}
+    record["transcript"] = os.path.join(transcript_dir, job.id + ".jsonl")
+    with open(record["transcript"], "wb") as f:
+        f.write(ExportBuffer().sync(messages).download(metadata)())
+    return record
+
+
+def run_shard(jobs, spec, settings, transcript_dir, concurrency, results):
+    """Worker process: run jobs, at most concurrency at a time, putting each record on results."""
+    backend = make_backend(spec)
+
+    def one(job):
+        results.put(simulate(job, backend, settings, transcript_dir))
+
+    with ThreadPoolExecutor(max(1, concurrency)) as pool:
+        list(pool.map(one, jobs))
+
+
+def read_log(path, setup):
+    """Ids of conversations already logged with this setup."""
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partial line from an interrupted run
+                if record.get("setup") == setup and record.get("end") != "error":
+                    done.add(record["id"])
+    return done
+
+
+def run_simulations(jobs, spec, settings, out_dir=OUT_DIR, processes=4, concurrency=8, log=print):
+    """Simulate every job not logged yet across worker processes.
+
+    Jobs are dealt round-robin to processes; each runs up to concurrency
+    conversations at once, so at most processes * concurrency are in
+    flight. Records are appended to <out_dir>/conversations.jsonl as they
+    finish. Returns the new records and the wall time.
+    """
+    transcript_dir = os.path.join(out_dir, "transcripts")
+    os.makedirs(transcript_dir, exist_ok=True)
+    log_path = os.path.join(out_dir, LOG_FILE)
+    done = read_log(log_path, settings["setup"])
+    todo = [job for job in jobs if job.id not in done]
+    log(f"{len(todo)} conversations to run, {len(jobs) - len(todo)} already logged")
+    processes = max(1, min(processes, len(todo)))
+    shards = [todo[i::processes] for i in range(processes)]
+
+    records = []
+    start = time.perf_counter()
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(processes) as pool:
+        results = manager.Queue()
+        futures = [pool.submit(run_shard, shard, spec, settings, transcript_dir, concurrency, results)
+                   for shard in shards if shard]
+        with open(log_path, "a", encoding="utf-8") as f:
+            while len(records) < len(todo):
+                try:
+                    record = results.get(timeout=0.5)
+                except queue.Empty:
+                    failed = [fut for fut in futures if fut.done() and fut.exception()]
+                    if failed:
+                        raise failed[0].exception()
+                    continue
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                records.append(record)
+                log(f"{record['id']}: {record['end']} after {record['turns']} turns"
+                    + (f" ({record['error']})" if record["error"] else ""))
+    return records, time.perf_counter() - start
+
+
+def report(records, wall):
+    """Per-persona turn counts, endings, tokens and coach latency, plus throughput."""
+    lines = []
+    for name in sorted({r["persona"] for r in records}):
+        rs = [r for r in records if r["persona"] == name]
+        ends = {}
+        for r in rs:
+            ends[r["end"]] = ends.get(r["end"], 0) + 1
+        latency = [s for r in rs for s in r["coach_latency_s"]]
+        lines.append(f"{name:<14} n {len(rs):>4}  turns {statistics.mean(r['turns'] for r in rs):5.1f}  "
+                     f"tokens {statistics.mean(r['prompt_tokens'] + r['output_tokens'] for r in rs):8.0f}  "
+                     f"coach p50/p95 {_percentile(latency, 50) or 0:.2f}/{_percentile(latency, 95) or 0:.2f}s  "
+                     f"revealed 3rd/4th {sum(bool(r['revealed_lower']) for r in rs)}  "
+                     + ", ".join(f"{k} {v}" for k, v in sorted(ends.items())))
+    turns = sum(r["turns"] for r in records)
+    lines.append(f"{len(records)} conversations, {turns} patient turns in {wall:.1f}s: "
+                 f"{len(records) / wall if wall else 0:.2f} conversations/s, {turns / wall if wall else 0:.1f} turns/s")
+    return "\n".join(lines)
+
+
+def backend_spec(args):
+    return {"stub": args.stub, "stub_latency": args.stub_latency, "stub_jitter": args.stub_latency / 2,
+            "seed": args.seed, "coach_model": args.coach_model, "patient_model": args.patient_model,
+            "rpm": args.rpm, "tpm": args.tpm, "retries": args.retries, "processes": args.processes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--summaries", default=SUMMARY_DIR, help="folder of participant summary files")
+    parser.add_argument("--only", nargs="*", help="participants to run, e.g. perma2 perma10")
+    parser.add_argument("--personas", nargs="*", help=f"personas to run (default: all of {', '.join(PERSONAS)})")
+    parser.add_argument("--persona-file", help="JSON list of personas to use instead of the built-in ones")
+    parser.add_argument("--repeats", type=int, default=1, help="conversations per participant and persona")
+    parser.add_argument("--max-turns", type=int, default=12, help="patient messages before a conversation is cut")
+    parser.add_argument("--role-file", help="coach role to test instead of the assignment chat's default")
+    parser.add_argument("--temperature", type=float, default=0.2, help="coach temperature")
+    parser.add_argument("--patient-temperature", type=float, default=0.8)
+    parser.add_argument("--coach-model", default="gemini-2.5-flash")
+    parser.add_argument("--patient-model", default="gemini-2.5-flash")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8, help="conversations at a time per process")
+    parser.add_argument("--rpm", type=int, help="requests per minute allowed across processes (default: unlimited)")
+    parser.add_argument("--tpm", type=int, help="tokens per minute allowed across processes (default: unlimited)")
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--stub", action="store_true", help="use the offline stub models instead of Gemini")
+    parser.add_argument("--stub-latency", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    personas = load_personas(args.persona_file) if args.persona_file else PERSONAS
+    chosen = [personas[name] for name in args.personas] if args.personas else list(personas.values())
+    role = ASSIGNMENT_ROLE
+    if args.role_file:
+        with open(args.role_file, "r", encoding="utf-8") as f:
+            role = f.read()
+    setup = hashlib.sha256(json.dumps([role, args.temperature, args.patient_temperature, args.coach_model,
+                                       args.patient_model, args.max_turns, args.stub]).encode("utf-8")).hexdigest()
+    settings = {"role": role, "temperature": args.temperature, "patient_temperature": args.patient_temperature,
+                "max_turns": args.max_turns, "setup": setup[:16]}
+
+    jobs = make_jobs(args.summaries, chosen, args.repeats, args.only)
+    records, wall = run_simulations(jobs, backend_spec(args), settings, args.out, args.processes, args.concurrency)
+    if records:
+        print(report(records, wall))
+
+
+if __name__ == "__main__":
+    main()
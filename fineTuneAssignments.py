@@ -1,111 +1,117 @@
 import streamlit as st
-import pandas as pd
-import os
-import json
-from streamlit_modal import Modal
-from PIL import Image
-from natsort import natsorted
-Image.MAX_IMAGE_PIXELS = None  # disable limit
 
 # Use full screen width
 st.set_page_config(page_title="Participant Data Viewer", layout="wide")
 
+from participant_index import ParticipantIndex
+from binned_chart import chart_spec
+from ranking_schema import load_summary
+from rerun_profiler import cache_data, start_rerun, profilePanel
+from perma_core import VIEWER_CSS, get_rerun_profiler
+
+# Opt-in timing of this script run (PERMA_PROFILE or ?profile=1)
+profile = start_rerun("fineTuneAssignments", get_rerun_profiler())
+
 # Custom CSS to remove Streamlit's max-width constraint
-st.markdown(
-    """
-    <style>
-        .block-container {
-            max-width: 90% !important;
-            padding-left: 2rem;
-            padding-right: 2rem;
-        }
-        .stTextArea textarea {
-            font-size: 14px !important;
-            line-height: 1.4 !important;
-        }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
-
-st.markdown(
-    """
-    <style>
-    /* Target modal container */
-    .stModal > div[data-testid="stModalDialog"] {
-        width: 120% !important;       /* Make modal wider */
-        max-width: 1200px !important; /* Optional max width */
-    }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
+st.markdown(VIEWER_CSS, unsafe_allow_html=True)
 
 def parse_text_file(path):
-    text_raw = load_text(path)
-    try:
-        data = json.loads(text_raw)
-        if isinstance(data, list) and len(data) > 0 and "content" in data[0]:
-            return data[0]["content"]
-        else:
-            return text_raw
-    except json.JSONDecodeError:
-        return text_raw
+    # Narrative text and, for structured runs, the ranking with justifications
+    return load_summary(load_text(path))
 
 # Define folder paths
 CSV_DIR = "./dataForLLM/"
-baseFolder = './assignmentChatSeperateSatisfaction_scalePenalty_ignoreDiet_talk2me_addDietSatisfaction/'
-SUMMARY_DIR = baseFolder+'/technicalSummary'
+baseFolder = 'assignmentChatSeperateSatisfaction_scalePenalty_ignoreDiet_talk2me_addDietSatisfaction'
 BINNED_DIR = "./BinnedFigures/"
-ASSIGNMENT_CSV = baseFolder+'assignments.csv'
+
+# Participant index shared by every session, refreshed by mtime on each rerun
+@st.cache_resource
+def get_index():
+    return ParticipantIndex()
 
 # Helper function to get available names
-def get_names():
-    csv_files = [f.replace(".csv", "") for f in os.listdir(CSV_DIR) if f.endswith(".csv")]
-    summary_files = [f.replace("_simulatedUser.txt", "") for f in os.listdir(SUMMARY_DIR) if f.endswith("_simulatedUser.txt")]
-    binned_files = [f.replace("_shap.jpg", "") for f in os.listdir(BINNED_DIR) if f.endswith("_shap.jpg")]
-    # Keep names that exist in all three folders
-    names = natsorted(set(csv_files) & set(summary_files) & set(binned_files))
-    return names
+def get_names(experiment):
+    # Keep names that have data and a summary for this experiment; plots are drawn from the data
+    return index.names(experiment)
+
+# Typed statistics for every participant, one memory-mapped copy per process
+@st.cache_resource
+def get_stats():
+    # pyarrow and numpy are loaded the first time participant data is viewed
+    from participant_store import load_store
+    return load_store(CSV_DIR)
+
+# Binned plot as a Vega-Lite spec of a few KB, drawn in the browser
+def load_chart(name):
+    return chart_spec(get_stats(), name)
 
 # Load data
-@st.cache_data
 def load_csv(name):
-    path = os.path.join(CSV_DIR, f"{name}.csv")
-    return pd.read_csv(path)
+    from participant_store import participant_frame
+    return participant_frame(get_stats(), name)
 
-@st.cache_data
+@cache_data
 def load_text(path):
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
-modal = Modal("Assignment Preview", key="data_modal")
-
 @st.dialog("All Assignments", width = "large")
-def show_dialog():
+def show_dialog(experiment):
     st.write("### All Assignments")
+    assignmentDF = index.assignments(experiment)
+    cols = assignmentDF.columns.tolist()
+    if cols:
+        cols = [cols[-1]] + cols[:-1]
+        assignmentDF = assignmentDF[cols]
     st.dataframe(assignmentDF)
     if st.button("Close"):
         st.rerun()
 
+@st.dialog("Scores", width = "large")
+def show_scores(experiment):
+    from assignment_eval import evaluate, summary_frame, confusion_frame, pair_frame
+    # Every folder with an assignments.csv (the index also lists summary-only folders);
+    # scores are cached by file hash, so only changed experiments are rescored
+    result = evaluate()
+    st.write("### Agreement with human assignments")
+    st.dataframe(summary_frame(result), hide_index=True)
+    if experiment in result["experiments"]:
+        st.write(f"### Confusion matrix: {experiment}")
+        st.dataframe(confusion_frame(result["experiments"][experiment]))
+    st.write("### Top-1 agreement between experiments")
+    st.dataframe(pair_frame(result), hide_index=True)
+    if st.button("Close"):
+        st.rerun()
+
 @st.dialog("Participant Data", width = "large")
 def show_data(df):
     st.write("Participant Data")
     st.dataframe(df, use_container_width=True)
     if st.button("Close"):
         st.rerun()
+@st.dialog("Full Resolution", width = "large")
+def show_full_image(path):
+    st.image(path, use_container_width=True)
+    if st.button("Close"):
+        st.rerun()
 ###-----------------------------------------------------------------------------------------###
 # App title
 st.title("Participant Data Viewer")
 
+# Detect names and select one
+index = get_index()
+with profile.section("index"):
+    index.refresh()
+experiments = index.experiments
+experiment = st.selectbox("Experiment", experiments,
+                          index=experiments.index(baseFolder) if baseFolder in experiments else 0)
+if st.button("Score all experiments"):
+    with profile.section("scores"):
+        show_scores(experiment)
+
 col1, col2, col3, col4= st.columns(4, vertical_alignment="bottom")  # Adjust ratios if needed
 
-# Detect names and select one
-names = get_names()
-assignmentDF = pd.read_csv(ASSIGNMENT_CSV).iloc[:, 1:]
-cols = assignmentDF.columns.tolist()
-cols = [cols[-1]] + cols[:-1]
-assignmentDF = assignmentDF[cols]
+names = get_names(experiment)
 
 if not names:
     st.error("No matching data found in the folders.")
@@ -113,33 +119,44 @@ else:
 
     view_button = col1.button('View All Assignments')
     selected_name = col2.selectbox("Select a name", names)
-    humanAssigned = assignmentDF['humanAssigned'][assignmentDF['SubID']==selected_name].item()
+    participant = index.lookup(selected_name)
+    humanAssigned = participant["assignments"].get(experiment, {}).get("humanAssigned", "")
     col3.markdown(f"**Human Assigned Intervention:** {humanAssigned}")
     view_data = col4.button('View Participant Data')
 
     if view_button:
-        show_dialog()
+        show_dialog(experiment)
     
     if view_data:
-        df = load_csv(selected_name).iloc[:,1:]
+        with profile.section("read data"):
+            df = load_csv(selected_name)
         show_data(df)
         
-    csv_path = os.path.join(CSV_DIR, f"{selected_name}.csv")
-    summary_path = os.path.join(SUMMARY_DIR, f"{selected_name}_simulatedUser.txt")
-    binned_path = os.path.join(BINNED_DIR, f"{selected_name}_shap.jpg")
+    summary_path = participant["summaries"][experiment]
+    binned_path = participant["figure"]
 
     # Load data
    
-    summary_text = parse_text_file(summary_path)
-    binned_img = Image.open(binned_path)
-    binned_img.thumbnail((5000, 5000))  # resize for display
+    with profile.section("read summary"):
+        summary_text, ranking = parse_text_file(summary_path)
 
     # Wider horizontal layout
     col1, col2 = st.columns([3, 2], gap="large")
 
-    with col1:
-        st.image(binned_img, caption="Binned Data", use_container_width=True)
+    with col1, profile.section("chart"):
+        st.vega_lite_chart(spec=load_chart(selected_name))
+        # The original SHAP figure, where there is one, still opens on request
+        if binned_path and st.button("Original SHAP figure"):
+            with profile.section("image"):
+                show_full_image(binned_path)
 
-    with col2:
+    with col2, profile.section("report"):
         # st.subheader("Technical Report")
-        st.text_area("Technical Report", summary_text, height=650)
+        if ranking:
+            import pandas as pd
+            st.dataframe(pd.DataFrame(ranking, index=pd.RangeIndex(1, len(ranking) + 1, name="Rank")),
+                         use_container_width=True)
+        st.text_area("Technical Report", summary_text, height=450 if ranking else 650)
+
+profile.finish()
+profilePanel(profile)
@@ -0,0 +1,104 @@
+SUMMARY_PROMPT = """Summarize this coaching conversation in under 150 words for the coach to continue from.
+Keep the domain(s) discussed, what the patient said about their concerns and barriers, strategies
+already suggested and any decision the patient made. If it starts with an earlier summary, fold it in.
+
+{transcript}"""
+
+
+def estimate_tokens(text):
+    """Rough local token count (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def contentText(content):
+    return "".join(p.text or "" for p in content.parts or [])
+
+
+def make_summarizer(client, model="gemini-2.5-flash", limiter=None, priority=0):
+    """Return summarize(history) -> str using a one-shot model call.
+
+    With a RateLimiter the call is queued at the given priority.
+    """
+    def summarize(history):
+        transcript = "\n".join(f"{c.role}: {contentText(c)}" for c in history)
+        contents = SUMMARY_PROMPT.format(transcript=transcript)
+
+        def call():
+            from google.genai import types
+            return client.models.generate_content(
+                model=model,
+                contents=contents,
+                config=types.GenerateContentConfig(temperature=0.0),
+            )
+        if limiter is None:
+            return call().text
+        return limiter.call(call, estimate_tokens(contents), priority).text
+    return summarize
+
+
+class CompactingChat:
+    """Keep a chat's prompt under a token budget by summarizing older turns.
+
+    After each reply the prompt size is read from the response usage
+    metadata (or estimated locally). When it is over budget_tokens, every
+    turn except the first pin_turns and the last keep_turns exchanges is
+    folded into a running summary and the chat is rebuilt with
+    rebuild(history). The pinned opening exchange is where assignmentChat
+    sends the participant summary, which a 150-word summary would lose.
+    The system instruction is not touched; when it and the pinned turns
+    alone are over budget, nothing is summarized. Per-turn token counts
+    are kept in turn_log.
+    """
+
+    def __init__(self, chat, rebuild, summarize, budget_tokens, keep_turns=3, system_instruction="",
+                 pin_turns=1):
+        self.chat = chat
+        self.rebuild = rebuild
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+        self.pin_turns = pin_turns
+        self.system_tokens = estimate_tokens(system_instruction)
+        self.turn_log = []
+
+    def historyTokens(self, history):
+        return self.system_tokens + sum(estimate_tokens(contentText(c)) for c in history)
+
+    def _after_reply(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        history = self.chat.get_history()
+        tokens = getattr(usage, "prompt_token_count", None) or self.historyTokens(history)
+        entry = {"turn": len(self.turn_log) + 1, "prompt_tokens": tokens, "compacted_to": None}
+        self.turn_log.append(entry)
+        if self.budget_tokens and tokens > self.budget_tokens:
+            entry["compacted_to"] = self.compact(history)
+
+    def compact(self, history):
+        pin, keep = 2 * self.pin_turns, 2 * self.keep_turns
+        if len(history) <= pin + keep:
+            return None
+        pinned, older, recent = history[:pin], history[pin:-keep], history[-keep:]
+        if self.historyTokens(pinned) >= self.budget_tokens:
+            return None  # summarizing cannot bring the prompt under budget
+        summary = self.summarize(older)
+        from google.genai import types
+        compacted = list(pinned) + [
+            types.Content(role="user", parts=[types.Part(text="Summary of our conversation so far: " + summary)]),
+            types.Content(role="model", parts=[types.Part(text="Thanks, I will continue from there.")]),
+        ] + list(recent)
+        self.chat = self.rebuild(compacted)
+        return self.historyTokens(compacted)
+
+    def send_message(self, message):
+        response = self.chat.send_message(message)
+        self._after_reply(response)
+        return response
+
+    def send_message_stream(self, message):
+        response = None
+        for response in self.chat.send_message_stream(message):
+            yield response
+        self._after_reply(response)
+
+    def get_history(self, curated=False):
+        return self.chat.get_history()
@@ -0,0 +1,314 @@
+import collections
+import queue
+import threading
+import time
+
+from history_compaction import contentText, estimate_tokens
+
+_DONE = object()
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class Policy:
+    """How one call site picks and hedges models.
+
+    models is in order of preference. With adaptive=True the first model is
+    replaced by whichever has the lowest moving latency once every model has
+    min_samples measurements. With hedge=True a duplicate goes to the next
+    model when the first has not answered by the hedge deadline: the
+    hedge_quantile of the first model's recent latencies at this site (at
+    least min_deadline), or default_deadline until there are min_samples of
+    them. A hedge is a second billed request: the slower one is not
+    cancelled, only ignored.
+    """
+
+    def __init__(self, models, hedge=False, adaptive=False, hedge_quantile=95, default_deadline=3.0,
+                 min_deadline=0.5, min_samples=20):
+        self.models = list(models)
+        self.hedge = hedge and len(self.models) > 1
+        self.adaptive = adaptive
+        self.hedge_quantile = hedge_quantile
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        self.min_samples = min_samples
+
+
+def default_policies(model="gemini-2.5-flash", hedge_model=None):
+    """Every site on model; with a hedge_model, greeting and chat turns hedge to it."""
+    models = [model] + ([hedge_model] if hedge_model and hedge_model != model else [])
+    return {
+        "greeting": Policy(models, hedge=True),
+        "turn": Policy(models, hedge=True),
+        "batch": Policy([model]),
+    }
+
+
+class ModelRouter:
+    """Pick a model per call site, hedge slow calls and keep latency statistics.
+
+    Latency is time to the first response: the first chunk of a stream, or
+    the whole reply of a blocking call. It is kept per site, reply mode
+    ("stream" or "blocking") and model, so one site's long replies never
+    set another's hedge deadline. Each routed call is recorded with its
+    site, primary model, whether it was hedged and which model won;
+    record, if given, also receives it.
+    """
+
+    def __init__(self, policies, window=200, alpha=0.2, record=None):
+        self.policies = policies
+        self.alpha = alpha
+        self.record = record
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._ewma = {}
+        self._lock = threading.Lock()
+        self.counters = collections.Counter()
+
+    # ---------------------------
+    # Latency statistics
+    # ---------------------------
+
+    def observe(self, site, mode, model, seconds):
+        key = (site, mode, model)
+        with self._lock:
+            self._latencies[key].append(seconds)
+            old = self._ewma.get(key)
+            self._ewma[key] = seconds if old is None else old + self.alpha * (seconds - old)
+
+    def quantile(self, site, mode, model, q):
+        with self._lock:
+            return _percentile(list(self._latencies[site, mode, model]), q)
+
+    def primary(self, site, mode):
+        policy = self.policies[site]
+        if not policy.adaptive:
+            return policy.models[0]
+        with self._lock:
+            if any(len(self._latencies[site, mode, m]) < policy.min_samples for m in policy.models):
+                return policy.models[0]
+            return min(policy.models, key=lambda m: self._ewma[site, mode, m])
+
+    def deadline(self, site, mode, model):
+        policy = self.policies[site]
+        with self._lock:
+            samples = list(self._latencies[site, mode, model])
+        if len(samples) < policy.min_samples:
+            return policy.default_deadline
+        return max(policy.min_deadline, _percentile(samples, policy.hedge_quantile))
+
+    # ---------------------------
+    # Routed calls
+    # ---------------------------
+
+    def stream(self, site, attempt, before_hedge=None):
+        """Yield the responses of attempt(model) from whichever model answers first.
+
+        attempt(model) returns an iterable of responses. A hedged duplicate
+        is started once the deadline passes (before_hedge() is called first,
+        e.g. to wait for the rate limiter); once one attempt produces its
+        first response the other's output is dropped. The losing request is
+        not cancelled: a stream stops being read at its next chunk, and a
+        blocking call runs to completion. An attempt that fails before
+        answering leaves the race to the other.
+        """
+        return self._route(site, attempt, before_hedge, "stream")
+
+    def _route(self, site, attempt, before_hedge, mode):
+        policy = self.policies[site]
+        primary = self.primary(site, mode)
+        models = [primary] + [m for m in policy.models if m != primary]
+        results = queue.Queue()
+        stops = {}
+        start = time.perf_counter()
+
+        def run(model):
+            stop = stops[model]
+            launched = time.perf_counter()
+            first = True
+            try:
+                for response in attempt(model):
+                    if first:
+                        # Losers are measured too, so a slow primary's statistics stay current
+                        self.observe(site, mode, model, time.perf_counter() - launched)
+                        first = False
+                    if stop.is_set():
+                        return
+                    results.put((model, response))
+            except Exception as exc:
+                results.put((model, exc))
+                return
+            results.put((model, _DONE))
+
+        def launch(model):
+            stops[model] = threading.Event()
+            threading.Thread(target=run, args=(model,), daemon=True, name=f"route-{site}-{model}").start()
+
+        launch(primary)
+        hedge_model = models[1] if policy.hedge else None
+        hedge_at = start + self.deadline(site, mode, primary) if hedge_model else None
+        winner = None
+        errors = {}
+        while winner is None:
+            timeout = None if hedge_at is None else max(0.0, hedge_at - time.perf_counter())
+            try:
+                model, item = results.get(timeout=timeout)
+            except queue.Empty:
+                if before_hedge is not None:
+                    before_hedge()
+                launch(hedge_model)
+                hedge_at = None
+                continue
+            if isinstance(item, Exception) or item is _DONE:
+                errors[model] = item
+                if hedge_at is not None:
+                    # The primary failed before answering: hedge right away
+                    hedge_at = time.perf_counter()
+                    continue
+                if len(errors) == len(stops):
+                    self._decide(site, primary, sorted(stops), None, time.perf_counter() - start)
+                    failure = errors[primary]
+                    if failure is _DONE:
+                        return
+                    raise failure
+                continue
+            winner = model
+            for other, stop in stops.items():
+                if other != model:
+                    stop.set()
+            self._decide(site, primary, sorted(stops), model, time.perf_counter() - start)
+            yield item
+        while True:
+            model, item = results.get()
+            if model != winner:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def call(self, site, attempt, before_hedge=None):
+        """Single-response version of stream(): attempt(model) returns one response."""
+        for response in self._route(site, lambda model: [attempt(model)], before_hedge, "blocking"):
+            return response
+
+    def _decide(self, site, primary, launched, winner, seconds):
+        hedged = len(launched) > 1
+        with self._lock:
+            self.counters[site, "calls"] += 1
+            self.counters[site, "primary", primary] += 1
+            if hedged:
+                self.counters[site, "hedged"] += 1
+                if winner is not None and winner != primary:
+                    self.counters[site, "hedge_wins"] += 1
+            if winner is None:
+                self.counters[site, "failed"] += 1
+        if self.record is not None:
+            self.record(kind="route", site=site, primary=primary, hedged=hedged, winner=winner,
+                        first_response_s=seconds)
+
+    # ---------------------------
+    # Metrics
+    # ---------------------------
+
+    def stats(self):
+        """Per call site: calls, hedged share and hedge win rate; per site, mode and model: latency."""
+        with self._lock:
+            counters = dict(self.counters)
+            models = [{"site": site, "mode": mode, "model": model, "n": len(v), "p50_s": _percentile(list(v), 50),
+                       "p95_s": _percentile(list(v), 95), "ewma_s": self._ewma.get((site, mode, model))}
+                      for (site, mode, model), v in self._latencies.items() if v]
+        sites = {}
+        for site in self.policies:
+            calls = counters.get((site, "calls"), 0)
+            hedged = counters.get((site, "hedged"), 0)
+            sites[site] = {"calls": calls, "hedged": hedged,
+                           "hedge_wins": counters.get((site, "hedge_wins"), 0),
+                           "hedge_win_rate": counters.get((site, "hedge_wins"), 0) / hedged if hedged else None,
+                           "failed": counters.get((site, "failed"), 0)}
+        return {"sites": sites, "models": models}
+
+    def prometheus(self):
+        stats = self.stats()
+        lines = ["# TYPE gemini_route_calls_total counter"]
+        for site, s in stats["sites"].items():
+            lines.append(f'gemini_route_calls_total{{site="{site}"}} {s["calls"]}')
+        lines.append("# TYPE gemini_route_hedged_total counter")
+        for site, s in stats["sites"].items():
+            lines.append(f'gemini_route_hedged_total{{site="{site}"}} {s["hedged"]}')
+        lines.append("# TYPE gemini_route_hedge_wins_total counter")
+        for site, s in stats["sites"].items():
+            lines.append(f'gemini_route_hedge_wins_total{{site="{site}"}} {s["hedge_wins"]}')
+        lines.append("# TYPE gemini_model_first_response_seconds summary")
+        for m in stats["models"]:
+            labels = f'site="{m["site"]}",mode="{m["mode"]}",model="{m["model"]}"'
+            for q in (50, 95):
+                if m[f"p{q}_s"] is not None:
+                    lines.append(f'gemini_model_first_response_seconds{{{labels},quantile="{q / 100}"}} '
+                                 f'{m[f"p{q}_s"]}')
+        return "\n".join(lines) + "\n"
+
+
+class RoutedChat:
+    """Chat whose turns go through a ModelRouter.
+
+    The conversation is kept here and each attempt runs on a fresh SDK chat
+    for its model seeded with it, so the attempt that loses a hedge race
+    never leaves a stray turn behind. The first turn of a chat with no history uses first_site
+    (the greeting), later turns use site. limiter, if given, is waited on
+    before a hedge is sent.
+    """
+
+    def __init__(self, client, config, router, history=None, site="turn", first_site="greeting",
+                 limiter=None, priority=0):
+        self.client = client
+        self.config = config
+        self.router = router
+        self.site = site
+        self.first_site = first_site
+        self.limiter = limiter
+        self.priority = priority
+        self._history = list(history or [])
+
+    def _site(self):
+        return self.site if self._history else self.first_site
+
+    def _before_hedge(self, message):
+        if self.limiter is None:
+            return None
+        tokens = sum(estimate_tokens(contentText(c)) for c in self._history) + estimate_tokens(message)
+        return lambda: self.limiter.acquire(tokens, self.priority)
+
+    def _chat(self, model):
+        return self.client.chats.create(model=model, config=self.config, history=list(self._history))
+
+    def _record(self, message, reply):
+        from google.genai import types
+        self._history.append(types.Content(role="user", parts=[types.Part(text=message)]))
+        self._history.append(types.Content(role="model", parts=[types.Part(text=reply)]))
+
+    def send_message(self, message):
+        response = self.router.call(self._site(), lambda model: self._chat(model).send_message(message),
+                                    self._before_hedge(message))
+        self._record(message, response.text or "")
+        return response
+
+    def send_message_stream(self, message):
+        chunks = []
+        for response in self.router.stream(self._site(),
+                                           lambda model: self._chat(model).send_message_stream(message),
+                                           self._before_hedge(message)):
+            chunks.append(response.text or "")
+            yield response
+        self._record(message, "".join(chunks))
+
+    def get_history(self, curated=False):
+        return list(self._history)
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+
+from natsort import natsorted
+
+CSV_DIR = "dataForLLM"
+BINNED_DIR = "BinnedFigures"
+SUMMARY_SUFFIX = "_simulatedUser.txt"
+FIGURE_SUFFIX = "_shap.jpg"
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class ParticipantIndex:
+    """SubID -> CSV, summary, figure and assignment row for every experiment folder.
+
+    The index is persisted to a JSON file and refreshed incrementally: a
+    directory is only re-listed when its mtime changes and assignments.csv
+    is only re-read when its own mtime changes, so a refresh costs a few
+    stat calls. Name lists and lookups are served from in-memory dicts.
+    """
+
+    def __init__(self, root=".", path=".participant_index.json"):
+        self.root = root
+        self.path = os.path.join(root, path)
+        self._lock = threading.Lock()
+        self._state = {"root_mtime": None, "experiments": [], "dirs": {}, "assignments": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._state = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                pass
+        self._frames = {}
+        self._build()
+        self.refresh()
+
+    # ---------------------------
+    # Incremental refresh
+    # ---------------------------
+
+    def _listing(self, rel_dir, suffix):
+        """Return {SubID: file name} for rel_dir, re-listing only if its mtime changed."""
+        full = os.path.join(self.root, rel_dir)
+        mtime = _mtime(full)
+        entry = self._state["dirs"].get(rel_dir)
+        if entry is not None and entry["mtime"] == mtime and entry["suffix"] == suffix:
+            return entry["files"], False
+        files = {}
+        if mtime is not None:
+            files = {f[:-len(suffix)]: f for f in os.listdir(full) if f.endswith(suffix)}
+        self._state["dirs"][rel_dir] = {"mtime": mtime, "suffix": suffix, "files": files}
+        return files, True
+
+    def _assignment_rows(self, experiment):
+        path = os.path.join(self.root, experiment, "assignments.csv")
+        mtime = _mtime(path)
+        entry = self._state["assignments"].get(experiment)
+        if entry is not None and entry["mtime"] == mtime:
+            return False
+        rows = {}
+        if mtime is not None:
+            import pandas as pd
+            df = pd.read_csv(path, dtype=str, keep_default_na=False).iloc[:, 1:]
+            rows = {r["SubID"]: r for r in df.to_dict(orient="records")}
+        self._state["assignments"][experiment] = {"mtime": mtime, "rows": rows}
+        self._frames.pop(experiment, None)
+        return True
+
+    def refresh(self):
+        """Pick up added, removed or modified files. Returns True if anything changed."""
+        with self._lock:
+            changed = False
+            root_mtime = _mtime(self.root)
+            if root_mtime != self._state["root_mtime"]:
+                self._state["root_mtime"] = root_mtime
+                self._state["experiments"] = natsorted(
+                    d for d in os.listdir(self.root)
+                    if os.path.isdir(os.path.join(self.root, d))
+                    and (os.path.exists(os.path.join(self.root, d, "assignments.csv"))
+                         or os.path.isdir(os.path.join(self.root, d, "technicalSummary"))))
+                changed = True
+            changed |= self._listing(CSV_DIR, ".csv")[1]
+            changed |= self._listing(BINNED_DIR, FIGURE_SUFFIX)[1]
+            for experiment in self._state["experiments"]:
+                changed |= self._listing(os.path.join(experiment, "technicalSummary"), SUMMARY_SUFFIX)[1]
+                changed |= self._assignment_rows(experiment)
+            if changed:
+                self._build()
+                self._save()
+            return changed
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._state, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # read-only checkout; the in-memory index still works
+
+    def _build(self):
+        dirs = self._state["dirs"]
+        csvs = dirs.get(CSV_DIR, {}).get("files", {})
+        figures = dirs.get(BINNED_DIR, {}).get("files", {})
+        participants = {}
+        for sub_id, f in csvs.items():
+            participants[sub_id] = {"csv": os.path.join(self.root, CSV_DIR, f),
+                                    "figure": None, "summaries": {}, "assignments": {}}
+        for sub_id, f in figures.items():
+            if sub_id in participants:
+                participants[sub_id]["figure"] = os.path.join(self.root, BINNED_DIR, f)
+        names = {}
+        for experiment in self._state["experiments"]:
+            summary_dir = os.path.join(experiment, "technicalSummary")
+            for sub_id, f in dirs.get(summary_dir, {}).get("files", {}).items():
+                if sub_id in participants:
+                    participants[sub_id]["summaries"][experiment] = os.path.join(self.root, summary_dir, f)
+            for sub_id, row in self._state["assignments"].get(experiment, {}).get("rows", {}).items():
+                if sub_id in participants:
+                    participants[sub_id]["assignments"][experiment] = row
+            names[experiment] = natsorted(s for s, p in participants.items() if experiment in p["summaries"])
+            names[experiment, "figure"] = [s for s in names[experiment] if participants[s]["figure"]]
+        self._participants = participants
+        self._names = names
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+
+    @property
+    def experiments(self):
+        return list(self._state["experiments"])
+
+    def names(self, experiment, require_figure=False):
+        return self._names.get((experiment, "figure") if require_figure else experiment, [])
+
+    def lookup(self, sub_id):
+        return self._participants.get(sub_id)
+
+    def assignments(self, experiment):
+        """assignments.csv for an experiment as a DataFrame, built once per file version."""
+        if experiment not in self._frames:
+            # pandas is imported on the first call rather than with the index
+            import pandas as pd
+            rows = self._state["assignments"].get(experiment, {}).get("rows", {})
+            self._frames[experiment] = pd.DataFrame(natsorted(rows.values(), key=lambda r: r["SubID"]))
+        return self._frames[experiment]
@@ -0,0 +1,218 @@
+"""Typed columnar store for the dataForLLM participant statistics.
+
+Each dataForLLM/permaN.csv is a long, stringly-typed table with one block
+of MEAN / RANGE / CORR / STD / CI95 rows per variable (not every file has
+every statistic; the row layout of each block is kept). build_table turns
+the whole directory into one table with a row per participant x variable x
+condition and numeric mean, std, CI bounds, range and correlation columns.
+Clock times such as "00:22" are stored as minutes with is_time set (so a
+stray "01:60" in the source comes back as "02:00").
+
+The table is persisted as an uncompressed Arrow IPC file and opened with a
+memory map, so every session and process reads the same pages.
+participant_frame rebuilds the original CSV layout on demand.
+
+    python participant_store.py            # rebuild .participant_stats.arrow
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from natsort import natsorted
+
+CSV_DIR = "./dataForLLM/"
+STORE_PATH = ".participant_stats.arrow"
+CONDITIONS = {"high": "high Depression", "low": "low Depression"}
+TIME_PATTERN = r"\d{1,2}:\d{2}"
+
+
+def _to_number(values):
+    """Parse numbers and HH:MM strings; returns (float array, is_time array)."""
+    values = values.astype("string").str.strip()
+    is_time = values.str.fullmatch(TIME_PATTERN).fillna(False).to_numpy(dtype=bool)
+    numbers = pd.to_numeric(values.where(~is_time), errors="coerce").to_numpy(dtype=float)
+    parts = values.where(is_time).str.split(":", expand=True)
+    if is_time.any():
+        minutes = pd.to_numeric(parts[0]).to_numpy(dtype=float) * 60 + pd.to_numeric(parts[1]).to_numpy(dtype=float)
+        numbers = np.where(is_time, minutes, numbers)
+    return numbers, is_time
+
+
+def _split_pair(values, pattern):
+    """Split "a - b" style strings into two float arrays."""
+    parts = values.astype("string").str.strip("[]'\" ").str.split(pattern, n=1, expand=True, regex=True)
+    if parts.shape[1] < 2:
+        parts[1] = pd.NA
+    low, _ = _to_number(parts[0])
+    high, _ = _to_number(parts[1])
+    return low, high
+
+
+def build_table(csv_dir=CSV_DIR):
+    """Parse every CSV in csv_dir into one typed long DataFrame."""
+    files = natsorted(f for f in os.listdir(csv_dir) if f.endswith(".csv"))
+    raw = pd.concat(
+        [pd.read_csv(os.path.join(csv_dir, f), dtype=str, keep_default_na=False).iloc[:, 1:] for f in files],
+        keys=[f[:-len(".csv")] for f in files], names=["SubID", "row"],
+    ).reset_index(level="SubID")
+
+    is_mean = (raw["level_1"] == "MEAN").to_numpy()
+    raw["block"] = is_mean.cumsum()
+    raw["variable"] = raw["level_0"].where(is_mean).ffill()
+    raw["rank"] = pd.to_numeric(raw["rank"].where(is_mean), errors="coerce")
+    raw["units"] = raw["level_0"].where(~is_mean & (raw["level_0"] != ""))
+
+    blocks = raw.groupby("block", sort=True).agg(
+        SubID=("SubID", "first"), variable=("variable", "first"),
+        units=("units", "first"), rank=("rank", "first"),
+        layout=("level_1", ",".join),
+    )
+    long = raw.melt(id_vars=["block", "level_1"], value_vars=list(CONDITIONS.values()),
+                    var_name="condition", value_name="value")
+    wide = long.pivot_table(index=["block", "condition"], columns="level_1", values="value", aggfunc="first")
+    wide = wide.reindex(columns=["MEAN", "RANGE", "CORR", "STD", "CI95"]).reset_index()
+
+    mean, is_time = _to_number(wide["MEAN"])
+    std, _ = _to_number(wide["STD"])
+    ci_low, ci_high = _split_pair(wide["CI95"], r"\s+-\s+")
+    range_sep = np.where(wide["RANGE"].astype("string").str.contains(",").fillna(False), ",", "-")
+    range_min, range_max = _split_pair(wide["RANGE"], r"\s*,\s*")
+    dash_min, dash_max = _split_pair(wide["RANGE"], r"(?<=\d)-(?=\d)")
+    range_min = np.where(range_sep == ",", range_min, dash_min)
+    range_max = np.where(range_sep == ",", range_max, dash_max)
+
+    info = blocks.loc[wide["block"]].reset_index(drop=True)
+    table = pd.DataFrame({
+        "SubID": pd.Categorical(info["SubID"], categories=[f[:-len(".csv")] for f in files]),
+        "variable": info["variable"].astype("category"),
+        "units": info["units"].astype("category"),
+        "rank": info["rank"].to_numpy(dtype=float),
+        "condition": pd.Categorical(wide["condition"].map({v: k for k, v in CONDITIONS.items()}),
+                                    categories=list(CONDITIONS)),
+        "block": wide["block"].to_numpy(dtype=np.int32),
+        "is_time": is_time,
+        "mean": mean,
+        "std": std,
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "corr": pd.to_numeric(wide["CORR"], errors="coerce").to_numpy(dtype=float),
+        "range_min": range_min,
+        "range_max": range_max,
+        "range_text": wide["RANGE"].astype("category"),
+        "layout": info["layout"].astype("category"),
+    })
+    return table.sort_values(["block", "condition"], kind="stable").reset_index(drop=True)
+
+
+def _stale(path, csv_dir):
+    if not os.path.exists(path):
+        return True
+    built = os.path.getmtime(path)
+    return any(os.path.getmtime(os.path.join(csv_dir, f)) > built
+               for f in os.listdir(csv_dir) if f.endswith(".csv")) or os.path.getmtime(csv_dir) > built
+
+
+def write_store(table, path=STORE_PATH):
+    tmp = path + ".tmp"
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def load_store(csv_dir=CSV_DIR, path=STORE_PATH):
+    """Return the statistics table, rebuilding the Arrow file if any CSV is newer.
+
+    The Arrow data is memory-mapped; numeric columns are zero-copy views.
+    """
+    if _stale(path, csv_dir):
+        write_store(build_table(csv_dir), path)
+    with pa.memory_map(path, "r") as source:
+        arrow = pa.ipc.open_file(source).read_all()
+    return arrow.to_pandas()
+
+
+DAY = 24 * 60
+
+
+def _nearest(minutes, reference):
+    """The clock time equal to minutes (mod 24 h) that is closest to reference."""
+    return reference + (minutes - reference + DAY / 2) % DAY - DAY / 2
+
+
+def unwrap_times(table):
+    """Copy of table with clock times unwrapped around midnight, for plotting and comparisons.
+
+    Within each variable block, means are moved within 12 h of the first
+    (high-condition) mean and each CI95 bound within 12 h of its own mean,
+    so 23:59 and 00:22 end up 23 minutes apart and ci_low <= ci_high. A
+    block that then starts before 00:00 is moved a day later (values may
+    exceed 24 h). Values stay in minutes; the source table is untouched.
+    """
+    out = table.copy()
+    is_time = out["is_time"].to_numpy()
+    if not is_time.any():
+        return out
+    reference = out.groupby("block")["mean"].transform("first").to_numpy()
+    mean = _nearest(out["mean"].to_numpy(), reference)
+    low = _nearest(out["ci_low"].to_numpy(), mean)
+    high = _nearest(out["ci_high"].to_numpy(), mean)
+    shift = np.where(pd.Series(mean).groupby(out["block"].to_numpy()).transform("min").to_numpy() < 0, DAY, 0)
+    out["mean"] = np.where(is_time, mean + shift, out["mean"])
+    out["ci_low"] = np.where(is_time, np.fmin(low, high) + shift, out["ci_low"])
+    out["ci_high"] = np.where(is_time, np.fmax(low, high) + shift, out["ci_high"])
+    return out
+
+
+def _format(values, is_time, decimals=3):
+    out = np.char.mod(f"%.{decimals}f", np.nan_to_num(values, nan=0.0)).astype(object)
+    minutes = np.nan_to_num(values, nan=0.0).round().astype(int)
+    clock = np.char.add(np.char.zfill((minutes // 60).astype(str), 2),
+                        np.char.add(":", np.char.zfill((minutes % 60).astype(str), 2)))
+    out = np.where(is_time, clock, out)
+    return np.where(np.isnan(values), "nan", out)
+
+
+def participant_frame(table, sub_id):
+    """Rebuild the original dataForLLM layout (without the index column) for one participant."""
+    rows = table[table["SubID"] == sub_id]
+    if rows.empty:
+        raise KeyError(sub_id)
+    high = rows[rows["condition"] == "high"].reset_index(drop=True)
+    low = rows[rows["condition"] == "low"].reset_index(drop=True)
+    cells = {}
+    for name, part in (("high Depression", high), ("low Depression", low)):
+        is_time = part["is_time"].to_numpy()
+        cells[name] = {
+            "MEAN": _format(part["mean"].to_numpy(), is_time),
+            "RANGE": part["range_text"].astype(object).to_numpy(),
+            "CORR": part["corr"].map(lambda v: str(int(v)) if v.is_integer() else repr(v)).to_numpy(),
+            "STD": _format(part["std"].to_numpy(), is_time),
+            "CI95": np.char.add(np.char.add(_format(part["ci_low"].to_numpy(), is_time).astype(str), " - "),
+                                _format(part["ci_high"].to_numpy(), is_time).astype(str)),
+        }
+
+    records = []
+    for i, var in enumerate(high.itertuples()):
+        stats = var.layout.split(",")
+        for j, stat in enumerate(stats):
+            records.append({
+                "rank": var.rank if stat == "MEAN" else np.nan,
+                "level_0": var.variable if j == 0 else (var.units if j == 1 else np.nan),
+                "level_1": stat,
+                "high Depression": cells["high Depression"][stat][i],
+                "low Depression": cells["low Depression"][stat][i],
+            })
+    return pd.DataFrame.from_records(records)
+
+
+def to_csv(table, sub_id, path=None):
+    """Write (or return, when path is None) the CSV for one participant."""
+    return participant_frame(table, sub_id).to_csv(path)
+
+
+if __name__ == "__main__":
+    table = build_table()
+    write_store(table)
+    print(f"{STORE_PATH}: {len(table)} rows, {table['SubID'].nunique()} participants, "
+          f"{os.path.getsize(STORE_PATH) / 1024:.0f} KB")
@@ -0,0 +1,37 @@
+"""Code shared by the PERMA Streamlit apps.
+
+    from perma_core import MODAL_CSS, init_session_state, getChat
+
+Names are looked up lazily (PEP 562): a submodule is imported the first
+time one of its names is used, and the SDKs behind them (google.genai,
+streamlit_modal) only when a chat or modal is actually built. Apps can
+therefore draw their first elements before any heavy import has run.
+"""
+import importlib
+
+_EXPORTS = {
+    "assets": ["MODAL_CSS", "VIEWER_CSS", "ASSIGNMENT_ROLE", "SAFEGUARDS", "SAFEGUARD_TEXT", "coachInstruction",
+               "ACTIONABLE_VARS", "GLOSSARY", "GLOSSARY_HEADER", "assignmentRole", "assignmentOpening",
+               "BILINGUAL", "REPLY_LANGUAGES", "replyLanguage", "otherLanguage"],
+    "resources": ["get_client", "get_response_cache", "get_telemetry", "get_session_store", "get_rate_limiter",
+                  "get_router", "get_build_workers", "get_prefilter", "get_rerun_profiler",
+                  "get_translator"],
+    "chat": ["MODEL", "init_session_state", "mark_dirty", "displayChat", "modalOpen", "getModal", "createChat",
+             "chatFactory", "getChat"],
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
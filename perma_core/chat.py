@@ -0,0 +1,103 @@
+"""Session state and chat construction shared by the chat apps."""
+import uuid
+from functools import partial
+
+import streamlit as st
+
+from chat_export import ExportBuffer
+from chat_stream import renderHistory
+from chat_telemetry import InstrumentedChat
+from history_compaction import CompactingChat, make_summarizer
+from model_router import RoutedChat
+from prefilter import FilteredChat
+from perma_core.assets import ACTIONABLE_VARS, coachInstruction
+from perma_core.resources import get_client, get_prefilter, get_rate_limiter, get_response_cache, get_router, \
+    get_session_store, get_telemetry
+from rate_limiter import BACKGROUND, INTERACTIVE, LimitedChat
+from response_cache import CachedChat
+
+MODEL = "gemini-2.5-flash"
+
+
+def init_session_state(defaults):
+    """Initialize session state variables with the shared defaults plus the app's own."""
+    defaults = {
+        "domain": None,
+        "sampleNum": 1,
+        "temperature": 0.2,
+        "full_role": "",
+        "messages": [],
+        "chatBuilt": 0,
+        "settings_dirty": False,
+        "stream_replies": True,
+        "cache_responses": False,
+        "history_budget": 0,
+        "prefilter": False,
+        "reply_timings": [],
+        "actionableVars": ACTIONABLE_VARS,
+        **defaults,
+    }
+    for key, val in defaults.items():
+        if key not in st.session_state:
+            st.session_state[key] = val
+    # Built only for a new session rather than on every rerun
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if "export_buffer" not in st.session_state:
+        st.session_state.export_buffer = ExportBuffer()
+
+def mark_dirty():
+    st.session_state.settings_dirty = True
+
+def displayChat(decorate=None):
+    # Display the recent conversation history; older messages are paged in on request
+    renderHistory(st.session_state.messages, decorate=decorate)
+
+def modalOpen(key):
+    # Same test as streamlit_modal's Modal.is_open(), without importing it
+    return st.session_state.get(f"{key}-opened", False)
+
+def getModal(title, key):
+    from streamlit_modal import Modal
+    return Modal(title, key=key)
+
+def createChat(baserole, temperature=0.2, cache=None, history=None):
+    from google.genai import types
+
+    config = types.GenerateContentConfig(
+        system_instruction=coachInstruction(baserole),
+        temperature=temperature,
+    )
+    client = get_client()
+    def newChat(history):
+        # Greeting and turns are routed per call site and may be hedged to a second model
+        routed = RoutedChat(client, config, get_router(), history, limiter=get_rate_limiter(), priority=INTERACTIVE)
+        return LimitedChat(routed, get_rate_limiter(), INTERACTIVE)
+    if cache is not None:
+        chat = CachedChat(client, MODEL, config, cache, history, create=newChat)
+    else:
+        chat = newChat(history)
+    return InstrumentedChat(chat, get_telemetry(), st.session_state.session_id, MODEL, temperature)
+
+def chatFactory(history=None):
+    """Build the chat for the current settings, optionally seeded with history."""
+    cache = get_response_cache() if st.session_state.cache_responses else None
+    chat = createChat(st.session_state.full_role, st.session_state.temperature, cache, history)
+    if st.session_state.history_budget:
+        # Fold older turns into a running summary once the prompt goes over budget
+        chat = CompactingChat(
+            chat,
+            partial(createChat, st.session_state.full_role, st.session_state.temperature, cache),
+            make_summarizer(get_client(), limiter=get_rate_limiter(), priority=BACKGROUND),
+            st.session_state.history_budget,
+            system_instruction=st.session_state.full_role,
+        )
+    if st.session_state.prefilter:
+        # Clear off-topic, role-override and hostile turns are answered locally without a model call
+        chat = FilteredChat(chat, get_prefilter(), record=partial(get_telemetry().event,
+                                                                   session_id=st.session_state.session_id))
+    return chat
+
+def getChat():
+    # Live chat for this session, rebuilt from stored messages if it was evicted
+    return get_session_store().chat(st.session_state.session_id, chatFactory)
@@ -0,0 +1,88 @@
+"""Process-wide resources of the chat apps, created on first use.
+
+Each getter is an st.cache_resource, so every session of the process
+shares one instance. google.genai, the slowest import of the apps, is
+imported inside get_client, so it is not loaded until a chat is built.
+"""
+import os
+
+import streamlit as st
+
+from background_build import SessionWorkers
+from chat_telemetry import Telemetry
+from model_router import ModelRouter, default_policies
+from prefilter import CORPUS, load_prefilter
+from rate_limiter import BACKGROUND, RateLimiter
+from rerun_profiler import RerunProfiler
+from response_cache import ResponseCache
+from session_store import SessionStore
+from translation import Translator
+
+
+# Initialize Gemini client
+@st.cache_resource
+def get_client():
+    from google import genai
+    from google.genai import types
+
+    # GEMINI_BASE_URL points the app at a local fake server for load tests
+    if os.environ.get("GEMINI_BASE_URL"):
+        return genai.Client(api_key=os.environ["GEMINI_API_KEY"],
+                            http_options=types.HttpOptions(base_url=os.environ["GEMINI_BASE_URL"]))
+    return genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+
+# Opt-in reply cache shared by every session of this process
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(os.environ.get("PERMA_CACHE_PATH", ".response_cache.sqlite"))
+
+# Model call records for every session of this process
+@st.cache_resource
+def get_telemetry():
+    return Telemetry(os.environ.get("PERMA_TELEMETRY_PATH", "telemetry/calls.jsonl"),
+                     metrics_port=os.environ.get("PERMA_METRICS_PORT"))
+
+# Settings and messages of every session; live chats are capped and rebuilt on demand
+@st.cache_resource
+def get_session_store():
+    return SessionStore(os.environ.get("PERMA_SESSION_DB", ".sessions.sqlite"),
+                        max_resident=int(os.environ.get("PERMA_MAX_RESIDENT_CHATS", "100")),
+                        on_evict=get_build_workers().forget)
+
+# Requests/min and tokens/min shared by every session; interactive turns go first
+@st.cache_resource
+def get_rate_limiter():
+    limiter = RateLimiter(int(os.environ.get("PERMA_RPM", "60")) or None,
+                          int(os.environ.get("PERMA_TPM", "250000")) or None)
+    get_telemetry().add_metrics(limiter.prometheus)
+    return limiter
+
+# Model choice per call site, with latency statistics shared by every session; hedging only with PERMA_HEDGE_MODEL
+@st.cache_resource
+def get_router():
+    router = ModelRouter(default_policies(hedge_model=os.environ.get("PERMA_HEDGE_MODEL") or None),
+                         record=get_telemetry().event)
+    get_telemetry().add_metrics(router.prometheus)
+    return router
+
+# Background executors for greetings, one per session
+@st.cache_resource
+def get_build_workers():
+    return SessionWorkers()
+
+# Local classifier for off-topic, role-override and hostile turns, trained once per process
+@st.cache_resource
+def get_prefilter():
+    return load_prefilter(os.environ.get("PERMA_PREFILTER_CORPUS", CORPUS))
+
+# Per-rerun records of every session that has profiling on (PERMA_PROFILE or ?profile=1)
+@st.cache_resource
+def get_rerun_profiler():
+    return RerunProfiler(os.environ.get("PERMA_PROFILE_PATH", "telemetry/reruns.jsonl"),
+                         slow_ms=float(os.environ.get("PERMA_PROFILE_SLOW_MS", "500")))
+
+# One-shot translations of chat replies, cached by message hash for every session
+@st.cache_resource
+def get_translator():
+    cache = ResponseCache(os.environ.get("PERMA_TRANSLATION_CACHE", ".translation_cache.sqlite"))
+    return Translator(get_client(), cache, limiter=get_rate_limiter(), priority=BACKGROUND)
@@ -0,0 +1,96 @@
+"""Serializers for the participant data interpolated into the system instruction.
+
+sampleData/<Domain>_<n> holds a JSON string of records that repeat every key
+on every row. Each serializer takes that decoded string and returns the text
+placed in roleHeader:
+
+- records: the JSON string as-is (the original layout)
+- table: one pipe-separated row per variable with mean/std/CI95/range for both
+  groups; intervals are written lo..hi, since "a - b" or "a-b" reads as a minus
+  sign when a bound is negative
+- csv: the same rows as the sampleData CSV, without the index column
+"""
+import json
+
+SERIALIZERS = {}
+CONDITIONS = ("high Depression", "low Depression")
+
+
+def serializer(name):
+    def register(func):
+        SERIALIZERS[name] = func
+        return func
+    return register
+
+
+def serialize(name, jsonData):
+    return SERIALIZERS[name](jsonData)
+
+
+def _records(jsonData):
+    return json.loads(jsonData) if isinstance(jsonData, str) else jsonData
+
+
+def _blocks(records):
+    """Group the per-statistic rows into one dict per variable."""
+    blocks = []
+    for row in records:
+        if row["level_1"] == "MEAN":
+            blocks.append({"variable": row["level_0"], "rank": row["rank"], "units": None, "stats": {}})
+        elif blocks[-1]["units"] is None and row.get("level_0"):
+            blocks[-1]["units"] = row["level_0"]
+        blocks[-1]["stats"][row["level_1"]] = row
+    return blocks
+
+
+def _num(value, digits=3):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)  # HH:MM times
+    return f"{value:.{digits}f}".rstrip("0").rstrip(".")
+
+
+def _interval(value):
+    """CI95 "a - b", RANGE "[a, b]" or RANGE "['HH:MM-HH:MM']" as a..b."""
+    text = str(value).strip()
+    if text.startswith("["):
+        items = [item.strip(" '\"") for item in text.strip("[]").split(",")]
+        if len(items) == 2 and ":" not in text:
+            return f"{_num(items[0])}..{_num(items[1])}"
+        return ",".join(_interval(item) for item in items)
+    if " - " in text:
+        low, high = text.split(" - ", 1)
+    elif ":" in text and "-" in text:
+        low, high = text.split("-", 1)  # clock times are never negative
+    else:
+        return _num(text)
+    return f"{_num(low)}..{_num(high)}"
+
+
+@serializer("records")
+def records_layout(jsonData):
+    return jsonData if isinstance(jsonData, str) else json.dumps(jsonData)
+
+
+@serializer("table")
+def table_layout(jsonData):
+    header = "variable|units|rank|corr|" + "|".join(
+        f"{c.split()[0]} {s}" for c in CONDITIONS for s in ("mean", "std", "CI95", "range"))
+    lines = [header]
+    for block in _blocks(_records(jsonData)):
+        stats = block["stats"]
+        rank = "" if block["rank"] is None else _num(block["rank"], 0)
+        corr = _num(stats["CORR"]["high Depression"]) if "CORR" in stats else ""
+        values = []
+        for c in CONDITIONS:
+            values += [_num(stats[s][c]) if s in stats else "" for s in ("MEAN", "STD")]
+            values += [_interval(stats[s][c]) if s in stats else "" for s in ("CI95", "RANGE")]
+        lines.append("|".join([block["variable"], block["units"] or "", rank, corr] + values))
+    return "\n".join(lines)
+
+
+@serializer("csv")
+def csv_layout(jsonData):
+    import pandas as pd
+    return pd.DataFrame(_records(jsonData)).to_csv(index=False).strip()
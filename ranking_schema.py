@@ -0,0 +1,94 @@
+import json
+import re
+
+DOMAINS = ["Sleep", "Exercise", "Diet", "Positivity"]
+
+# A numbered list item naming a domain, e.g. "1.  **Sleep**" in a free-text reply
+RANK_PATTERN = re.compile(r"^[\s#*]*\d+\.[\s*]*(Sleep|Exercise|Diet|Positivity)\b", re.M | re.I)
+
+# Response schema for the ranking call: the ordered domains with a
+# justification each, and the narrative report shown to people.
+RANKING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "ranking": {
+            "type": "array",
+            "minItems": len(DOMAINS),
+            "maxItems": len(DOMAINS),
+            "items": {
+                "type": "object",
+                "properties": {
+                    "domain": {"type": "string", "enum": DOMAINS},
+                    "justification": {"type": "string"},
+                },
+                "required": ["domain", "justification"],
+            },
+        },
+        "narrative": {"type": "string"},
+    },
+    "required": ["ranking", "narrative"],
+    "propertyOrdering": ["ranking", "narrative"],
+}
+
+STRUCTURED_INSTRUCTION = """
+
+Respond with JSON that follows the response schema. Put the four intervention domains in "ranking",
+most promising first, each with a short justification based on the data. Put the full report you
+would otherwise write, without the ranked list, in "narrative"; it is shown to the user as markdown."""
+
+
+class RankingError(ValueError):
+    """A structured ranking reply that does not match RANKING_SCHEMA."""
+
+
+def validate_ranking(data):
+    """Check a decoded reply and return it as {"ranking": [...], "narrative": str}."""
+    if not isinstance(data, dict):
+        raise RankingError("reply is not a JSON object")
+    ranking = data.get("ranking")
+    narrative = data.get("narrative")
+    if not isinstance(narrative, str):
+        raise RankingError("narrative is missing")
+    if not isinstance(ranking, list):
+        raise RankingError("ranking is missing")
+    domains = [item.get("domain") if isinstance(item, dict) else None for item in ranking]
+    if sorted(d for d in domains if isinstance(d, str)) != sorted(DOMAINS) or len(domains) != len(DOMAINS):
+        raise RankingError(f"ranking must list each of {', '.join(DOMAINS)} once, got {domains}")
+    if not all(isinstance(item.get("justification"), str) for item in ranking):
+        raise RankingError("every ranked domain needs a justification")
+    return {"ranking": [{"domain": item["domain"], "justification": item["justification"]} for item in ranking],
+            "narrative": narrative}
+
+
+def parse_structured(text):
+    """Decode and validate a structured ranking reply."""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as exc:
+        raise RankingError(f"reply is not JSON: {exc}") from None
+    return validate_ranking(data)
+
+
+def load_summary(text):
+    """Read a technicalSummary file: (narrative, ranking or None).
+
+    Files are [{"role": "model", "content": ...}] and structured runs add a
+    "ranking" list to that record; older files may be plain text.
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return text, None
+    if isinstance(data, list) and data and isinstance(data[0], dict) and "content" in data[0]:
+        return data[0]["content"], data[0].get("ranking")
+    return text, None
+
+
+def parse_ranking(text):
+    """Return the first four distinct domains of the ranked list in a free-text reply."""
+    ranking = []
+    for match in RANK_PATTERN.finditer(text):
+        domain = match.group(1).capitalize()
+        if domain not in ranking:
+            ranking.append(domain)
+    return ranking[:4]
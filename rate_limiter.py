@@ -0,0 +1,238 @@
+import collections
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from history_compaction import contentText, estimate_tokens
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Lower goes first when callers are queued
+INTERACTIVE = 0
+BACKGROUND = 5
+BATCH = 10
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background", BATCH: "batch"}
+
+
+class TransientError(Exception):
+    """Raised by a generate function for failures worth retrying."""
+
+
+class ModelBusyError(RuntimeError):
+    """A call still failed with a transient error after every retry."""
+
+
+def is_transient(exc):
+    if isinstance(exc, (TransientError, TimeoutError, ConnectionError)):
+        return True
+    return getattr(exc, "code", None) in RETRY_STATUS
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class RateLimiter:
+    """Process-wide token buckets for requests/min and tokens/min.
+
+    Callers queue by priority (then arrival) and only the head of the queue
+    may take from the buckets, so interactive turns are served before
+    background and batch calls. Token use is charged up front from an
+    estimate and corrected with settle() once the real count is known.
+    Either limit may be None to leave it unbounded.
+    """
+
+    def __init__(self, requests_per_minute=60, tokens_per_minute=250_000, retries=4, backoff=1.0,
+                 max_backoff=30.0, keep=1000):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self.waits = collections.deque(maxlen=keep)  # (priority, seconds)
+        self.counters = collections.Counter()
+
+    # ---------------------------
+    # Buckets
+    # ---------------------------
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _shortfall(self, tokens):
+        """Seconds until both buckets can cover one request of this size."""
+        need = 0.0
+        if self.rpm:
+            need = max(need, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm:
+            need = max(need, (tokens - self._tokens) * 60 / self.tpm)
+        return need
+
+    def acquire(self, tokens=0, priority=INTERACTIVE):
+        """Block until this call may go ahead; returns the seconds waited."""
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        start = time.monotonic()
+        entry = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self._queue[0] != entry:
+                        self._cond.wait()
+                        continue
+                    need = self._shortfall(tokens)
+                    if need <= 0:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        break
+                    self._cond.wait(need)
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+            wait = time.monotonic() - start
+            self.waits.append((priority, wait))
+            self.counters["requests"] += 1
+            if wait > 0.001:
+                self.counters["throttled"] += 1
+        return wait
+
+    def settle(self, estimated, actual):
+        """Correct the token bucket once the real token count of a call is known."""
+        if actual is None or not self.tpm:
+            return
+        with self._cond:
+            self._tokens -= actual - estimated
+
+    # ---------------------------
+    # Retries
+    # ---------------------------
+
+    def backoff_delay(self, attempt):
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def retry_or_raise(self, attempt, exc):
+        """After a failed attempt: sleep before the next one, or raise if there is none."""
+        if not is_transient(exc):
+            raise exc
+        with self._cond:
+            if attempt == self.retries:
+                self.counters["gave_up"] += 1
+            else:
+                self.counters["retries"] += 1
+        if attempt == self.retries:
+            raise ModelBusyError(f"model still unavailable after {attempt + 1} attempts: {exc!r}") from exc
+        time.sleep(self.backoff_delay(attempt))
+
+    def call(self, fn, tokens=0, priority=INTERACTIVE):
+        """Run fn() under the limiter, retrying transient errors with jittered backoff."""
+        for attempt in range(self.retries + 1):
+            self.acquire(tokens, priority)
+            try:
+                return fn()
+            except Exception as exc:
+                self.retry_or_raise(attempt, exc)
+
+    # ---------------------------
+    # Metrics
+    # ---------------------------
+
+    def stats(self):
+        with self._cond:
+            self._refill()
+            waits = list(self.waits)
+            depth = collections.Counter(PRIORITY_NAMES.get(p, str(p)) for p, _ in self._queue)
+            stats = {"queue_depth": len(self._queue), "queued": dict(depth),
+                     "requests_available": self._requests if self.rpm else None,
+                     "tokens_available": self._tokens if self.tpm else None,
+                     **{k: self.counters[k] for k in ("requests", "throttled", "retries", "gave_up")}}
+        for priority, name in PRIORITY_NAMES.items():
+            values = [w for p, w in waits if p == priority]
+            stats[f"wait_{name}_p50_s"] = _percentile(values, 50)
+            stats[f"wait_{name}_p95_s"] = _percentile(values, 95)
+        return stats
+
+    def prometheus(self):
+        stats = self.stats()
+        lines = ["# TYPE gemini_limiter_queue_depth gauge",
+                 f"gemini_limiter_queue_depth {stats['queue_depth']}",
+                 "# TYPE gemini_limiter_wait_seconds summary"]
+        for name in PRIORITY_NAMES.values():
+            for q in (50, 95):
+                value = stats[f"wait_{name}_p{q}_s"]
+                if value is not None:
+                    lines.append(f'gemini_limiter_wait_seconds{{priority="{name}",quantile="{q / 100}"}} {value}')
+        for key in ("requests", "throttled", "retries", "gave_up"):
+            lines.append(f"# TYPE gemini_limiter_{key}_total counter")
+            lines.append(f"gemini_limiter_{key}_total {stats[key]}")
+        return "\n".join(lines) + "\n"
+
+
+class LimitedChat:
+    """Send every turn of an SDK chat through a RateLimiter.
+
+    The token charge for a turn is the estimated size of the conversation so
+    far plus the message, corrected from usage metadata after the reply. A
+    streamed turn is only retried if nothing has been received yet.
+    """
+
+    def __init__(self, chat, limiter, priority=INTERACTIVE):
+        self.chat = chat
+        self.limiter = limiter
+        self.priority = priority
+        self.context_tokens = sum(estimate_tokens(contentText(c)) for c in chat.get_history() or [])
+
+    def _settle(self, estimated, response, reply_text):
+        usage = getattr(response, "usage_metadata", None)
+        self.limiter.settle(estimated, getattr(usage, "total_token_count", None))
+        self.context_tokens = estimated + estimate_tokens(reply_text or "")
+
+    def send_message(self, message):
+        estimated = self.context_tokens + estimate_tokens(message)
+        response = self.limiter.call(lambda: self.chat.send_message(message), estimated, self.priority)
+        self._settle(estimated, response, response.text)
+        return response
+
+    def send_message_stream(self, message):
+        estimated = self.context_tokens + estimate_tokens(message)
+        limiter = self.limiter
+        chunks = []
+        response = None
+        for attempt in range(limiter.retries + 1):
+            limiter.acquire(estimated, self.priority)
+            try:
+                for response in self.chat.send_message_stream(message):
+                    chunks.append(response.text or "")
+                    yield response
+                break
+            except Exception as exc:
+                if chunks:
+                    raise
+                limiter.retry_or_raise(attempt, exc)
+        self._settle(estimated, response, "".join(chunks))
+
+    def get_history(self, curated=False):
+        return self.chat.get_history()
+
@@ -0,0 +1,272 @@
+"""Opt-in profiling of every Streamlit script run (rerun).
+
+Off unless PERMA_PROFILE is set (every session) or the URL has ?profile=1
+(one session). With profile=flame the script thread's stack is also
+sampled. Each rerun gets a RerunProfile:
+
+    profile = start_rerun("viewer", get_rerun_profiler())
+    with profile.section("read summary"):
+        ...
+    profile.finish()
+    profilePanel(profile)
+
+Sections may nest ("build/read data"). Functions decorated with
+cache_data instead of st.cache_data count their hits and misses on the
+profile. finish() writes one JSON line per rerun (total, time per
+section, time outside any section, cache counts) to the profiler's log.
+With sampling on, a rerun slower than slow_ms also gets a folded-stack
+file (flamegraph.pl or speedscope input), referenced from its record. A
+rerun cut short by a widget interaction or st.rerun is written by the
+next start_rerun with status "interrupted".
+
+When profiling is off, sections and counters do nothing.
+"""
+import collections
+import contextlib
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from chat_telemetry import _percentile
+
+_active = threading.local()  # profile of the script run on this thread
+
+
+class StackSampler:
+    """Counts the stacks of one thread every interval seconds, in folded form.
+
+    Sampling ends at stop() or after max_seconds, whichever is first.
+    """
+
+    def __init__(self, thread_id, interval=0.005, max_seconds=120):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.deadline = time.monotonic() + max_seconds
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rerun-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval) and time.monotonic() < self.deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+class RerunProfile:
+    """Section timings and cache counts of one script run."""
+
+    def __init__(self, profiler=None, app="", session_id=None, sample=False):
+        self.profiler = profiler
+        self.enabled = profiler is not None
+        self.app = app
+        self.session_id = session_id
+        self.sections = collections.Counter()
+        self.cache = collections.defaultdict(collections.Counter)
+        self.finished = False
+        self._path = []
+        self._start = self._last = time.perf_counter()
+        self._ts = time.time()
+        self._sampler = StackSampler(threading.get_ident()) if self.enabled and sample else None
+
+    @contextlib.contextmanager
+    def section(self, name):
+        if not self.enabled:
+            yield
+            return
+        self._path.append(name)
+        key = "/".join(self._path)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.sections[key] += self._last - start
+            self._path.pop()
+
+    def count(self, name, hit):
+        if self.enabled:
+            self.cache[name]["hits" if hit else "misses"] += 1
+            self._last = time.perf_counter()
+
+    def misses(self, name):
+        return self.cache[name]["misses"] if self.enabled else 0
+
+    def finish(self, status="complete"):
+        """Write this rerun's record; an interrupted run ends at its last section."""
+        if not self.enabled or self.finished:
+            return None
+        self.finished = True
+        end = time.perf_counter() if status == "complete" else self._last
+        total = end - self._start
+        outer = sum(s for name, s in self.sections.items() if "/" not in name)
+        record = {
+            "ts": self._ts,
+            "app": self.app,
+            "session_id": self.session_id,
+            "status": status,
+            "total_s": total,
+            "sections": dict(self.sections),
+            "other_s": max(total - outer, 0.0),
+            "cache": {name: dict(counts) for name, counts in self.cache.items()},
+        }
+        stacks = self._sampler.stop() if self._sampler is not None else None
+        self.profiler.record(record, stacks)
+        return record
+
+
+class RerunProfiler:
+    """Process-wide log of rerun records, plus the recent records of each session.
+
+    slow_ms is the total above which a sampled rerun keeps its flame graph
+    (folded stacks under flame_dir).
+    """
+
+    def __init__(self, path="telemetry/reruns.jsonl", flame_dir="telemetry/flames", slow_ms=500, keep=50,
+                 max_bytes=10 * 1024 * 1024, backups=5):
+        self.flame_dir = flame_dir
+        self.slow_ms = slow_ms
+        self.keep = keep
+        self._recent = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._log = logging.getLogger(f"perma.reruns.{os.path.abspath(path)}")
+        self._log.propagate = False
+        self._log.setLevel(logging.INFO)
+        if not self._log.handlers:
+            # delay: no file is created until the first rerun is profiled
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                           encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._log.addHandler(handler)
+
+    def record(self, record, stacks=None):
+        if stacks and record["total_s"] * 1000 >= self.slow_ms:
+            record["flame"] = self.write_flame(record, stacks)
+        with self._lock:
+            self._recent.setdefault(record["session_id"], collections.deque(maxlen=self.keep)).append(record)
+        self._log.info(json.dumps(record))
+
+    def write_flame(self, record, stacks):
+        os.makedirs(self.flame_dir, exist_ok=True)
+        path = os.path.join(self.flame_dir, f"{record['app']}-{int(record['ts'] * 1000)}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        return path
+
+    def recent(self, session_id):
+        with self._lock:
+            return list(self._recent.get(session_id, ()))
+
+
+# ---------------------------
+# Script helpers
+# ---------------------------
+
+def profile_mode():
+    """None, "on" or "flame", from PERMA_PROFILE or the profile query parameter."""
+    value = os.environ.get("PERMA_PROFILE") or st.query_params.get("profile")
+    if not value or value in ("0", "false", "off"):
+        return None
+    return "flame" if value == "flame" else "on"
+
+
+def current_profile():
+    profile = getattr(_active, "profile", None)
+    return profile if profile is not None else _DISABLED
+
+
+def start_rerun(app, profiler):
+    """Profile for this script run (disabled unless profiling is on); call first thing in the script."""
+    previous = st.session_state.get("_rerun_profile")
+    if previous is not None:
+        previous.finish(status="interrupted")
+    mode = profile_mode()
+    ctx = get_script_run_ctx()
+    profile = RerunProfile(profiler if mode else None, app, ctx.session_id if ctx else None,
+                           sample=mode == "flame")
+    st.session_state._rerun_profile = profile
+    _active.profile = profile
+    return profile
+
+
+def cache_data(func=None, **kwargs):
+    """st.cache_data that also counts hits and misses on the current RerunProfile."""
+    if func is None:
+        return functools.partial(cache_data, **kwargs)
+    name = func.__qualname__
+
+    # Only runs when st.cache_data has no entry for the arguments
+    @functools.wraps(func)
+    def miss(*args, **kw):
+        current_profile().count(name, hit=False)
+        return func(*args, **kw)
+
+    cached = st.cache_data(**kwargs)(miss)
+
+    @functools.wraps(func)
+    def call(*args, **kw):
+        profile = current_profile()
+        before = profile.misses(name)
+        result = cached(*args, **kw)
+        if profile.misses(name) == before:
+            profile.count(name, hit=True)
+        return result
+
+    call.clear = cached.clear
+    return call
+
+
+def profilePanel(profile):
+    """Sidebar breakdown of this session's recent reruns; call after profile.finish()."""
+    if not profile.enabled:
+        return
+    records = profile.profiler.recent(profile.session_id)
+    if not records:
+        return
+    with st.sidebar.expander("Rerun profile"):
+        totals = [r["total_s"] for r in records]
+        st.caption(f"{len(records)} reruns: last {totals[-1] * 1000:.0f} ms, "
+                   f"p50 {_percentile(totals, 50) * 1000:.0f} ms, p95 {_percentile(totals, 95) * 1000:.0f} ms")
+        names = sorted({name for r in records for name in r["sections"]})
+        rows = []
+        for name in names + ["(other)"]:
+            times = [r["other_s"] if name == "(other)" else r["sections"].get(name, 0.0) for r in records]
+            rows.append({"section": name, "last ms": times[-1] * 1000,
+                         "mean ms": sum(times) / len(times) * 1000, "p95 ms": _percentile(times, 95) * 1000,
+                         "share": sum(times) / max(sum(totals), 1e-9)})
+        st.dataframe(rows, hide_index=True, column_config={"share": st.column_config.ProgressColumn(
+            "share", format="percent", min_value=0, max_value=1)})
+        cache = collections.defaultdict(collections.Counter)
+        for r in records:
+            for name, counts in r["cache"].items():
+                cache[name].update(counts)
+        if cache:
+            st.dataframe([{"function": name, "hits": c["hits"], "misses": c["misses"]} for name, c in cache.items()],
+                         hide_index=True)
+        flames = [r["flame"] for r in records if r.get("flame")]
+        if flames:
+            st.caption(f"Flame graphs of slow reruns: {', '.join(flames[-3:])}")
+
+
+_DISABLED = RerunProfile()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def _sha(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded on-disk LRU of model replies, safe to share between sessions.
+
+    Entries live in a single SQLite file; once the stored replies exceed
+    max_bytes the least recently read ones are dropped.
+    """
+
+    def __init__(self, path=".response_cache.sqlite", max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries "
+                         "(key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_access REAL)")
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, value, size, time.time()))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            while total > self.max_bytes:
+                oldest, oldest_size = self._db.execute(
+                    "SELECT key, size FROM entries ORDER BY last_access LIMIT 1").fetchone()
+                self._db.execute("DELETE FROM entries WHERE key = ?", (oldest,))
+                total -= oldest_size
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+class CachedResponse:
+    """Stand-in for GenerateContentResponse when the reply comes from the cache."""
+
+    cached = True
+    usage_metadata = None
+
+    def __init__(self, text):
+        self.text = text
+
+
+class CachedChat:
+    """Chat with the same send_message/send_message_stream/get_history as an SDK chat.
+
+    Each turn is looked up by model, system instruction, temperature and the
+    conversation so far. The SDK chat is only created when a turn misses, and
+    is seeded with the history collected so far. create(history), if given,
+    builds that chat instead of client.chats.create (e.g. to route or rate
+    limit it).
+    """
+
+    def __init__(self, client, model, config, cache, history=None, create=None):
+        self.client = client
+        self.create = create
+        self.model = model
+        self.config = config
+        self.cache = cache
+        self._history = list(history or [])
+        self._chat = None
+
+    def _key(self, message):
+        turns = [(c.role, "".join(p.text or "" for p in c.parts)) for c in self._history]
+        turns.append(("user", message))
+        return _sha(json.dumps([
+            self.model,
+            _sha(self.config.system_instruction or ""),
+            self.config.temperature,
+            _sha(json.dumps(turns)),
+        ]))
+
+    def _record(self, message, reply):
+        from google.genai import types
+        self._history.append(types.Content(role="user", parts=[types.Part(text=message)]))
+        self._history.append(types.Content(role="model", parts=[types.Part(text=reply)]))
+
+    def _sdk_chat(self):
+        if self._chat is None:
+            if self.create is not None:
+                self._chat = self.create(list(self._history))
+            else:
+                self._chat = self.client.chats.create(model=self.model, config=self.config,
+                                                      history=list(self._history))
+        return self._chat
+
+    def send_message(self, message):
+        key = self._key(message)
+        reply = self.cache.get(key)
+        if reply is not None:
+            self._chat = None  # the SDK chat has not seen this turn
+            self._record(message, reply)
+            return CachedResponse(reply)
+        response = self._sdk_chat().send_message(message)
+        if response.text:
+            self.cache.put(key, response.text)
+        self._record(message, response.text or "")
+        return response
+
+    def send_message_stream(self, message):
+        key = self._key(message)
+        reply = self.cache.get(key)
+        if reply is not None:
+            self._chat = None
+            self._record(message, reply)
+            yield CachedResponse(reply)
+            return
+        chunks = []
+        for response in self._sdk_chat().send_message_stream(message):
+            chunks.append(response.text or "")
+            yield response
+        reply = "".join(chunks)
+        if reply:
+            self.cache.put(key, reply)
+        self._record(message, reply)
+
+    def get_history(self, curated=False):
+        return list(self._history)
@@ -0,0 +1,159 @@
+import collections
+import sqlite3
+import threading
+import time
+
+
+class SessionStore:
+    """SQLite (WAL) record of each chat session plus a bounded set of live chats.
+
+    Settings and every message are written to the database as they happen.
+    Live SDK chat objects are kept for at most max_resident sessions (least
+    recently used are dropped first) and for at most idle_seconds; a dropped
+    chat is rebuilt from the stored messages the next time it is needed.
+    on_evict, if given, is called with the session_id of each dropped chat
+    (e.g. SessionWorkers.forget).
+    """
+
+    def __init__(self, path=".sessions.sqlite", max_resident=100, idle_seconds=900, on_evict=None):
+        self.path = path
+        self.max_resident = max_resident
+        self.idle_seconds = idle_seconds
+        self.on_evict = on_evict
+        self.rebuilds = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._chats = collections.OrderedDict()  # session_id -> (chat, last_used)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY, app TEXT, role TEXT, full_role TEXT,
+                temperature REAL, participant TEXT, created REAL, updated REAL);
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT, idx INTEGER, role TEXT, content TEXT, hidden INTEGER,
+                created REAL, PRIMARY KEY (session_id, idx));
+        """)
+        self._db.commit()
+
+    # ---------------------------
+    # Persistence
+    # ---------------------------
+
+    def start(self, session_id, app, role, full_role, temperature, participant):
+        """Record new settings for a session and clear its messages (a rebuild)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (session_id, app, role, full_role, temperature, participant, now, now))
+            self._db.commit()
+            self._chats.pop(session_id, None)
+
+    def append(self, session_id, role, content, hidden=False):
+        """Store one message; hidden ones are sent to the model but not shown."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO messages SELECT ?, COALESCE(MAX(idx) + 1, 0), ?, ?, ?, ? "
+                "FROM messages WHERE session_id = ?",
+                (session_id, role, content, int(hidden), now, session_id))
+            self._db.execute("UPDATE sessions SET updated = ? WHERE session_id = ?", (now, session_id))
+            self._db.commit()
+
+    def settings(self, session_id):
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,))
+            row = cursor.fetchone()
+            return dict(zip([c[0] for c in cursor.description], row)) if row else None
+
+    def messages(self, session_id, include_hidden=False):
+        query = "SELECT role, content FROM messages WHERE session_id = ?"
+        if not include_hidden:
+            query += " AND hidden = 0"
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY idx", (session_id,)).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def history(self, session_id):
+        """Stored messages as Gemini chat history."""
+        # Imported here: the SDK is only needed once a chat is rebuilt
+        from google.genai import types
+        return [types.Content(role="model" if m["role"] == "assistant" else m["role"],
+                              parts=[types.Part(text=m["content"])])
+                for m in self.messages(session_id, include_hidden=True)]
+
+    def iter_sessions(self, include_hidden=True, app=None):
+        """Yield each stored session's settings with its messages, oldest first.
+
+        Reads on its own connection (WAL lets it run alongside writers) and
+        holds one session in memory at a time.
+        """
+        db = sqlite3.connect(self.path)
+        try:
+            query = "SELECT * FROM sessions" + (" WHERE app = ?" if app else "") + " ORDER BY created"
+            cursor = db.execute(query, (app,) if app else ())
+            columns = [c[0] for c in cursor.description]
+            for row in cursor:
+                session = dict(zip(columns, row))
+                rows = db.execute("SELECT role, content, hidden, created FROM messages WHERE session_id = ?"
+                                  + ("" if include_hidden else " AND hidden = 0") + " ORDER BY idx",
+                                  (session["session_id"],))
+                session["messages"] = [{"role": r, "content": c, "hidden": bool(h), "created": t}
+                                       for r, c, h, t in rows]
+                yield session
+        finally:
+            db.close()
+
+    # ---------------------------
+    # Resident chat objects
+    # ---------------------------
+
+    def put_chat(self, session_id, chat):
+        with self._lock:
+            self._chats[session_id] = (chat, time.time())
+            self._chats.move_to_end(session_id)
+            self.evict()
+
+    def peek(self, session_id):
+        """The live chat for a session, or None if it is not resident."""
+        with self._lock:
+            entry = self._chats.get(session_id)
+            return entry[0] if entry else None
+
+    def chat(self, session_id, factory):
+        """Return the live chat, rebuilding it with factory(history) if it was dropped."""
+        with self._lock:
+            entry = self._chats.get(session_id)
+            if entry is not None:
+                self._chats[session_id] = (entry[0], time.time())
+                self._chats.move_to_end(session_id)
+                return entry[0]
+        chat = factory(self.history(session_id))
+        with self._lock:
+            self.rebuilds += 1
+        self.put_chat(session_id, chat)
+        return chat
+
+    def evict(self):
+        """Drop idle chats and the least recently used ones beyond max_resident."""
+        cutoff = time.time() - self.idle_seconds
+        dropped = []
+        with self._lock:
+            for session_id in [s for s, (_, used) in self._chats.items() if used < cutoff]:
+                del self._chats[session_id]
+                dropped.append(session_id)
+            while len(self._chats) > self.max_resident:
+                dropped.append(self._chats.popitem(last=False)[0])
+            self.evictions += len(dropped)
+        if self.on_evict is not None:
+            for session_id in dropped:
+                self.on_evict(session_id)
+
+    def stats(self):
+        with self._lock:
+            sessions, messages = self._db.execute(
+                "SELECT (SELECT COUNT(*) FROM sessions), (SELECT COUNT(*) FROM messages)").fetchone()
+            return {"resident": len(self._chats), "sessions": sessions, "messages": messages,
+                    "rebuilds": self.rebuilds, "evictions": self.evictions}
@@ -0,0 +1,72 @@
+import numpy as np
+
+from assignment_eval import evaluate, load_assignments, score_experiment, score_pair
+
+HEADER = ",SubID,humanAssigned,0,1,2,3,CorrectAssignment\n"
+
+
+def write_assignments(folder, rows):
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / "assignments.csv"
+    path.write_text(HEADER + "".join(f"{i},{row}\n" for i, row in enumerate(rows)), encoding="utf-8")
+    return str(path)
+
+
+def test_unknown_domains_are_encoded_as_minus_one(tmp_path):
+    path = write_assignments(tmp_path / "exp", [
+        "perma1,Sleep,Sleep,Diet,Exercise,Positivity,TRUE",
+        "perma2,,Diet,,,,",
+        "perma3,Mindfulness,Sleep,Unknown,Diet,Exercise,FALSE",
+    ])
+    ids, human, ranks, correct = load_assignments(path)
+    assert list(ids) == ["perma1", "perma2", "perma3"]
+    assert list(human) == [0, -1, -1]
+    assert list(ranks[1]) == [2, -1, -1, -1] and ranks[2, 1] == -1
+    assert correct[0] == 1.0 and np.isnan(correct[1]) and correct[2] == 0.0
+
+
+def test_unknown_human_choice_is_left_out_not_counted_as_a_miss():
+    human = np.array([0, -1, 1], dtype=np.int8)
+    ranks = np.array([[0, 1, 2, 3], [0, 1, 2, 3], [2, 1, 0, 3]], dtype=np.int8)
+    score = score_experiment(human, ranks, np.array([1.0, np.nan, 0.0]), n_boot=50)
+    assert score["n"] == 2 and score["human_unknown"] == 1
+    assert score["top1"] == 0.5 and score["top2"] == 1.0
+    assert score["mean_human_rank"] == 1.5
+    assert sum(map(sum, score["confusion"])) == 2
+
+
+def test_unknown_rank_never_matches_an_unknown_human_choice():
+    # Before the fix both sides were -1 and this counted as a top-1 match
+    human = np.array([-1, 2], dtype=np.int8)
+    ranks = np.array([[-1, -1, -1, -1], [-1, -1, 2, 0]], dtype=np.int8)
+    score = score_experiment(human, ranks, np.array([np.nan, np.nan]), n_boot=50)
+    assert score["n"] == 1 and score["top1"] == 0.0 and score["top2"] == 0.0
+    assert score["mean_human_rank"] == 3.0 and score["human_unranked"] == 0
+    assert score["confusion"] == [[0] * 4] * 4  # no known model top-1 to place
+    assert score["marked_correct"] is None
+
+
+def test_no_known_human_choices():
+    score = score_experiment(np.array([-1], dtype=np.int8), np.array([[0, 1, 2, 3]], dtype=np.int8),
+                             np.array([np.nan]), n_boot=50)
+    assert score["n"] == 0 and score["top1"] is None and score["top1_ci"] == [None, None]
+
+
+def test_pair_agreement_skips_unknown_top1():
+    a = (np.array(["perma1", "perma2", "perma3"]), None, np.array([[0], [-1], [2]], dtype=np.int8), None)
+    b = (np.array(["perma2", "perma3", "perma4"]), None, np.array([[-1], [2], [1]], dtype=np.int8), None)
+    pair = score_pair(a, b, n_boot=50)
+    assert pair["n"] == 1 and pair["top1_agreement"] == 1.0
+
+
+def test_evaluate_scores_each_experiment_once(tmp_path):
+    write_assignments(tmp_path / "expA", ["perma1,Sleep,Sleep,Diet,Exercise,Positivity,TRUE",
+                                          "perma2,Diet,Sleep,Diet,Exercise,Positivity,TRUE"])
+    write_assignments(tmp_path / "expB", ["perma1,Sleep,Diet,Sleep,Exercise,Positivity,TRUE",
+                                          "perma2,Diet,,,,,"])
+    result = evaluate(root=str(tmp_path), n_boot=50)
+    assert result["computed"] == 3
+    assert result["experiments"]["expA"]["top1"] == 0.5
+    assert result["experiments"]["expB"]["top1"] == 0.0 and result["experiments"]["expB"]["human_unranked"] == 1
+    assert result["pairs"]["expA", "expB"]["n"] == 1
+    assert evaluate(root=str(tmp_path), n_boot=50)["computed"] == 0
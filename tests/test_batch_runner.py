@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+
+import pandas as pd
+
+from batch_runner import CHECKPOINT_FILE, SUMMARY_SUFFIX, read_checkpoint, run_batch, write_assignments
+from rate_limiter import TransientError
+
+REPLY = "## Ranked Intervention Domains\n\n1.  **Sleep**\n2.  **Diet**\n3.  **Exercise**\n4.  **Positivity**"
+
+
+def make_experiment(tmp_path, participants=("perma1", "perma2", "perma3"), prompt="Rank the domains."):
+    experiment = tmp_path / "experiment"
+    experiment.mkdir(exist_ok=True)
+    (experiment / "prompt.txt").write_text(prompt, encoding="utf-8")
+    csv_dir = tmp_path / "csv"
+    csv_dir.mkdir(exist_ok=True)
+    for sub_id in participants:
+        # The SubID is in the payload so the stub generate knows who it is answering
+        pd.DataFrame({"variable": ["id"], "value": [sub_id]}).to_csv(csv_dir / f"{sub_id}.csv")
+    return str(experiment), str(csv_dir)
+
+
+def recording_generate(calls, fail=()):
+    async def generate(system_instruction, message):
+        sub_id = json.loads(message)[0]["value"]
+        calls.append(sub_id)
+        if sub_id in fail:
+            raise ValueError("permanent failure")
+        return REPLY
+    return generate
+
+
+def run(experiment, csv_dir, generate, **kwargs):
+    return asyncio.run(run_batch(experiment, generate, concurrency=2, retries=1, backoff=0.0, csv_dir=csv_dir,
+                                 log=lambda *_: None, **kwargs))
+
+
+def test_interrupted_run_resumes_only_unfinished_participants(tmp_path):
+    experiment, csv_dir = make_experiment(tmp_path)
+    calls = []
+    stats = run(experiment, csv_dir, recording_generate(calls, fail={"perma2"}))
+    assert stats["done"] == 2 and stats["failed"] == ["perma2"]
+    assert not os.path.exists(os.path.join(experiment, "assignments.csv"))
+
+    calls.clear()
+    stats = run(experiment, csv_dir, recording_generate(calls))
+    assert calls == ["perma2"]
+    assert stats["skipped"] == 2 and stats["done"] == 1
+    assignments = pd.read_csv(os.path.join(experiment, "assignments.csv"))
+    assert list(assignments["SubID"]) == ["perma1", "perma2", "perma3"]
+    assert list(assignments.iloc[0][["0", "1", "2", "3"]]) == ["Sleep", "Diet", "Exercise", "Positivity"]
+
+
+def test_changed_prompt_invalidates_the_checkpoint(tmp_path):
+    experiment, csv_dir = make_experiment(tmp_path)
+    calls = []
+    run(experiment, csv_dir, recording_generate(calls))
+    with open(os.path.join(experiment, "prompt.txt"), "w", encoding="utf-8") as f:
+        f.write("Rank the domains, briefly.")
+    calls.clear()
+    stats = run(experiment, csv_dir, recording_generate(calls))
+    assert sorted(calls) == ["perma1", "perma2", "perma3"] and stats["skipped"] == 0
+
+
+def test_missing_summary_file_is_regenerated(tmp_path):
+    experiment, csv_dir = make_experiment(tmp_path)
+    calls = []
+    run(experiment, csv_dir, recording_generate(calls))
+    os.remove(os.path.join(experiment, "technicalSummary", "perma3" + SUMMARY_SUFFIX))
+    calls.clear()
+    run(experiment, csv_dir, recording_generate(calls))
+    assert calls == ["perma3"]
+
+
+def test_transient_failures_are_retried(tmp_path):
+    experiment, csv_dir = make_experiment(tmp_path, participants=("perma1",))
+    attempts = []
+
+    async def flaky(system_instruction, message):
+        attempts.append(message)
+        if len(attempts) == 1:
+            raise TransientError("429")
+        return REPLY
+
+    stats = run(experiment, csv_dir, flaky)
+    assert stats["done"] == 1 and stats["retries"] == 1 and len(attempts) == 2
+
+
+def test_read_checkpoint_skips_partial_lines_and_other_prompts(tmp_path):
+    path = tmp_path / CHECKPOINT_FILE
+    path.write_text(
+        json.dumps({"SubID": "perma1", "prompt_sha": "a", "ranking": ["Sleep"]}) + "\n"
+        + json.dumps({"SubID": "perma2", "prompt_sha": "b", "ranking": ["Diet"]}) + "\n"
+        + '{"SubID": "perma3", "prompt_sh',
+        encoding="utf-8")
+    assert read_checkpoint(str(path), "a") == {"perma1": ["Sleep"]}
+    assert read_checkpoint(str(tmp_path / "missing.jsonl"), "a") == {}
+
+
+def test_write_assignments_keeps_human_choice_and_counts_top_two(tmp_path):
+    experiment = str(tmp_path)
+    pd.DataFrame({"SubID": ["perma1", "perma2", "perma3"], "humanAssigned": ["Diet", "Exercise", "Sleep"]}) \
+        .to_csv(os.path.join(experiment, "assignments.csv"))
+    ranking = ["Sleep", "Diet", "Exercise", "Positivity"]
+    write_assignments(experiment, {"perma1": ranking, "perma2": ranking, "perma3": ranking, "perma4": ranking[:2]})
+    rows = pd.read_csv(os.path.join(experiment, "assignments.csv")).set_index("SubID")
+    assert rows.loc["perma1", "humanAssigned"] == "Diet"
+    assert list(rows["CorrectAssignment"]) == [True, False, True, False]
+    assert rows.loc["perma4", ["2", "3"]].isna().all()
@@ -0,0 +1,88 @@
+from google.genai import types
+
+from history_compaction import CompactingChat, contentText, estimate_tokens
+
+
+class StubChat:
+    """SDK chat stand-in: replies "reply N" and keeps the history."""
+
+    def __init__(self, history=()):
+        self.history = list(history)
+
+    def send_message(self, message):
+        reply = f"reply {len(self.history) // 2}"
+        self.history += [types.Content(role="user", parts=[types.Part(text=message)]),
+                         types.Content(role="model", parts=[types.Part(text=reply)])]
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=reply)]))])
+
+    def send_message_stream(self, message):
+        yield self.send_message(message)
+
+    def get_history(self, curated=False):
+        return list(self.history)
+
+
+def texts(chat):
+    return [contentText(c) for c in chat.get_history()]
+
+
+def compacting(budget, system_instruction="", pin_turns=1, keep_turns=1):
+    summarized = []
+
+    def summarize(history):
+        summarized.append([contentText(c) for c in history])
+        return "short"
+
+    chat = CompactingChat(StubChat(), StubChat, summarize, budget, keep_turns=keep_turns,
+                          system_instruction=system_instruction, pin_turns=pin_turns)
+    return chat, summarized
+
+
+def test_opening_exchange_is_pinned_through_compaction():
+    chat, summarized = compacting(budget=60)
+    chat.send_message("participant summary " + "x" * 100)
+    for n in range(4):
+        chat.send_message(f"turn {n} " + "y" * 40)
+    history = texts(chat)
+    assert history[0].startswith("participant summary") and history[1] == "reply 0"
+    assert history[2] == "Summary of our conversation so far: short"
+    assert history[-2].startswith("turn 3")
+    assert summarized and all(not t.startswith("participant summary") for turns in summarized for t in turns)
+
+
+def test_later_compaction_folds_in_the_earlier_summary():
+    chat, summarized = compacting(budget=60)
+    chat.send_message("opening")
+    for n in range(6):
+        chat.send_message(f"turn {n} " + "y" * 60)
+    assert len(summarized) > 1
+    assert summarized[-1][0] == "Summary of our conversation so far: short"
+    assert texts(chat)[:2] == ["opening", "reply 0"]
+
+
+def test_nothing_is_summarized_when_system_and_pinned_turns_are_over_budget():
+    chat, summarized = compacting(budget=50, system_instruction="s" * 400)
+    for n in range(5):
+        chat.send_message(f"turn {n}")
+    assert summarized == []
+    assert len(chat.get_history()) == 10
+    assert all(entry["compacted_to"] is None for entry in chat.turn_log)
+
+
+def test_under_budget_turns_are_logged_but_not_compacted():
+    chat, summarized = compacting(budget=10_000)
+    chat.send_message("hello")
+    list(chat.send_message_stream("again"))
+    assert summarized == []
+    assert [entry["turn"] for entry in chat.turn_log] == [1, 2]
+    assert chat.turn_log[-1]["prompt_tokens"] == sum(estimate_tokens(t) for t in texts(chat))
+
+
+def test_compacted_prompt_is_back_under_budget():
+    chat, _ = compacting(budget=80, keep_turns=1)
+    chat.send_message("opening")
+    for n in range(4):
+        chat.send_message(f"turn {n} " + "z" * 80)
+    compacted = [entry["compacted_to"] for entry in chat.turn_log if entry["compacted_to"]]
+    assert compacted and all(tokens <= 80 for tokens in compacted)
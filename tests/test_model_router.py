@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+
+from model_router import ModelRouter, Policy, RoutedChat, default_policies
+
+
+def router(hedge=True, deadline=0.05, **kwargs):
+    models = ["primary", "hedge"] if hedge else ["primary"]
+    decisions = []
+    policy = Policy(models, hedge=hedge, default_deadline=deadline, min_deadline=0.01, **kwargs)
+    return ModelRouter({"turn": policy}, record=lambda **fields: decisions.append(fields)), decisions
+
+
+def attempts(behaviour):
+    """attempt(model) following behaviour[model]: a reply, an exception, or (delay, reply)."""
+    calls = []
+
+    def attempt(model):
+        calls.append(model)
+        outcome = behaviour[model]
+        if isinstance(outcome, tuple):
+            time.sleep(outcome[0])
+            outcome = outcome[1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return attempt, calls
+
+
+def test_fast_primary_is_never_hedged():
+    r, decisions = router()
+    attempt, calls = attempts({"primary": "from primary", "hedge": "from hedge"})
+    assert r.call("turn", attempt) == "from primary"
+    assert calls == ["primary"]
+    assert decisions[0]["winner"] == "primary" and not decisions[0]["hedged"]
+
+
+def test_failed_primary_fails_over_at_once():
+    r, decisions = router(deadline=30.0)
+    attempt, calls = attempts({"primary": ConnectionError("down"), "hedge": "from hedge"})
+    start = time.perf_counter()
+    assert r.call("turn", attempt) == "from hedge"
+    assert time.perf_counter() - start < 5.0  # did not wait for the 30 s deadline
+    assert calls == ["primary", "hedge"]
+    stats = r.stats()["sites"]["turn"]
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1 and stats["failed"] == 0
+
+
+def test_slow_primary_is_hedged_after_the_deadline():
+    r, decisions = router(deadline=0.05)
+    waited = []
+    attempt, calls = attempts({"primary": (1.0, "from primary"), "hedge": "from hedge"})
+    assert r.call("turn", attempt, before_hedge=lambda: waited.append(True)) == "from hedge"
+    assert waited == [True]
+    assert {k: decisions[0][k] for k in ("kind", "site", "primary", "hedged", "winner")} == \
+        {"kind": "route", "site": "turn", "primary": "primary", "hedged": True, "winner": "hedge"}
+    assert decisions[0]["first_response_s"] < 1.0
+
+
+def test_both_failing_raises_the_primary_error():
+    r, decisions = router()
+    attempt, _ = attempts({"primary": ConnectionError("primary down"), "hedge": TimeoutError("hedge down")})
+    with pytest.raises(ConnectionError, match="primary down"):
+        r.call("turn", attempt)
+    assert decisions[0]["winner"] is None and r.stats()["sites"]["turn"]["failed"] == 1
+
+
+def test_without_a_hedge_model_the_error_is_raised():
+    r, _ = router(hedge=False)
+    attempt, calls = attempts({"primary": ConnectionError("down")})
+    with pytest.raises(ConnectionError):
+        r.call("turn", attempt)
+    assert calls == ["primary"]
+
+
+def test_stream_yields_only_the_winner_in_order():
+    r, _ = router(deadline=0.05)
+    release = threading.Event()
+
+    def attempt(model):
+        if model == "primary":
+            release.wait(2.0)
+            yield "primary chunk"
+            return
+        for n in range(3):
+            yield f"hedge chunk {n}"
+
+    assert list(r.stream("turn", attempt)) == ["hedge chunk 0", "hedge chunk 1", "hedge chunk 2"]
+    release.set()
+
+
+def test_deadline_follows_the_primary_latency_per_mode():
+    r, _ = router(deadline=3.0, min_samples=5)
+    for seconds in (0.1, 0.2, 0.3, 0.4, 0.5):
+        r.observe("turn", "stream", "primary", seconds)
+    assert r.deadline("turn", "stream", "primary") == pytest.approx(0.48)
+    assert r.deadline("turn", "blocking", "primary") == 3.0
+
+
+def test_adaptive_policy_switches_to_the_faster_model():
+    r, _ = router(adaptive=True, min_samples=3)
+    assert r.primary("turn", "blocking") == "primary"
+    for _ in range(3):
+        r.observe("turn", "blocking", "primary", 2.0)
+        r.observe("turn", "blocking", "hedge", 0.5)
+    assert r.primary("turn", "blocking") == "hedge"
+    assert r.primary("turn", "stream") == "primary"
+
+
+def test_default_policies_only_hedge_with_a_second_model():
+    assert not default_policies("gemini-2.5-flash")["turn"].hedge
+    assert not default_policies("gemini-2.5-flash", "gemini-2.5-flash")["turn"].hedge
+    policies = default_policies("gemini-2.5-flash", "gemini-2.5-flash-lite")
+    assert policies["turn"].hedge and policies["greeting"].hedge and not policies["batch"].hedge
+
+
+class StubClient:
+    """client.chats.create stand-in whose chats answer per model."""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.chats = self
+        self.histories = []
+
+    def create(self, model, config, history):
+        self.histories.append((model, len(history)))
+        client = self
+
+        class Chat:
+            def send_message(self, message):
+                outcome = client.behaviour[model]
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return type("Response", (), {"text": outcome})()
+        return Chat()
+
+
+def test_routed_chat_keeps_one_copy_of_each_turn():
+    r, decisions = router(deadline=30.0)
+    r.policies["greeting"] = r.policies["turn"]
+    client = StubClient({"primary": ConnectionError("down"), "hedge": "Hello from the hedge"})
+    chat = RoutedChat(client, None, r)
+    assert chat.send_message("Hello").text == "Hello from the hedge"
+    client.behaviour["primary"] = "Second reply"
+    assert chat.send_message("Next").text == "Second reply"
+    assert [d["site"] for d in decisions] == ["greeting", "turn"]
+    assert [c.role for c in chat.get_history()] == ["user", "model", "user", "model"]
+    assert client.histories[-1] == ("primary", 2)
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+from participant_store import DAY, build_table, load_store, participant_frame, to_csv, unwrap_times
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_DIR = os.path.join(ROOT, "dataForLLM")
+
+NIGHT_OWL = """,rank,level_0,level_1,high Depression,low Depression
+0,1.0,Sleep_bedtime,MEAN,23:59,00:22
+1,,24 Hr scale,RANGE,['21:00-03:00'],['21:00-03:30']
+2,,,CORR,-0.25,-0.25
+3,,,STD,01:27,01:60
+4,,,CI95,23:40 - 00:10,00:05 - 00:39
+5,2.0,past_day_fats,MEAN,0.923,1.639
+6,,portions,RANGE,"[0.0, 4.0]","[0.0, 8.0]"
+7,,,CORR,0.208,0.208
+8,,,STD,1.141,2.175
+9,,,CI95,nan - nan,-0.051 - 0.372
+"""
+
+
+@pytest.fixture(scope="module")
+def table():
+    return build_table(CSV_DIR)
+
+
+@pytest.fixture
+def night_owl(tmp_path):
+    (tmp_path / "perma1.csv").write_text(NIGHT_OWL, encoding="utf-8")
+    return build_table(str(tmp_path))
+
+
+def test_every_source_csv_round_trips(table):
+    for name in os.listdir(CSV_DIR):
+        with open(os.path.join(CSV_DIR, name), "r", encoding="utf-8") as f:
+            source = f.read().replace(",01:60\n", ",02:00\n")
+        assert to_csv(table, name[:-len(".csv")]).strip() == source.strip(), name
+
+
+def test_minute_overflow_comes_back_as_the_next_hour(night_owl):
+    row = night_owl[(night_owl["variable"] == "Sleep_bedtime") & (night_owl["condition"] == "low")].iloc[0]
+    assert row["is_time"] and row["std"] == 120
+    frame = participant_frame(night_owl, "perma1")
+    assert frame.loc[frame["level_1"] == "STD", "low Depression"].iloc[0] == "02:00"
+
+
+def test_typed_columns(night_owl):
+    fats = night_owl[night_owl["variable"] == "past_day_fats"].set_index("condition")
+    assert not fats["is_time"].any()
+    assert fats.loc["low", ["ci_low", "ci_high"]].tolist() == [-0.051, 0.372]
+    assert np.isnan(fats.loc["high", "ci_low"])
+    assert fats.loc["low", ["range_min", "range_max"]].tolist() == [0.0, 8.0]
+    bedtime = night_owl[night_owl["variable"] == "Sleep_bedtime"].set_index("condition")
+    assert bedtime.loc["high", ["mean", "range_min", "range_max"]].tolist() == [23 * 60 + 59, 21 * 60, 3 * 60]
+    assert bedtime["layout"].iloc[0] == "MEAN,RANGE,CORR,STD,CI95"
+
+
+def test_unwrap_times_keeps_midnight_neighbours_together(night_owl):
+    unwrapped = unwrap_times(night_owl)
+    bedtime = unwrapped[unwrapped["variable"] == "Sleep_bedtime"].set_index("condition")
+    assert bedtime.loc["low", "mean"] - bedtime.loc["high", "mean"] == 23
+    assert (bedtime["ci_low"] <= bedtime["mean"]).all() and (bedtime["mean"] <= bedtime["ci_high"]).all()
+    assert bedtime["mean"].min() >= 0 and bedtime["mean"].max() < 2 * DAY
+    fats = unwrapped["variable"] == "past_day_fats"
+    assert unwrapped[fats]["mean"].tolist() == night_owl[fats]["mean"].tolist()
+    assert night_owl.loc[night_owl["variable"] == "Sleep_bedtime", "mean"].tolist() == [23 * 60 + 59, 22]
+
+
+def test_load_store_rebuilds_when_a_csv_changes(tmp_path):
+    csv_dir = tmp_path / "csv"
+    csv_dir.mkdir()
+    (csv_dir / "perma1.csv").write_text(NIGHT_OWL, encoding="utf-8")
+    path = str(tmp_path / "stats.arrow")
+    assert len(load_store(str(csv_dir), path)) == 4
+    built = os.path.getmtime(path)
+    (csv_dir / "perma2.csv").write_text(NIGHT_OWL, encoding="utf-8")
+    os.utime(csv_dir / "perma2.csv", (built + 10, built + 10))
+    store = load_store(str(csv_dir), path)
+    assert list(store["SubID"].cat.categories) == ["perma1", "perma2"] and len(store) == 8
+
+
+def test_unknown_participant(table):
+    with pytest.raises(KeyError):
+        participant_frame(table, "perma0")
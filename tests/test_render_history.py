@@ -0,0 +1,123 @@
+import contextlib
+import re
+
+import pytest
+
+import chat_stream
+from chat_stream import _transcript, renderHistory
+
+
+class RecordingStreamlit:
+    """The few st calls renderHistory makes, recorded instead of rendered."""
+
+    def __init__(self):
+        self.session_state = {}
+        self.elements = []
+
+    @contextlib.contextmanager
+    def container(self, border=False):
+        self.elements.append(("block",))
+        yield
+
+    @contextlib.contextmanager
+    def chat_message(self, role):
+        self.elements.append(("bubble", role))
+        yield
+
+    def markdown(self, text):
+        self.elements.append(("markdown", text))
+
+    def next_run(self):
+        """Start a new script run: same session state, empty page."""
+        self.elements = []
+
+
+@pytest.fixture
+def st(monkeypatch):
+    fake = RecordingStreamlit()
+    monkeypatch.setattr(chat_stream, "st", fake)
+    return fake
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """Blocks passed to _transcript, i.e. cache misses."""
+    calls = []
+
+    def counting(messages):
+        calls.append(len(messages))
+        return _transcript(messages)
+    monkeypatch.setattr(chat_stream, "_transcript", counting)
+    return calls
+
+
+def conversation(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(n)]
+
+
+def shown(st):
+    return "\n".join(e[1] for e in st.elements if e[0] == "markdown")
+
+
+def test_transcript_names_speakers_and_adds_translations():
+    text = _transcript([{"role": "user", "content": "hi"},
+                        {"role": "assistant", "content": "hello", "translations": {"Chinese": "你好"}}])
+    assert text == "**You:** hi\n\n---\n\n**Coach:** hello\n\n*In Chinese:* 你好"
+
+
+def test_short_conversation_is_all_bubbles(st, built):
+    renderHistory(conversation(7), window=4)
+    assert [e[0] for e in st.elements].count("bubble") == 7
+    assert built == [] and st.session_state["history_blocks"] == {}
+
+
+def test_every_message_stays_on_screen(st, built):
+    messages = conversation(75)
+    renderHistory(messages, window=30)
+    assert [e[0] for e in st.elements].count("block") == 1
+    assert [e[0] for e in st.elements].count("bubble") == 45
+    assert built == [30]
+    assert sorted(map(int, re.findall(r"message (\d+)", shown(st)))) == list(range(75))
+
+
+def test_blocks_are_built_once_across_reruns(st, built):
+    messages = conversation(75)
+    renderHistory(messages, window=30)
+    first = list(st.elements)
+    st.next_run()
+    renderHistory(messages, window=30)
+    assert built == [30] and st.elements == first
+
+
+def test_new_turns_settle_into_a_new_block_without_rebuilding_the_old(st, built):
+    messages = conversation(89)
+    renderHistory(messages, window=30)
+    assert built == [30]
+    messages += conversation(2)
+    renderHistory(messages, window=30)
+    assert built == [30, 30]
+    assert len(st.session_state["history_blocks"]) == 2
+
+
+def test_replaced_message_rebuilds_only_its_block(st, built):
+    messages = conversation(95)
+    renderHistory(messages, window=30)
+    assert built == [30, 30]
+    messages[40] = dict(messages[40], translations={"Chinese": "消息 40"})
+    st.next_run()
+    renderHistory(messages, window=30)
+    assert built == [30, 30, 30]
+    assert "*In Chinese:* 消息 40" in shown(st)
+    assert len(st.session_state["history_blocks"]) == 2
+
+
+def test_rebuilt_conversation_drops_old_blocks(st, built):
+    renderHistory(conversation(95), window=30)
+    renderHistory(conversation(10), window=30)
+    assert st.session_state["history_blocks"] == {}
+
+
+def test_decorate_gets_absolute_indices_of_bubbles_only(st, built):
+    seen = []
+    renderHistory(conversation(75), window=30, decorate=lambda index, msg: seen.append((index, msg["content"])))
+    assert seen[0] == (30, "message 30") and seen[-1] == (74, "message 74") and len(seen) == 45
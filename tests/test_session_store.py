@@ -0,0 +1,90 @@
+import time
+
+from background_build import SessionWorkers
+from history_compaction import contentText
+from session_store import SessionStore
+
+
+def make_store(tmp_path, **kwargs):
+    return SessionStore(str(tmp_path / "sessions.sqlite"), **kwargs)
+
+
+def record_turns(store, session_id):
+    store.start(session_id, "llm_chat_app", "coach", "You are a coach.", 0.7, "perma1")
+    store.append(session_id, "user", "Hello[participant data]", hidden=True)
+    store.append(session_id, "assistant", "Hi! Let's look at your sleep.")
+    store.append(session_id, "user", "I go to bed at 2am.")
+    store.append(session_id, "assistant", "Let's move that earlier.")
+
+
+def test_dropped_chat_is_rebuilt_from_every_stored_message(tmp_path):
+    store = make_store(tmp_path)
+    record_turns(store, "a")
+    histories = []
+
+    def factory(history):
+        histories.append(history)
+        return object()
+
+    chat = store.chat("a", factory)
+    assert store.chat("a", factory) is chat and len(histories) == 1
+    history = histories[0]
+    assert [c.role for c in history] == ["user", "model", "user", "model"]
+    assert contentText(history[0]) == "Hello[participant data]"
+    assert store.messages("a") == [{"role": "assistant", "content": "Hi! Let's look at your sleep."},
+                                   {"role": "user", "content": "I go to bed at 2am."},
+                                   {"role": "assistant", "content": "Let's move that earlier."}]
+    assert store.stats()["rebuilds"] == 1
+
+
+def test_reopened_database_restores_settings_and_messages(tmp_path):
+    record_turns(make_store(tmp_path), "a")
+    store = make_store(tmp_path)
+    assert store.peek("a") is None
+    assert store.settings("a")["participant"] == "perma1"
+    assert len(store.history("a")) == 4
+    assert len(store.chat("a", list)) == 4
+
+
+def test_rebuild_clears_the_old_messages(tmp_path):
+    store = make_store(tmp_path)
+    record_turns(store, "a")
+    store.put_chat("a", object())
+    store.start("a", "llm_chat_app", "coach", "You are a new coach.", 0.2, "perma1")
+    assert store.peek("a") is None and store.messages("a", include_hidden=True) == []
+    assert store.settings("a")["temperature"] == 0.2
+
+
+def test_least_recently_used_chats_are_evicted(tmp_path):
+    evicted = []
+    store = make_store(tmp_path, max_resident=2, on_evict=evicted.append)
+    for session_id in "abc":
+        record_turns(store, session_id)
+    store.put_chat("a", "chat a")
+    store.put_chat("b", "chat b")
+    store.chat("a", list)  # a is now the most recently used
+    store.put_chat("c", "chat c")
+    assert evicted == ["b"]
+    assert store.peek("a") == "chat a" and store.peek("b") is None
+    assert len(store.chat("b", list)) == 4
+    assert evicted == ["b", "a"] and store.stats()["evictions"] == 2
+
+
+def test_idle_chats_are_evicted(tmp_path):
+    evicted = []
+    store = make_store(tmp_path, idle_seconds=0.05, on_evict=evicted.append)
+    store.put_chat("a", "chat a")
+    time.sleep(0.1)
+    store.evict()
+    assert evicted == ["a"] and store.stats()["resident"] == 0
+
+
+def test_eviction_shuts_down_the_session_worker(tmp_path):
+    workers = SessionWorkers()
+    store = make_store(tmp_path, max_resident=1, on_evict=workers.forget)
+    executor = workers.executor("a")
+    assert executor.submit(lambda: 1).result() == 1
+    store.put_chat("a", "chat a")
+    store.put_chat("b", "chat b")
+    assert len(workers) == 0
+    assert workers.executor("a") is not executor
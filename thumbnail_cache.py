@@ -0,0 +1,61 @@
+import glob
+import os
+import threading
+
+# Longest side in pixels for each display size
+SIZES = {"Small": 1000, "Medium": 2000, "Large": 4000}
+CACHE_DIR = ".thumbnails"
+QUALITY = 80
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def _thumb_path(path, size, mtime, cache_dir):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}_{size}_{int(mtime)}.webp")
+
+
+def build_pyramid(path, cache_dir=CACHE_DIR):
+    """Decode path once and write a WebP for every size in SIZES.
+
+    JPEG draft mode lets PIL decode straight at a reduced scale, so the full
+    resolution image is never materialized. Older versions are removed.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    mtime = os.path.getmtime(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for stale in glob.glob(os.path.join(cache_dir, f"{stem}_*.webp")):
+        os.remove(stale)
+
+    # PIL is only needed when a thumbnail is missing
+    from PIL import Image
+    Image.MAX_IMAGE_PIXELS = None  # the SHAP figures are ~14000 x 9000
+
+    largest = max(SIZES.values())
+    with Image.open(path) as img:
+        img.draft("RGB", (largest, largest))
+        img = img.convert("RGB")
+        for size in sorted(SIZES.values(), reverse=True):
+            img.thumbnail((size, size), Image.LANCZOS)
+            out = _thumb_path(path, size, mtime, cache_dir)
+            img.save(out + ".tmp", "WEBP", quality=QUALITY, method=4)
+            os.replace(out + ".tmp", out)
+
+
+def get_thumbnail(path, size="Medium", cache_dir=CACHE_DIR):
+    """Return the cached WebP for path at a display size, building it on first use."""
+    pixels = SIZES[size]
+    out = _thumb_path(path, pixels, os.path.getmtime(path), cache_dir)
+    if os.path.exists(out):
+        return out
+    with _lock_for(path):
+        # Another session may have built it while we waited
+        if not os.path.exists(out):
+            build_pyramid(path, cache_dir)
+    return out
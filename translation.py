@@ -0,0 +1,128 @@
+"""On-demand translation of chat replies into the second study language.
+
+With a single reply language the coach answers in one language only, and
+each assistant message gets a "Show in ..." button. Clicking it queues the
+translation on the session's background executor (behind any greeting
+still being generated) and the message is redrawn with the translation
+once it is done. Translations are cached by language and message hash, so
+each is paid for once, whichever session asks first.
+
+A finished translation is stored on a copy of the message under
+"translations" (language -> text), so the JSONL download has both
+versions.
+"""
+import hashlib
+
+import streamlit as st
+
+from history_compaction import estimate_tokens
+
+TRANSLATE_PROMPT = """Translate this message from a health coach into {language}. Keep the markdown formatting,
+names and numbers. Reply with the translation only.
+
+{text}"""
+
+
+def translation_key(text, language):
+    return "translation:" + language + ":" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Translator:
+    """translate(text, language) -> str with a one-shot model call, cached in a ResponseCache.
+
+    With a RateLimiter the call is queued at the given priority.
+    """
+
+    def __init__(self, client, cache, model="gemini-2.5-flash", limiter=None, priority=0):
+        self.client = client
+        self.cache = cache
+        self.model = model
+        self.limiter = limiter
+        self.priority = priority
+
+    def cached(self, text, language):
+        return self.cache.get(translation_key(text, language))
+
+    def __call__(self, text, language):
+        cached = self.cached(text, language)
+        if cached is not None:
+            return cached
+        contents = TRANSLATE_PROMPT.format(language=language, text=text)
+
+        def call():
+            from google.genai import types
+            return self.client.models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=types.GenerateContentConfig(temperature=0.0),
+            )
+        if self.limiter is None:
+            response = call()
+        else:
+            response = self.limiter.call(call, 2 * estimate_tokens(contents), self.priority)
+        self.cache.put(translation_key(text, language), response.text)
+        return response.text
+
+
+# ---------------------------
+# Streamlit controls
+# ---------------------------
+
+def _request(index, language, translator, executor):
+    msg = st.session_state.messages[index]
+    # A cached translation is shown straight away, without queueing
+    cached = translator.cached(msg["content"], language)
+    if cached is not None:
+        _store(index, msg["content"], language, cached)
+        return
+    future = executor.submit(translator, msg["content"], language)
+    st.session_state.setdefault("pending_translations", {})[index, language] = (msg["content"], future)
+
+
+def _store(index, content, language, text):
+    messages = st.session_state.messages
+    if index >= len(messages) or messages[index]["content"] != content:
+        return  # the conversation was rebuilt in the meantime
+    msg = messages[index]
+    # Replace rather than edit the message, so the export buffer re-serializes it
+    messages[index] = {**msg, "translations": {**msg.get("translations", {}), language: text}}
+
+
+def collectTranslations():
+    """Move finished translations onto their messages; returns whether any are still running."""
+    pending = st.session_state.get("pending_translations", {})
+    for (index, language), (content, future) in list(pending.items()):
+        if not future.done():
+            continue
+        del pending[index, language]
+        if future.exception() is not None:
+            st.toast(f"Could not translate the message: {future.exception()}")
+            continue
+        _store(index, content, language, future.result())
+    return bool(pending)
+
+
+def translationControls(language, translator, executor):
+    """renderHistory decorator: the translation of each assistant message, or a button to ask for it."""
+    pending = st.session_state.get("pending_translations", {})
+
+    def decorate(index, msg):
+        if msg["role"] != "assistant":
+            return
+        text = msg.get("translations", {}).get(language)
+        if text is not None:
+            with st.expander(f"In {language}", expanded=True):
+                st.markdown(text)
+        elif (index, language) in pending:
+            st.caption(f"Translating into {language}...")
+        else:
+            st.button(f"Show in {language}", key=f"translate-{index}-{language}", type="tertiary",
+                      on_click=_request, args=(index, language, translator, executor))
+    return decorate
+
+
+@st.fragment(run_every=0.5)
+def showTranslating():
+    """Rerun the whole script once every pending translation is done."""
+    if not collectTranslations():
+        st.rerun()
@@ -0,0 +1,220 @@
+"""Drop weak variables from the participant tables before they are prompted.
+
+A PruneRule keeps a variable only if every criterion that is set holds:
+
+- min_abs_corr: |CORR| is at least this
+- drop_ci_overlap: the high- and low-depression CI95 ranges do not overlap
+- domains: the variable is actionable in one of these domains (ACTIONABLE_VARS)
+- top_k: it is among the k best-ranked variables the other criteria kept
+
+kept_variables evaluates the rule for every participant at once on the
+typed statistics table of participant_store. The original JSON records
+are then filtered block by block, so the layout the prompts describe is
+unchanged and only whole variables are dropped.
+
+An experiment's rule lives in <experiment>/pruning.json. Its pruned
+payloads are cached in .pruned_payloads/<experiment>.json, keyed by the
+rule and the source tables, together with a tokens-saved report per
+participant. batch_runner sends these payloads instead of the full
+tables.
+
+    python variable_pruning.py <experiment> --min-abs-corr 0.2 --top-k 8 --save
+    python variable_pruning.py <experiment>          # rule from pruning.json
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from history_compaction import estimate_tokens
+from perma_core.assets import ACTIONABLE_VARS
+
+CSV_DIR = "./dataForLLM/"
+RULE_FILE = "pruning.json"
+CACHE_DIR = ".pruned_payloads"
+CACHE_VERSION = 2  # bump when kept_variables changes what a rule keeps
+
+
+class PruneRule:
+    """Criteria a variable must meet to stay in the prompt; None/False leaves a criterion off."""
+
+    FIELDS = ("min_abs_corr", "drop_ci_overlap", "domains", "top_k")
+
+    def __init__(self, min_abs_corr=None, drop_ci_overlap=False, domains=None, top_k=None):
+        self.min_abs_corr = min_abs_corr
+        self.drop_ci_overlap = drop_ci_overlap
+        self.domains = list(domains) if domains else None
+        self.top_k = top_k
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**{k: values.get(k) for k in cls.FIELDS})
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def digest(self):
+        return hashlib.sha256(json.dumps(self.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def active(self):
+        return any(getattr(self, k) for k in self.FIELDS)
+
+    def __repr__(self):
+        return f"PruneRule({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items() if v)})"
+
+
+def load_rule(experiment):
+    """The experiment's PruneRule, or None when it has no pruning.json."""
+    path = os.path.join(experiment, RULE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return PruneRule.from_dict(json.load(f))
+
+
+def save_rule(experiment, rule):
+    with open(os.path.join(experiment, RULE_FILE), "w", encoding="utf-8") as f:
+        json.dump(rule.to_dict(), f, indent=2)
+
+
+# ---------------------------
+# Selection
+# ---------------------------
+
+def kept_variables(table, rule, actionable=ACTIONABLE_VARS):
+    """SubID -> set of variables that pass rule, for every participant in a participant_store table."""
+    from participant_store import unwrap_times
+
+    # Clock times around midnight are unwrapped, so a CI95 from 23:33 to 01:12 overlaps one from 23:03 to 00:54
+    table = unwrap_times(table)
+    high = table[table["condition"] == "high"].set_index("block")
+    low = table[table["condition"] == "low"].set_index("block").reindex(high.index)
+    keep = np.ones(len(high), dtype=bool)
+    if rule.min_abs_corr:
+        # A missing correlation never passes the threshold
+        keep &= np.nan_to_num(np.abs(high["corr"].to_numpy()), nan=-1.0) >= rule.min_abs_corr
+    if rule.drop_ci_overlap:
+        # Missing bounds compare False, so a variable without CI95 is kept
+        overlap = (np.maximum(high["ci_low"].to_numpy(), low["ci_low"].to_numpy())
+                   <= np.minimum(high["ci_high"].to_numpy(), low["ci_high"].to_numpy()))
+        keep &= ~overlap
+    if rule.domains:
+        names = {v.lower() for domain in rule.domains for v in actionable[domain]}
+        keep &= high["variable"].astype(str).str.lower().isin(names).to_numpy()
+    if rule.top_k:
+        order = high["rank"].where(keep).groupby(high["SubID"], observed=True).rank(method="first")
+        keep &= (order <= rule.top_k).to_numpy()
+    variables = high["variable"].astype(str)[keep].groupby(high["SubID"][keep], observed=True).agg(set)
+    return {sub_id: variables.get(sub_id, set()) for sub_id in high["SubID"].cat.categories}
+
+
+def prune_records(records, variables):
+    """Keep the row blocks (MEAN row and the statistics under it) of the given variables."""
+    out = []
+    keep = False
+    for row in records:
+        if row["level_1"] == "MEAN":
+            keep = row["level_0"] in variables
+        if keep:
+            out.append(row)
+    return out
+
+
+def prune_payload(payload, variables):
+    """prune_records for a JSON string of records; returns a JSON string."""
+    records = json.loads(payload)
+    return json.dumps(prune_records(records, variables), ensure_ascii=False, separators=(",", ":"))
+
+
+def report_row(sub_id, payload, pruned, variables):
+    tokens, pruned_tokens = estimate_tokens(payload), estimate_tokens(pruned)
+    blocks = sum(r["level_1"] == "MEAN" for r in json.loads(payload))
+    return {"SubID": sub_id, "variables": blocks, "kept": len(variables), "tokens": tokens,
+            "pruned_tokens": pruned_tokens, "saved": tokens - pruned_tokens,
+            "saved_pct": round(100 * (tokens - pruned_tokens) / tokens, 1) if tokens else 0.0}
+
+
+# ---------------------------
+# Cached payloads per experiment
+# ---------------------------
+
+def _source_key(csv_dir):
+    files = sorted(f for f in os.listdir(csv_dir) if f.endswith(".csv"))
+    return [[f, os.path.getmtime(os.path.join(csv_dir, f))] for f in files]
+
+
+def pruned_payloads(experiment, participants, rule=None, csv_dir=CSV_DIR, cache_dir=CACHE_DIR):
+    """Pruned payload and tokens-saved report for every participant, cached per experiment.
+
+    participants maps SubID to its JSON records (batch_runner.load_participants).
+    rule defaults to the experiment's pruning.json. Returns (payloads, report).
+    """
+    rule = rule or load_rule(experiment)
+    if rule is None or not rule.active:
+        return dict(participants), []
+    key = {"version": CACHE_VERSION, "rule": rule.digest(), "source": _source_key(csv_dir)}
+    path = os.path.join(cache_dir, os.path.basename(os.path.normpath(experiment)) + ".json")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached["key"] == key and set(participants) <= set(cached["payloads"]):
+            return {k: cached["payloads"][k] for k in participants}, \
+                [r for r in cached["report"] if r["SubID"] in participants]
+
+    # pyarrow and pandas are only needed when the cache is stale
+    from participant_store import load_store
+    kept = kept_variables(load_store(csv_dir), rule)
+    payloads, report = {}, []
+    for sub_id, payload in participants.items():
+        variables = kept.get(sub_id, set())
+        payloads[sub_id] = prune_payload(payload, variables)
+        report.append(report_row(sub_id, payload, payloads[sub_id], variables))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "rule": rule.to_dict(), "payloads": payloads, "report": report}, f)
+    os.replace(tmp, path)
+    return payloads, report
+
+
+def print_report(report, log=print):
+    log(f"{'SubID':>8} {'vars':>5} {'kept':>5} {'tokens':>7} {'pruned':>7} {'saved':>6}")
+    for r in report:
+        log(f"{r['SubID']:>8} {r['variables']:5d} {r['kept']:5d} {r['tokens']:7d} {r['pruned_tokens']:7d} "
+            f"{r['saved_pct']:5.1f}%")
+    tokens = sum(r["tokens"] for r in report)
+    saved = sum(r["saved"] for r in report)
+    if tokens:
+        log(f"total: {saved} of {tokens} payload tokens saved ({100 * saved / tokens:.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("experiment", help="experiment folder (its pruning.json is used unless options are given)")
+    parser.add_argument("--min-abs-corr", type=float)
+    parser.add_argument("--drop-ci-overlap", action="store_true")
+    parser.add_argument("--domains", nargs="*", choices=list(ACTIONABLE_VARS))
+    parser.add_argument("--top-k", type=int)
+    parser.add_argument("--save", action="store_true", help="write the options to <experiment>/pruning.json")
+    parser.add_argument("--csv-dir", default=CSV_DIR)
+    args = parser.parse_args()
+
+    rule = PruneRule(args.min_abs_corr, args.drop_ci_overlap, args.domains, args.top_k)
+    if not rule.active:
+        rule = load_rule(args.experiment)
+        if rule is None:
+            parser.error(f"no options given and no {RULE_FILE} in {args.experiment}")
+    elif args.save:
+        save_rule(args.experiment, rule)
+
+    from batch_runner import load_participants
+    _, report = pruned_payloads(args.experiment, load_participants(args.csv_dir), rule, args.csv_dir)
+    print(rule)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()